@@ -0,0 +1,705 @@
+"""Rendering benchmark for cuinter.
+
+Builds representative scenes on the headless backend and measures what a
+frame costs: frames per second, mean and p99 frame time, terminal output and
+allocations per frame. The tilemap compiler, pathfinding on large generated
+maps, NPC ticks, entity stores of many world objects, the zone graph and
+the generation, saving and loading of zones from zone_generator are timed
+as well. Results are saved as JSON so builds can be compared.
+
+Run with 'python benchmark.py [output_path]' from the game directory.
+
+Contributors:
+    Romain
+"""
+
+from __future__ import annotations
+import logging
+import math
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from typing import Callable
+from common import EnumObject, remap_dict
+import chunks
+import cuinter
+import entities
+from enums import BACKEND_TYPES, COMPONENTS, EVENT_TYPES, WORLD_OBJECT_TYPES
+from files import delete, load_pickle, load_text_dir, native_path, save_json
+import fov
+from lang import DialogLine
+import monsters
+import npcs
+import pathfinding
+import world
+import zone_generator
+import zone_graph
+
+logger = logging.getLogger(__name__)
+
+BENCHMARK_PATH = "logs\\benchmark.json"
+TILE_SPRITE_DIR_PATH = "assets\\sprites\\tiles"
+TEST_ZONE_PATHS = (
+    "assets\\zones\\test_zone.pkl",
+    "assets\\zones\\test_zone_2.pkl",
+)
+SCREEN_HEIGHT = 50
+SCREEN_WIDTH = 200
+FRAME_COUNT = 200  # Timed frames per scene
+ALLOCATION_FRAME_COUNT = 20  # Frames traced by tracemalloc per scene, much slower
+LARGE_GRID_SIZE = 200  # Tiles per side of the scaled up grid
+DIALOG_LENGTH = 20000  # Characters in the typewriter dialog line
+CHOICE_COUNT = 1000
+TILEMAP_SIZES = (10, 100, 500)  # Tiles per side of the compiled tilemaps
+PATHFINDING_SIZES = (100, 500, 1000)  # Tiles per side of the generated maps
+OBSTACLE_DENSITY = 0.25  # Share of wall tiles in the generated maps
+NPC_COUNTS = (100, 1000, 5000)  # NPCs in the ticked zones
+NPC_ZONE_SIZE = 200  # Tiles per side of the zone NPCs are ticked in
+NPC_SIMULATED_TIME = 10  # Game time simulated per NPC count (in seconds)
+NPC_FRAME_TIME = 1 / 60  # Game time between simulated frames (in seconds)
+GENERATED_ZONE_SIZES = (100, 500, 2000)  # Tiles per side of the generated zones
+GENERATED_GRID_SIZE = 2000  # Tiles per side of the generated zone scene
+GENERATED_ZONE_PATH = "user_data\\benchmark_zone.pkl"
+TILE_PATCH_ZONE_SIZES = (100, 500, 2000)  # Tiles per side of the zones tiles are changed in
+TILE_PATCH_COUNTS = (1, 10, 100)  # Tiles changed at once
+TILE_PATCH_STEPS = 20  # Timed changes per zone size and tile count
+FOV_ZONE_SIZE = 2000  # Tiles per side of the zone fields of view are computed in
+FOV_RADII = (8, 16, 32)  # View distances in tiles
+FOV_STEPS = 50  # Tiles walked per view distance
+ENTITY_COUNTS = (1000, 10000, 100000)  # World objects per entity store, half of them sprites
+ENTITY_ZONE_SIZE = 500  # Tiles per side of the zone world objects are scattered in
+ENTITY_STEPS = 50  # Tiles walked by the camera per entity count
+ZONE_GRAPH_ZONE_COUNTS = (10, 100)  # Zones in the indexed directories
+ZONE_GRAPH_ZONE_SIZE = 50  # Tiles per side of the indexed zones
+ZONE_GRAPH_DIR_PATH = "user_data\\benchmark_zones"
+
+
+def _load_tileset() -> dict[str, str]:
+    return remap_dict(load_text_dir(TILE_SPRITE_DIR_PATH), world.TILE_NAME_TO_CHAR)
+
+
+def _scale_tilemap(tilemap: tuple[str], height: int, width: int) -> tuple[str]:
+    """Return tilemap repeated in both directions up to height x width tiles."""
+    rows = tuple((row * math.ceil(width / len(row)))[:width] for row in tilemap)
+    return tuple(rows[y % len(rows)] for y in range(height))
+
+
+def _make_obstacle_tilemap(size: int, seed: int = 0) -> tuple[str]:
+    """Return a square tilemap of grass with random walls, its corners walkable."""
+    rng = random.Random(seed)
+    rows = [
+        "".join("║" if rng.random() < OBSTACLE_DENSITY else " " for _ in range(size))
+        for _ in range(size)
+    ]
+    rows[0] = " " + rows[0][1:]
+    rows[-1] = rows[-1][:-1] + " "
+    return tuple(rows)
+
+
+def _make_scrolling_grid(tilemap: tuple[str]) -> Callable:
+    """Center a Grid on the screen, scrolling its camera back and forth by one tile each frame."""
+    grid = world.Grid.new(_load_tileset(), tilemap)
+    grid = grid.center(cuinter.get_screen_height(), cuinter.get_screen_width())
+    grid.camera.apply()
+    camera = grid.camera
+    frame = 0
+
+    def step() -> None:
+        nonlocal grid, frame
+        frame += 1
+        grid = grid.config(camera=camera.config(x=camera.x + world.TILE_WIDTH * (frame % 2)))
+        grid.camera.apply()
+
+    return step
+
+
+def scene_zone_grid() -> Callable:
+    """Full-screen Grid built from the test zones, side by side."""
+    tilemaps = [load_pickle(path)[0] for path in TEST_ZONE_PATHS]
+    height = min(len(tilemap) for tilemap in tilemaps)
+    tilemap = tuple("".join(tilemap[y] for tilemap in tilemaps) for y in range(height))
+    return _make_scrolling_grid(tilemap)
+
+
+def scene_large_grid() -> Callable:
+    """Grid of the first test zone scaled up to LARGE_GRID_SIZE tiles per side."""
+    tilemap = load_pickle(TEST_ZONE_PATHS[0])[0]
+    return _make_scrolling_grid(_scale_tilemap(tilemap, LARGE_GRID_SIZE, LARGE_GRID_SIZE))
+
+
+def scene_dialog_box() -> None:
+    """DialogBox halfway through typing out a very long line."""
+    words = "The quick brown fox jumps over the lazy dog. "
+    text = (words * math.ceil(DIALOG_LENGTH / len(words)))[:DIALOG_LENGTH]
+    dialog_box = cuinter.DialogBox.new(dialog=(DialogLine(text, "Narrator"),))
+    dialog_box.config(start_time=time.time() - DIALOG_LENGTH * cuinter.CHARACTER_TIME / 2)
+
+
+def scene_choice_box() -> Callable:
+    """ChoiceBox of CHOICE_COUNT options, moving the selection each frame."""
+    choice_box = cuinter.ChoiceBox.new(
+        options=tuple(f"Option {i}" for i in range(CHOICE_COUNT)),
+    )
+
+    def step() -> None:
+        element = cuinter.get_elements()[choice_box.pid]
+        if element.selected_index % 2:
+            element.select_previous()
+        else:
+            element.select_next()
+
+    return step
+
+
+def scene_generated_grid() -> Callable:
+    """Grid of a generated zone of GENERATED_GRID_SIZE tiles per side."""
+    zone = zone_generator.generate_zone(GENERATED_GRID_SIZE, GENERATED_GRID_SIZE)
+    return _make_scrolling_grid(zone.tilemap)
+
+
+SCENES = {
+    "zone_grid": scene_zone_grid,
+    "large_grid": scene_large_grid,
+    "generated_grid": scene_generated_grid,
+    "dialog_box": scene_dialog_box,
+    "choice_box": scene_choice_box,
+}
+
+
+def _reset(height: int, width: int) -> None:
+    """Remove every UI element and start again from a blank headless screen."""
+    for pid in list(cuinter.get_elements()):
+        cuinter.remove_element(pid)
+    cuinter.clear_sprite_cache()
+    cuinter.setup(BACKEND_TYPES.HEADLESS, height=height, width=width)
+    cuinter.request_full_redraw()
+
+
+def _percentile(values: list[float], percent: float) -> float:
+    """Return the nearest-rank percentile of values."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(len(ordered) * percent / 100) - 1)]
+
+
+def run_scene(make_scene: Callable, frame_count: int = FRAME_COUNT,
+              allocation_frame_count: int = ALLOCATION_FRAME_COUNT,
+              height: int = SCREEN_HEIGHT, width: int = SCREEN_WIDTH) -> dict:
+    """Build a scene and return its frame statistics.
+
+    The first frame, a full redraw, is reported apart. Frames are then timed,
+    and finally traced by tracemalloc to measure allocations.
+    """
+    _reset(height, width)
+    setup_start = time.perf_counter()
+    step = make_scene()
+    setup_time = time.perf_counter() - setup_start
+
+    def frame() -> None:
+        if step is not None:
+            step()
+        cuinter.update(can_idle=False)
+
+    first_frame_start = time.perf_counter()
+    frame()
+    first_frame_time = time.perf_counter() - first_frame_start
+
+    frame_times = []
+    cells = 0
+    byte_count = 0
+    for _ in range(frame_count):
+        frame_start = time.perf_counter()
+        frame()
+        frame_times.append(time.perf_counter() - frame_start)
+
+        render_stats = cuinter.get_render_stats()
+        cells += render_stats.cells
+        byte_count += render_stats.bytes
+
+    peaks = []
+    blocks = []
+    tracemalloc.start()
+    for _ in range(allocation_frame_count):
+        tracemalloc.reset_peak()
+        start_size = tracemalloc.get_traced_memory()[0]
+        start_blocks = sys.getallocatedblocks()
+        frame()
+        blocks.append(sys.getallocatedblocks() - start_blocks)
+        peaks.append(tracemalloc.get_traced_memory()[1] - start_size)
+    tracemalloc.stop()
+
+    mean_time = sum(frame_times) / frame_count
+    return {
+        "setup_ms": round(setup_time * 1000, 3),
+        "first_frame_ms": round(first_frame_time * 1000, 3),
+        "fps": round(1 / mean_time, 1),
+        "mean_ms": round(mean_time * 1000, 3),
+        "p99_ms": round(_percentile(frame_times, 99) * 1000, 3),
+        "max_ms": round(max(frame_times) * 1000, 3),
+        "cells_per_frame": round(cells / frame_count, 1),
+        "bytes_per_frame": round(byte_count / frame_count, 1),
+        "peak_alloc_kib_per_frame": round(sum(peaks) / len(peaks) / 1024, 1) if peaks else None,
+        "net_blocks_per_frame": round(sum(blocks) / len(blocks), 1) if blocks else None,
+    }
+
+
+def run_tilemap_compiler(sizes: tuple[int, ...] = TILEMAP_SIZES) -> dict:
+    """Return the time to compile square tilemaps into sprites, cold and memoized."""
+    tileset = _load_tileset()
+    tilemap = load_pickle(TEST_ZONE_PATHS[0])[0]
+    results = {}
+
+    for size in sizes:
+        scaled_tilemap = _scale_tilemap(tilemap, size, size)
+        world.clear_tilemap_cache()
+
+        start = time.perf_counter()
+        world.tilemap_to_sprite(tileset, scaled_tilemap)
+        cold_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        world.tilemap_to_sprite(tileset, scaled_tilemap)
+        warm_time = time.perf_counter() - start
+
+        results[f"{size}x{size}"] = {
+            "cold_ms": round(cold_time * 1000, 3),
+            "memoized_ms": round(warm_time * 1000, 3),
+        }
+
+    world.clear_tilemap_cache()
+    return results
+
+
+def run_pathfinding(sizes: tuple[int, ...] = PATHFINDING_SIZES) -> dict:
+    """Return the time to find corner to corner paths on generated square maps.
+
+    Times the collision map build, A* and the distance field toward the
+    far corner, cold and cached.
+    """
+    results = {}
+
+    for size in sizes:
+        tilemap = _make_obstacle_tilemap(size, size)
+        pathfinding.clear_distance_fields()
+
+        start = time.perf_counter()
+        collision_map = world.CollisionMap.new(tilemap)
+        collision_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        path = pathfinding.find_path(collision_map, (0, 0), (size - 1, size - 1))
+        path_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        pathfinding.get_distance_field(collision_map, [(size - 1, size - 1)])
+        field_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        distance_field = pathfinding.get_distance_field(collision_map, [(size - 1, size - 1)])
+        cached_field_time = time.perf_counter() - start
+
+        results[f"{size}x{size}"] = {
+            "collision_map_ms": round(collision_time * 1000, 3),
+            "a_star_ms": round(path_time * 1000, 3),
+            "path_length": None if path is None else len(path),
+            "distance_field_ms": round(field_time * 1000, 3),
+            "cached_distance_field_ms": round(cached_field_time * 1000, 3),
+            "field_distance": distance_field.get_distance(0, 0),
+        }
+
+    pathfinding.clear_distance_fields()
+    return results
+
+
+def run_npc_ticks(counts: tuple[int, ...] = NPC_COUNTS) -> dict:
+    """Return the time spent ticking NPCs per frame, with the player in the middle of a generated zone.
+
+    Half of the NPCs wander and half walk along a short route, spread all
+    over the zone. Frames are simulated NPC_FRAME_TIME apart, faster than real time.
+    """
+    tilemap = _make_obstacle_tilemap(NPC_ZONE_SIZE)
+    results = {}
+
+    for count in counts:
+        npcs.clear_npcs()
+        npcs.clear_tick_stats()
+        _reset(SCREEN_HEIGHT, SCREEN_WIDTH)
+        grid = world.Grid.new(_load_tileset(), tilemap)
+        character = monsters.merchant()
+        rng = random.Random(count)
+
+        start = time.perf_counter()
+        added = 0
+        while added < count:
+            grid_y = rng.randrange(NPC_ZONE_SIZE - 1)
+            grid_x = rng.randrange(NPC_ZONE_SIZE - 1)
+            if not grid.is_walkable(grid_y, grid_x) or npcs.get_npc_at(grid_y, grid_x):
+                continue
+            added += 1
+            if added % 2:
+                npc = world.NPC.new(grid, grid_y, grid_x, character, wander_radius=3)
+            else:
+                npc = world.NPC.new(grid, grid_y, grid_x, character,
+                                    route=((grid_y, grid_x), (grid_y, grid_x + 1)))
+            npcs.add_npc(npc, 0)
+        setup_time = time.perf_counter() - start
+
+        frame_times = []
+        frame_count = round(NPC_SIMULATED_TIME / NPC_FRAME_TIME)
+        center = NPC_ZONE_SIZE // 2
+        for frame in range(frame_count):
+            start = time.perf_counter()
+            npcs.tick_npcs(frame * NPC_FRAME_TIME, center, center, grid.collision_map)
+            frame_times.append(time.perf_counter() - start)
+
+        stats = npcs.get_tick_stats()
+        results[str(count)] = {
+            "setup_ms": round(setup_time * 1000, 3),
+            "mean_tick_ms": round(sum(frame_times) / frame_count * 1000, 3),
+            "p99_tick_ms": round(_percentile(frame_times, 99) * 1000, 3),
+            "max_tick_ms": round(max(frame_times) * 1000, 3),
+            "ticks_per_frame": round(stats.ticks / frame_count, 1),
+            "far_tick_share": round(stats.far_ticks / max(stats.ticks, 1), 3),
+            "capped_frames": stats.capped_frames,
+        }
+
+    npcs.clear_npcs()
+    npcs.clear_tick_stats()
+    return results
+
+
+def run_generated_zones(sizes: tuple[int, ...] = GENERATED_ZONE_SIZES) -> dict:
+    """Return the time to generate, save and load square zones, and to compile them.
+
+    Compiling a zone is building its collision map and its zoomed-out rows.
+    Zones above zone_generator.CHUNKED_ZONE_SIZE are saved chunked, loading
+    them is opening them and building the first window.
+    """
+    results = {}
+
+    for size in sizes:
+        start = time.perf_counter()
+        zone = zone_generator.generate_zone(size, size, zone_path=GENERATED_ZONE_PATH)
+        generate_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        world.CollisionMap.new(zone.tilemap)
+        collision_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        world.tilemap_to_lod_rows(zone.tilemap, 2)
+        lod_time = time.perf_counter() - start
+        world.clear_lod_cache()
+
+        start = time.perf_counter()
+        zone_generator.save_zone(zone, GENERATED_ZONE_PATH)
+        save_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        zone_data = load_pickle(GENERATED_ZONE_PATH)
+        if isinstance(zone_data, chunks.ChunkedZone):
+            chunks.open_zone(zone_data)
+            chunks.update_window(size // 2, size // 2)
+            chunks.close_zone()
+        load_time = time.perf_counter() - start
+
+        if isinstance(zone_data, chunks.ChunkedZone):
+            chunk_dir_path = native_path(zone_data.chunk_dir_path)
+            for entry in os.listdir(chunk_dir_path):
+                os.remove(os.path.join(chunk_dir_path, entry))
+            os.rmdir(chunk_dir_path)
+        delete(GENERATED_ZONE_PATH)
+
+        results[f"{size}x{size}"] = {
+            "generate_ms": round(generate_time * 1000, 3),
+            "collision_map_ms": round(collision_time * 1000, 3),
+            "lod_rows_ms": round(lod_time * 1000, 3),
+            "save_ms": round(save_time * 1000, 3),
+            "load_ms": round(load_time * 1000, 3),
+            "chunked": isinstance(zone_data, chunks.ChunkedZone),
+            "triggers": len(zone.world_object_constructors),
+        }
+
+    return results
+
+
+def run_tile_patching(sizes: tuple[int, ...] = TILE_PATCH_ZONE_SIZES,
+                      counts: tuple[int, ...] = TILE_PATCH_COUNTS) -> dict:
+    """Return the time to change tiles of generated zones and draw the frame.
+
+    Tiles are changed in the window with Grid.set_tiles(), back and forth
+    between water and solid grass, and the time of a whole tilemap change
+    through Grid.config(tilemap=...) is given for comparison.
+    """
+    results = {}
+    tileset = _load_tileset()
+
+    for size in sizes:
+        _reset(SCREEN_HEIGHT, SCREEN_WIDTH)
+        tilemap = zone_generator.generate_zone(size, size).tilemap
+        grid = world.Grid.new(tileset, tilemap).follow(size // 2, size // 2)
+        grid.camera.apply()
+        cuinter.update(can_idle=False)
+        top, left, bottom, right = grid.window
+        window_tiles = [(y, x) for y in range(top, bottom) for x in range(left, right)]
+
+        size_results = {}
+        for count in counts:
+            tiles = window_tiles[:count]
+            start = time.perf_counter()
+            for step in range(TILE_PATCH_STEPS):
+                char = "≈" if step % 2 == 0 else "/"
+                grid = grid.set_tiles([(y, x, char) for y, x in tiles])
+                cuinter.update(can_idle=False)
+            size_results[f"set_{len(tiles)}_tiles_ms"] = round(
+                (time.perf_counter() - start) / TILE_PATCH_STEPS * 1000, 3)
+
+        start = time.perf_counter()
+        grid = grid.config(tilemap=tilemap)
+        cuinter.update(can_idle=False)
+        size_results["config_tilemap_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        results[f"{size}x{size}"] = size_results
+
+    return results
+
+
+def run_fov(size: int = FOV_ZONE_SIZE, radii: tuple[int, ...] = FOV_RADII) -> dict:
+    """Return the time to compute fields of view in a generated zone and to show them.
+
+    The viewer walks FOV_STEPS tiles along the top path of the zone and back,
+    so the way back only hits the cache, then stands still.
+    """
+    results = {}
+    tilemap = zone_generator.generate_zone(size, size).tilemap
+    tileset = _load_tileset()
+    path = [(1, x) for x in range(1, FOV_STEPS + 1)]
+
+    for radius in radii:
+        _reset(SCREEN_HEIGHT, SCREEN_WIDTH)
+        grid = world.Grid.new(tileset, tilemap)
+        collision_map = grid.collision_map
+        fov.clear_fovs()
+        start = time.perf_counter()
+        for y, x in path:
+            fov.get_fov(collision_map, y, x, radius)
+        compute_time = (time.perf_counter() - start) / len(path)
+
+        start = time.perf_counter()
+        for y, x in reversed(path):
+            fov.get_fov(collision_map, y, x, radius)
+        cached_time = (time.perf_counter() - start) / len(path)
+
+        step_times = []
+        for y, x in path:
+            grid = grid.follow(y, x)
+            grid.camera.apply()
+            start = time.perf_counter()
+            grid = fov.update_view(grid, GENERATED_ZONE_PATH, 0, 0, y, x, radius)
+            cuinter.update(can_idle=False)
+            step_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        fov.update_view(grid, GENERATED_ZONE_PATH, 0, 0, *path[-1], radius)
+        still_time = time.perf_counter() - start
+
+        results[f"radius_{radius}"] = {
+            "fov_ms": round(compute_time * 1000, 3),
+            "cached_fov_ms": round(cached_time * 1000, 3),
+            "visible_tiles": len(fov.get_fov(collision_map, *path[-1], radius).visible),
+            "view_step_ms": round(sum(step_times) / len(step_times) * 1000, 3),
+            "still_ms": round(still_time * 1000, 3),
+        }
+        fov.clear_view(grid)
+
+    fov.clear_fovs()
+    fov.clear_explored()
+    return results
+
+
+def run_entities(counts: tuple[int, ...] = ENTITY_COUNTS, size: int = ENTITY_ZONE_SIZE) -> dict:
+    """Return the time to build entity stores of many world objects, draw, move and query them.
+
+    Half of the world objects are GridSprites and half WalkTriggers, scattered
+    in a zone. The camera walks ENTITY_STEPS tiles, every sprite is moved
+    at once, and the triggers are looked up on ENTITY_STEPS tiles.
+    """
+    results = {}
+    tileset = _load_tileset()
+    tilemap = _make_obstacle_tilemap(size)
+    event = EnumObject(EVENT_TYPES.QUIT_GAME)
+
+    for count in counts:
+        _reset(SCREEN_HEIGHT, SCREEN_WIDTH)
+        rng = random.Random(0)
+        grid = world.Grid.new(tileset, tilemap).follow(size // 2, size // 2)
+        grid.camera.apply()
+        positions = [(rng.randrange(size), rng.randrange(size)) for _ in range(count)]
+        store = entities.EntityStore.new()
+        entity_renderer = entities.EntityRenderer.new(store)
+
+        start = time.perf_counter()
+        for index, (y, x) in enumerate(positions):
+            if index % 2 == 0:
+                world_object = world.GridSprite.new(grid, y, x, "o" * (index % 4 + 1))
+            else:
+                world_object = world.WalkTrigger.new(y, x, event)
+            entities.add_world_object(store, world_object)
+        add_time = time.perf_counter() - start
+        cuinter.update(can_idle=False)
+
+        start = time.perf_counter()
+        for step in range(ENTITY_STEPS):
+            grid = grid.follow(size // 2, size // 2 + step)
+            grid.camera.apply()
+            cuinter.update(can_idle=False)
+        frame_time = (time.perf_counter() - start) / ENTITY_STEPS
+
+        start = time.perf_counter()
+        sprite_entities = store.query(COMPONENTS.POSITION, COMPONENTS.SPRITE)
+        query_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        entities.move_entities(store, sprite_entities, 0, 1, grid.collision_map)
+        cuinter.update(can_idle=False)
+        move_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for y, x in positions[:ENTITY_STEPS]:
+            entities.get_trigger_events_at(store, y, x)
+        lookup_time = (time.perf_counter() - start) / ENTITY_STEPS
+
+        results[str(count)] = {
+            "add_ms": round(add_time * 1000, 3),
+            "frame_ms": round(frame_time * 1000, 3),
+            "query_ms": round(query_time * 1000, 3),
+            "move_all_ms": round(move_time * 1000, 3),
+            "trigger_lookup_us": round(lookup_time * 1000000, 3),
+        }
+        entity_renderer.delete()
+
+    return results
+
+
+def run_zone_graph(counts: tuple[int, ...] = ZONE_GRAPH_ZONE_COUNTS,
+                   size: int = ZONE_GRAPH_ZONE_SIZE) -> dict:
+    """Return the time to index directories of generated zones and find routes through them.
+
+    Each building door of a zone leads in front of a door of a random zone,
+    zone i also leads to zone i + 1, so the last zone can be reached from
+    the first one. The index is built, updated without and with one changed
+    zone, then a route is found from the first zone to the last, twice.
+    """
+    results = {}
+    os.makedirs(native_path(ZONE_GRAPH_DIR_PATH), exist_ok=True)
+
+    for count in counts:
+        rng = random.Random(0)
+        zone_paths = [f"{ZONE_GRAPH_DIR_PATH}\\zone_{index}.pkl" for index in range(count)]
+        zones = [zone_generator.generate_zone(size, size, seed) for seed in range(count)]
+        for index, zone in enumerate(zones):
+            constructors = []
+            for door_index, (door_y, door_x) in enumerate(zone.doors):
+                target = (index + 1) % count if door_index == 0 else rng.randrange(count)
+                target_y, target_x = zones[target].doors[rng.randrange(len(zones[target].doors))]
+                constructors.append(EnumObject(WORLD_OBJECT_TYPES.WALK_TRIGGER, (
+                    door_y,
+                    door_x,
+                    EnumObject(EVENT_TYPES.LOAD_ZONE, (zone_paths[target], target_y + 1, target_x)),
+                    ord("w"),
+                )))
+            zone_generator.save_zone(zone._replace(world_object_constructors=tuple(constructors)),
+                                     zone_paths[index])
+
+        zone_graph.clear_zone_graph()
+        start = time.perf_counter()
+        zone_graph.update_zone_graph(ZONE_GRAPH_DIR_PATH)
+        index_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        zone_graph.update_zone_graph(ZONE_GRAPH_DIR_PATH)
+        unchanged_time = time.perf_counter() - start
+
+        zone_generator.save_zone(zones[0], zone_paths[0])
+        start = time.perf_counter()
+        zone_graph.update_zone_graph(ZONE_GRAPH_DIR_PATH)
+        changed_time = time.perf_counter() - start
+
+        goal_y, goal_x = zones[-1].doors[0]
+        route_times = []
+        for _ in range(2):
+            start = time.perf_counter()
+            route = zone_graph.find_route(zone_paths[1], 1, 1, zone_paths[-1], goal_y + 1, goal_x)
+            route_times.append(time.perf_counter() - start)
+
+        results[str(count)] = {
+            "index_ms": round(index_time * 1000, 3),
+            "unchanged_update_ms": round(unchanged_time * 1000, 3),
+            "changed_update_ms": round(changed_time * 1000, 3),
+            "route_ms": round(route_times[0] * 1000, 3),
+            "cached_route_ms": round(route_times[1] * 1000, 3),
+            "route_zones": None if route is None else len(route.legs),
+        }
+        for zone_path in zone_paths:
+            delete(zone_path)
+
+    zone_graph.clear_zone_graph()
+    os.rmdir(native_path(ZONE_GRAPH_DIR_PATH))
+    return results
+
+
+def main(output_path: str = BENCHMARK_PATH, frame_count: int = FRAME_COUNT) -> dict:
+    """Run every scene in SCENES and save the results as JSON at output_path."""
+    results = {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "screen": [SCREEN_HEIGHT, SCREEN_WIDTH],
+        "frames": frame_count,
+        "scenes": {},
+        "tilemap_compiler": {},
+        "pathfinding": {},
+        "npc_ticks": {},
+        "generated_zones": {},
+        "tile_patching": {},
+        "fov": {},
+        "entities": {},
+        "zone_graph": {},
+    }
+
+    for name, make_scene in SCENES.items():
+        logger.info(f"Running benchmark scene {name}")
+        results["scenes"][name] = run_scene(make_scene, frame_count)
+        print(name, results["scenes"][name])
+
+    results["tilemap_compiler"] = run_tilemap_compiler()
+    print("tilemap_compiler", results["tilemap_compiler"])
+
+    results["pathfinding"] = run_pathfinding()
+    print("pathfinding", results["pathfinding"])
+
+    results["npc_ticks"] = run_npc_ticks()
+    print("npc_ticks", results["npc_ticks"])
+
+    results["generated_zones"] = run_generated_zones()
+    print("generated_zones", results["generated_zones"])
+
+    results["tile_patching"] = run_tile_patching()
+    print("tile_patching", results["tile_patching"])
+
+    results["fov"] = run_fov()
+    print("fov", results["fov"])
+
+    results["entities"] = run_entities()
+    print("entities", results["entities"])
+
+    results["zone_graph"] = run_zone_graph()
+    print("zone_graph", results["zone_graph"])
+
+    save_json(results, output_path)
+    return results
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:2])
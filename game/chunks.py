@@ -0,0 +1,290 @@
+"""Chunked zones streamed from disk around the player.
+
+A chunked zone is stored as a ChunkedZone header pickle, at the path used
+in LOAD_ZONE events, and one pickle per chunk of CHUNK_SIZE x CHUNK_SIZE
+tiles holding its tilemap rows, walkability and world object constructors.
+
+Only the chunks within CHUNK_RADIUS of the player's chunk are assembled into
+a local tilemap window, whose origin is the global position of its top-left
+tile. The window is built again around the player each time they enter
+another chunk. Chunks farther than CHUNK_RADIUS + 1 are evicted, so memory
+and load time do not depend on the size of the zone.
+
+World object constructors use global grid coordinates on disk, and local
+window coordinates once in a ZoneWindow.
+
+Contributors:
+    Romain
+"""
+
+from __future__ import annotations
+import logging
+import os
+from typing import Callable, NamedTuple
+from common import CacheStats, EnumObject
+from files import load_pickle, native_path, save_pickle
+from world import tilemap_to_walkability
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 16  # Tiles per chunk side
+CHUNK_RADIUS = 1  # Chunks around the player's chunk in the window
+CHUNK_PATH = "{}\\{}_{}.pkl"
+
+
+class ChunkedZone(NamedTuple):
+    """Header of a zone stored as chunks.
+
+    Attributes:
+        height (int): Height of the zone in tiles.
+        width (int): Width of the zone in tiles.
+        chunk_size (int): Tiles per chunk side.
+        chunk_dir_path (str): Directory of the chunk pickles.
+    """
+    height: int
+    width: int
+    chunk_size: int
+    chunk_dir_path: str
+
+    @property
+    def chunk_rows(self) -> int:
+        return -(-self.height // self.chunk_size)
+
+    @property
+    def chunk_columns(self) -> int:
+        return -(-self.width // self.chunk_size)
+
+    def get_chunk_path(self, chunk_y: int, chunk_x: int) -> str:
+        return CHUNK_PATH.format(self.chunk_dir_path, chunk_y, chunk_x)
+
+
+class Chunk(NamedTuple):
+    """A block of tiles of a chunked zone.
+
+    Attributes:
+        tilemap (tuple[str, ...]): Tile rows, smaller on the edges of the zone.
+        walkability (tuple[bytes, ...]): 1 for each walkable tile, row after row.
+        world_object_constructors (tuple[EnumObject, ...]): World objects
+            placed in the chunk, in global grid coordinates.
+    """
+    tilemap: tuple[str, ...]
+    walkability: tuple[bytes, ...]
+    world_object_constructors: tuple[EnumObject, ...] = ()
+
+
+class ZoneWindow(NamedTuple):
+    """The loaded part of a chunked zone, assembled around the player.
+
+    Attributes:
+        origin_y (int): Global grid y of the top-left tile of the window.
+        origin_x (int): Global grid x of the top-left tile of the window.
+        tilemap (tuple[str, ...]): Tile rows of the window.
+        walkability (tuple[bytes, ...]): Walkability rows of the window.
+        world_object_constructors (tuple[EnumObject, ...]): World objects of
+            the window, in window coordinates.
+    """
+    origin_y: int
+    origin_x: int
+    tilemap: tuple[str, ...]
+    walkability: tuple[bytes, ...]
+    world_object_constructors: tuple[EnumObject, ...]
+
+
+def get_constructor_position(constructor: EnumObject) -> tuple[int, int]:
+    """Return the (grid_y, grid_x) of a world object constructor."""
+    _, args = constructor
+    if isinstance(args, dict):
+        return args["grid_y"], args["grid_x"]
+    return args[0], args[1]
+
+
+def move_constructor(constructor: EnumObject, grid_y: int, grid_x: int) -> EnumObject:
+    """Return a world object constructor moved by (grid_y, grid_x) tiles."""
+    world_object_type, args = constructor
+    if isinstance(args, dict):
+        args = {
+            **args,
+            "grid_y": args["grid_y"] + grid_y,
+            "grid_x": args["grid_x"] + grid_x,
+        }
+    else:
+        args = (args[0] + grid_y, args[1] + grid_x, *args[2:])
+    return EnumObject(world_object_type, args)
+
+
+def save_chunked_zone(zone_path: str, tilemap: tuple[str, ...],
+                      world_object_constructors: tuple[EnumObject, ...] = (),
+                      chunk_size: int = CHUNK_SIZE) -> ChunkedZone:
+    """Split a zone into chunks saved next to its header, at zone_path."""
+    logger.debug(f"Saving chunked zone: {zone_path}")
+
+    chunk_dir_path = os.path.splitext(zone_path)[0]
+    os.makedirs(native_path(chunk_dir_path), exist_ok=True)
+    zone = ChunkedZone(len(tilemap), len(tilemap[0]), chunk_size, chunk_dir_path)
+
+    chunk_constructors = {}
+    for constructor in world_object_constructors:
+        grid_y, grid_x = get_constructor_position(constructor)
+        chunk_constructors.setdefault(
+            (grid_y // chunk_size, grid_x // chunk_size), []
+        ).append(constructor)
+
+    for chunk_y in range(zone.chunk_rows):
+        for chunk_x in range(zone.chunk_columns):
+            rows = tuple(
+                row[chunk_x * chunk_size:(chunk_x + 1) * chunk_size]
+                for row in tilemap[chunk_y * chunk_size:(chunk_y + 1) * chunk_size]
+            )
+            save_pickle(
+                Chunk(
+                    rows,
+                    tilemap_to_walkability(rows),
+                    tuple(chunk_constructors.get((chunk_y, chunk_x), ())),
+                ),
+                zone.get_chunk_path(chunk_y, chunk_x),
+            )
+
+    save_pickle(zone, zone_path)
+    return zone
+
+
+def _make_chunk_streamer() -> tuple[Callable, ...]:
+    """Creates functions to stream the chunks of the open zone around the player."""
+    zone = None
+    chunks = {}  # (chunk_y, chunk_x): Chunk
+    center = None  # Chunk the window is built around
+    window = None
+    loads = 0
+    evictions = 0
+
+    def open_zone(chunked_zone: ChunkedZone) -> None:
+        nonlocal zone
+        logger.debug(f"Opening chunked zone: {chunked_zone.chunk_dir_path}")
+        close_zone()
+        zone = chunked_zone
+
+    def close_zone() -> None:
+        nonlocal zone, center, window
+        zone = None
+        center = None
+        window = None
+        chunks.clear()
+
+    def get_zone() -> ChunkedZone | None:
+        return zone
+
+    def get_window() -> ZoneWindow | None:
+        return window
+
+    def get_chunk(chunk_y: int, chunk_x: int) -> Chunk:
+        nonlocal loads
+        chunk = chunks.get((chunk_y, chunk_x))
+        if chunk is None:
+            loads += 1
+            chunk = load_pickle(zone.get_chunk_path(chunk_y, chunk_x))
+            chunks[chunk_y, chunk_x] = chunk
+        return chunk
+
+    def update_window(grid_y: int, grid_x: int) -> ZoneWindow | None:
+        """Load the chunks around global position (grid_y, grid_x).
+
+        Returns the new window if the position is in another chunk than the
+        current window's center, None otherwise.
+        """
+        nonlocal center, window, evictions
+        if zone is None:
+            return None
+
+        new_center = (
+            min(max(grid_y // zone.chunk_size, 0), zone.chunk_rows - 1),
+            min(max(grid_x // zone.chunk_size, 0), zone.chunk_columns - 1),
+        )
+        if new_center == center:
+            return None
+        center = new_center
+        center_y, center_x = center
+
+        for chunk_y, chunk_x in list(chunks):
+            if max(abs(chunk_y - center_y), abs(chunk_x - center_x)) > CHUNK_RADIUS + 1:
+                del chunks[chunk_y, chunk_x]
+                evictions += 1
+
+        top = max(center_y - CHUNK_RADIUS, 0)
+        bottom = min(center_y + CHUNK_RADIUS + 1, zone.chunk_rows)
+        left = max(center_x - CHUNK_RADIUS, 0)
+        right = min(center_x + CHUNK_RADIUS + 1, zone.chunk_columns)
+        origin_y = top * zone.chunk_size
+        origin_x = left * zone.chunk_size
+
+        tilemap = []
+        walkability = []
+        constructors = []
+        for chunk_y in range(top, bottom):
+            row_chunks = [get_chunk(chunk_y, chunk_x) for chunk_x in range(left, right)]
+            for y in range(len(row_chunks[0].tilemap)):
+                tilemap.append("".join(chunk.tilemap[y] for chunk in row_chunks))
+                walkability.append(b"".join(chunk.walkability[y] for chunk in row_chunks))
+            for chunk in row_chunks:
+                constructors.extend(
+                    move_constructor(constructor, -origin_y, -origin_x)
+                    for constructor in chunk.world_object_constructors
+                )
+
+        window = ZoneWindow(origin_y, origin_x, tuple(tilemap), tuple(walkability),
+                            tuple(constructors))
+        return window
+
+    def get_stats() -> CacheStats:
+        """Return chunk counters, misses being chunk loads from disk."""
+        return CacheStats(0, loads, evictions, len(chunks))
+
+    return open_zone, close_zone, get_zone, get_window, update_window, get_stats
+
+
+(
+    open_zone,
+    close_zone,
+    get_zone,
+    get_window,
+    update_window,
+    get_chunk_stats,
+) = _make_chunk_streamer()
+
+
+def _test():
+    """Stream a generated zone and check the windows and evictions."""
+    tilemap = tuple(("─" * 20 + "║" * 80)[y % 3:][:70] for y in range(70))
+    triggers = (
+        EnumObject(3, (5, 5, None, None)),
+        EnumObject(3, {"grid_y": 40, "grid_x": 60}),
+    )
+    zone = save_chunked_zone("user_data\\test_zone.pkl", tilemap, triggers, 16)
+    assert zone.chunk_rows == 5 and load_pickle("user_data\\test_zone.pkl") == zone
+
+    open_zone(zone)
+    window = update_window(5, 5)
+    assert (window.origin_y, window.origin_x) == (0, 0)
+    assert window.tilemap == tuple(row[:32] for row in tilemap[:32])
+    assert window.walkability[0][0] == 1 and window.walkability[0][31] == 0
+    assert window.world_object_constructors == triggers[:1]
+    assert update_window(6, 6) is None
+
+    window = update_window(40, 60)
+    assert (window.origin_y, window.origin_x) == (16, 32)
+    assert window.tilemap == tuple(row[32:70] for row in tilemap[16:64])
+    assert get_constructor_position(window.world_object_constructors[0]) == (24, 28)
+    assert get_chunk_stats().evictions == 2
+
+    update_window(69, 0)
+    assert get_chunk_stats().size <= (2 * CHUNK_RADIUS + 3) ** 2
+    close_zone()
+
+    for entry in os.listdir(native_path(zone.chunk_dir_path)):
+        os.remove(os.path.join(native_path(zone.chunk_dir_path), entry))
+    os.rmdir(native_path(zone.chunk_dir_path))
+    os.remove(native_path("user_data\\test_zone.pkl"))
+    print("all Tests passed")
+
+
+if __name__ == "__main__":
+    _test()
@@ -26,6 +26,14 @@ def auto_integer(func: Callable) -> Callable:
     return wrapper
 
 
+class CacheStats(NamedTuple):
+    """Counters reported by a bounded cache."""
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    size: int = 0
+
+
 class EnumObject(NamedTuple):
     """Store an object with an associated int.
 
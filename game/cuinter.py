@@ -10,25 +10,57 @@ Contributors:
 """
 
 from __future__ import annotations
-from copy import deepcopy
 import ctypes
 import curses
 import logging
 import math
 import time
-from typing import Callable, NamedTuple
+from bisect import bisect_right
+from collections import OrderedDict
+from typing import Callable, Iterable, NamedTuple
 from uuid import uuid4
-from common import EnumObject, move_toward
-from enums import EVENT_TYPES, RECTANGLE_PRESETS, UI_ELEMENT_TYPES
+from common import CacheStats, EnumObject, move_toward
+from enums import BACKEND_TYPES, EVENT_TYPES, RECTANGLE_PRESETS, RENDER_LAYERS, UI_ELEMENT_TYPES
+from headless import HeadlessScreen
 from lang import DialogLine
+import profiler
+from settings import DEFAULT_TARGET_FPS
 
 logger = logging.getLogger(__name__)
 
 X_CORRECTION = 2.6  # Hauteur / largeur d'un caractère
 CHARACTER_TIME = 0.025  # Délai d'affichage de chaque caractère dans les textes
+SPRITE_CACHE_SIZE = 256  # Number of compiled sprites kept in memory
+LAYOUT_CACHE_SIZE = 64  # Number of text layouts kept in memory
+RUN_MERGE_GAP = 4  # Unchanged cells resent rather than moving the cursor between two runs
 STDSCR_INIT_ERROR_MSG = "Stdscr not initialized"
 
 
+class RenderStats(NamedTuple):
+    """Terminal output of the last drawn frame.
+
+    Attributes:
+        cells (int): Number of cells sent to curses.
+        bytes (int): Number of UTF-8 bytes sent to curses.
+        is_full_redraw (bool): Whether the whole screen was repainted.
+    """
+    cells: int = 0
+    bytes: int = 0
+    is_full_redraw: bool = False
+
+
+class TextLayout(NamedTuple):
+    """Text wrapped into the rows of a box.
+
+    Attributes:
+        lines (tuple[str, ...]): Wrapped rows of text.
+        offsets (tuple[int, ...]): For text, index of the first char of each
+            row in the text. For options, first row of each option.
+    """
+    lines: tuple[str, ...] = ()
+    offsets: tuple[int, ...] = ()
+
+
 class Label(NamedTuple):
     """Displays single line text in the curses UI.
 
@@ -87,8 +119,7 @@ class Label(NamedTuple):
         if self.text is None:
             return
 
-        for i, char in enumerate(self.text):
-            set_cell(self.y, self.x + i, char)
+        set_span(self.y, self.x, self.text)
 
 
 class SpriteRenderer(NamedTuple):
@@ -120,15 +151,19 @@ class SpriteRenderer(NamedTuple):
         return max(len(row) for row in self.sprite)
 
     @classmethod
-    def new(cls, y: int, x: int, sprite: str = None, is_top_level: bool = True) -> SpriteRenderer:
-        """Create a new SpriteRenderer and optionally register it as a top-level UI element."""
+    def new(cls, y: int, x: int, sprite: str = None, is_top_level: bool = True,
+            layer: int = RENDER_LAYERS.SPRITES) -> SpriteRenderer:
+        """Create a new SpriteRenderer and optionally register it as a top-level UI element.
+
+        Sprites are drawn in the SPRITES layer unless another layer is given.
+        """
         logger.debug("Creating new SpriteRenderer")
 
         pid = int(uuid4())
         sprite_renderer = cls(pid, y, x, sprite)
 
         if is_top_level:
-            set_element(pid, sprite_renderer)
+            set_element(pid, sprite_renderer, layer)
 
         return sprite_renderer
 
@@ -146,6 +181,21 @@ class SpriteRenderer(NamedTuple):
 
         return sprite_renderer
 
+    def patch(self, sprite: str,
+              patches: Iterable[tuple[int, int, tuple[str, ...]]]) -> SpriteRenderer:
+        """Clone the SpriteRenderer with sprite, which only differs from the old one by patches.
+
+        Each (y, x, rows) of patches are rows of the new sprite from (y, x)
+        in it, only those are drawn again, see cuinter.patch_element().
+        """
+        sprite_renderer = SpriteRenderer(self.pid, self.y, self.x, sprite)
+        patch_element(
+            self.pid,
+            sprite_renderer,
+            [(self.y + y, self.x + x, rows) for y, x, rows in patches],
+        )
+        return sprite_renderer
+
     def delete(self) -> None:
         """Remove the SpriteRenderer from cuinter's active UI elements."""
         remove_element(self.pid)
@@ -155,11 +205,8 @@ class SpriteRenderer(NamedTuple):
         if self.sprite is None:
             return
 
-        for y, row in enumerate(self.sprite.split("\n")):
-            for x, char in enumerate(row):
-                if char == " ":
-                    continue
-                set_cell(self.y + y, self.x + x, char)
+        for y, x, text in compile_sprite(self.sprite):
+            set_span(self.y + y, self.x + x, text)
 
 
 class Rectangle(NamedTuple):
@@ -250,22 +297,13 @@ class Rectangle(NamedTuple):
             return
 
         y1, y2 = self.y, self.y + self.height
-        x1, x2 = self.x, self.x + self.width
-
-        set_cell(y1, x1, "┌")
-        set_cell(y1, x2, "┐")
-        set_cell(y2, x1, "└")
-        set_cell(y2, x2, "┘")
+        inner_width = self.width - 1
 
+        set_span(y1, self.x, "┌" + "─" * inner_width + "┐")
+        middle_row = "│" + " " * inner_width + "│"
         for y in range(y1 + 1, y2):
-            set_cell(y, x1, "│")
-            set_cell(y, x2, "│")
-            for x in range(x1 + 1, x2):
-                set_cell(y, x, " ")
-
-        for x in range(x1 + 1, x2):
-            set_cell(y1, x, "─")
-            set_cell(y2, x, "─")
+            set_span(y, self.x, middle_row)
+        set_span(y2, self.x, "└" + "─" * inner_width + "┘")
 
 
 class TextBox(NamedTuple):
@@ -334,24 +372,30 @@ class TextBox(NamedTuple):
         """Remove the TextBox from cuinter's active UI elements."""
         remove_element(self.pid)
 
-    def draw(self) -> None:
-        """Draw the TextBox with wrapped text."""
+    @property
+    def text_height(self) -> int:
+        """Number of rows of text fitting in the box."""
+        return max(self.height - 3, 0)
+
+    @property
+    def text_width(self) -> int:
+        """Number of columns of text fitting in the box."""
+        return max(self.width - 5, 0)
+
+    def draw_lines(self, lines: tuple[str, ...]) -> None:
+        """Draw the rectangle with lines of already wrapped text, clipped to the box."""
         self.rectangle.draw()
 
-        if self.text is None:
-            return
+        for y, line in enumerate(lines[:self.text_height]):
+            set_span(self.y + 2 + y, self.x + 3, line)
 
-        text_y = self.y + 2
-        text_x = self.x + 3
-        wrap = self.width - 5
-        current_y = text_y
+    def draw(self) -> None:
+        """Draw the TextBox with wrapped text, clipped to its height."""
+        if self.text is None or not self.text_width:
+            self.rectangle.draw()
+            return
 
-        for line in self.text.split("\n"):
-            for i, char in enumerate(line):
-                row = current_y + i // wrap
-                col = text_x + i % wrap
-                set_cell(row, col, char)
-            current_y += (len(line) + wrap - 1) // wrap or 1
+        self.draw_lines(layout_text(self.text, self.text_width).lines)
 
 
 class DialogBox(NamedTuple):
@@ -395,6 +439,15 @@ class DialogBox(NamedTuple):
         uncapped = math.floor((time.time() - self.start_time) / CHARACTER_TIME)
         return min(uncapped, len(self.current_text))
 
+    @property
+    def is_animated(self) -> bool:
+        """Return whether the current line is still being typed out."""
+        return (
+            self.dialog is not None
+            and isinstance(self.current_line, DialogLine)
+            and self.length_to_draw < len(self.current_text)
+        )
+
     @classmethod
     def new(cls, y: int = None, x: int = None, height: int = None,
             width: int = None,
@@ -476,18 +529,29 @@ class DialogBox(NamedTuple):
             self.delete()
 
     def draw(self) -> None:
-        """Draw the dialog box with the current line animated."""
-        if self.dialog is None:
+        """Draw the dialog box with the current line animated.
+
+        The whole line is laid out once, each frame only reveals more of it,
+        scrolling to keep the last revealed row in the box.
+        """
+        if self.dialog is None or not self.text_box.text_width:
             self.text_box.draw()
             return
 
         formatted_name = ""
         if self.current_line.character_name is not None:
             formatted_name = f"[{self.current_line.character_name}]: "
-        formatted_text = formatted_name + self.current_text[:self.length_to_draw]
+        layout = layout_text(self.current_text, self.text_box.text_width, formatted_name)
 
-        self.config(text=formatted_text)
-        get_elements()[self.pid].text_box.draw()
+        length = len(formatted_name) + self.length_to_draw
+        last_row = max(bisect_right(layout.offsets, length - 1) - 1, 0)
+        first_row = max(last_row - self.text_box.text_height + 1, 0)
+
+        self.text_box.draw_lines(tuple(
+            line[:length - offset]
+            for line, offset in zip(layout.lines[first_row:last_row + 1],
+                                    layout.offsets[first_row:last_row + 1])
+        ))
 
 
 class ChoiceBox(NamedTuple):
@@ -598,19 +662,172 @@ class ChoiceBox(NamedTuple):
         self.delete()
 
     def draw(self) -> None:
-        """Draw the ChoiceBox with the current selection highlighted."""
-        formatted_text = ""
-        for i, option in enumerate(self.options):
-            formatted_line = ("> " if i == self.selected_index else "  ") + option
-            formatted_text += formatted_line.ljust((self.width - 5) * 2)
+        """Draw the ChoiceBox with the current selection highlighted.
+
+        Options are laid out once, scrolling keeps the selection centered
+        when they do not fit in the box.
+        """
+        text_height = self.text_box.text_height
+        if not self.options or not self.text_box.text_width or not text_height:
+            self.text_box.draw()
+            return
+
+        layout = layout_options(self.options, self.text_box.text_width)
+        selected_row = layout.offsets[self.selected_index]
+        first_row = min(
+            max(selected_row - text_height // 2, 0),
+            max(len(layout.lines) - text_height, 0),
+        )
 
-        self.config(text=formatted_text)
-        get_elements()[self.pid].text_box.draw()
+        self.text_box.draw_lines(layout.lines[first_row:first_row + text_height])
+        set_span(self.y + 2 + selected_row - first_row, self.x + 3, ">")
+
+
+class Minimap(NamedTuple):
+    """Displays a framed part of a map of one character per cell, centered on a marker.
+
+    The part of the map in the frame is only cut again when the map, its
+    center or the frame change, so drawing the Minimap is writing the cut
+    rows. Map cells are opaque, spaces included.
+
+    Attributes:
+        pid (int): Persistent identifier.
+        rectangle (Rectangle): The frame, the map is drawn inside it.
+        rows (tuple[str, ...]): The whole map, each str is a row.
+        center_y (int): Row of the map shown in the middle, where the marker is.
+        center_x (int): Column of the map shown in the middle, where the marker is.
+        marker (str): Drawn at (center_y, center_x), None for no marker.
+        top (int): Row of the map shown in the first row of the frame.
+        left (int): Column of the map shown in the first column of the frame.
+        view (tuple[str, ...]): The rows drawn in the frame.
+    """
+    pid: int
+    rectangle: Rectangle
+    rows: tuple[str, ...]
+    center_y: int
+    center_x: int
+    marker: str
+    top: int
+    left: int
+    view: tuple[str, ...]
+
+    @staticmethod
+    def cut_view(rows: tuple[str, ...], center_y: int, center_x: int, height: int,
+                 width: int) -> tuple[int, int, tuple[str, ...]]:
+        """Return the top and left cells of rows shown around (center_y, center_x), and the rows shown.
+
+        The part stays within the map when the map is larger than it, and
+        the map is centered in it otherwise.
+        """
+        def axis(center: int, size: int, map_size: int) -> int:
+            if map_size <= size:
+                return -((size - map_size) // 2)
+            return min(max(center - size // 2, 0), map_size - size)
+
+        top = axis(center_y, height, len(rows))
+        left = axis(center_x, width, len(rows[0]) if rows else 0)
+        padding = " " * max(-left, 0)
+        view = tuple(
+            (padding + rows[y][max(left, 0):left + width]).ljust(width)
+            if 0 <= y < len(rows) else " " * width
+            for y in range(top, top + height)
+        )
+        return top, left, view
+
+    @property
+    def y(self) -> int:
+        return self.rectangle.y
+
+    @property
+    def x(self) -> int:
+        return self.rectangle.x
+
+    @property
+    def height(self) -> int:
+        return self.rectangle.height
+
+    @property
+    def width(self) -> int:
+        return self.rectangle.width
+
+    @classmethod
+    def new(cls, y: int = None, x: int = None, height: int = None, width: int = None,
+            rows: tuple[str, ...] = (), center_y: int = 0, center_x: int = 0,
+            marker: str = None, rectangle_preset: int = 0,
+            is_top_level: bool = True) -> Minimap:
+        """Create a new Minimap and optionally register as a top-level UI element."""
+        logger.debug("Creating new Minimap")
+
+        pid = int(uuid4())
+        rectangle = Rectangle.new(y, x, height, width, rectangle_preset, False)
+        minimap = cls(
+            pid,
+            rectangle,
+            rows,
+            center_y,
+            center_x,
+            marker,
+            *Minimap.cut_view(rows, center_y, center_x, rectangle.height - 1, rectangle.width - 1),
+        )
+
+        if is_top_level:
+            set_element(pid, minimap)
+
+        return minimap
+
+    def config(self, is_top_level: bool = True, **kwargs) -> Minimap:
+        """Clone the Minimap with updated attributes and optionally update in UI elements."""
+        rectangle = self.rectangle.config(False, **kwargs)
+        rows = kwargs.get("rows", self.rows)
+        center_y = kwargs.get("center_y", self.center_y)
+        center_x = kwargs.get("center_x", self.center_x)
+        if (rows is self.rows and center_y == self.center_y and center_x == self.center_x
+        and rectangle.height == self.height and rectangle.width == self.width):
+            view = (self.top, self.left, self.view)
+        else:
+            view = Minimap.cut_view(rows, center_y, center_x, rectangle.height - 1,
+                                    rectangle.width - 1)
+
+        minimap = Minimap(
+            self.pid,
+            rectangle,
+            rows,
+            center_y,
+            center_x,
+            kwargs.get("marker", self.marker),
+            *view,
+        )
+
+        if is_top_level:
+            set_element(self.pid, minimap)
+
+        return minimap
+
+    def delete(self) -> None:
+        """Remove the Minimap from cuinter's active UI elements."""
+        remove_element(self.pid)
+
+    def draw(self) -> None:
+        """Draw the frame and the part of the map in it in the display buffer."""
+        self.rectangle.draw()
+        for y, row in enumerate(self.view, self.y + 1):
+            set_span(y, self.x + 1, row)
+
+        marker_y = self.center_y - self.top
+        marker_x = self.center_x - self.left
+        if (self.marker is not None and 0 <= marker_y < len(self.view)
+        and 0 <= marker_x < self.width - 1):
+            set_span(self.y + 1 + marker_y, self.x + 1 + marker_x, self.marker)
 
 
 def _make_stdscr_manager() -> tuple[Callable, ...]:
-    """Creates getter/setter functions for the curses stdscr object and its properties."""
+    """Creates getter/setter functions for the curses stdscr object and its properties.
+
+    The screen size is cached, curses is only asked for it again on KEY_RESIZE.
+    """
     cache = None
+    height = 0
+    width = 0
 
     def get_cache() -> object:
         if cache is None:
@@ -620,60 +837,450 @@ def _make_stdscr_manager() -> tuple[Callable, ...]:
     def set_cache(stdscr: object) -> None:
         nonlocal cache
         cache = stdscr
+        refresh_cache_size()
+
+    def refresh_cache_size() -> None:
+        """Read the screen size from curses and resize the display buffer."""
+        nonlocal height, width
+        if cache is None:
+            logger.error(STDSCR_INIT_ERROR_MSG)
+            return
+        height, width = cache.getmaxyx()
+        resize_buffer(height, width)
 
     def get_cache_height() -> int:
         if cache is None:
             logger.error(STDSCR_INIT_ERROR_MSG)
-            return 0
-        return cache.getmaxyx()[0]
+        return height
 
     def get_cache_width() -> int:
         if cache is None:
             logger.error(STDSCR_INIT_ERROR_MSG)
-            return 0
-        return cache.getmaxyx()[1]
+        return width
 
-    def get_cache_empty_buffer() -> list[list[str]]:
-        return [[" " for _ in range(get_cache_width())] for _ in range(get_cache_height())]
-
-    return get_cache, set_cache, get_cache_height, get_cache_width, get_cache_empty_buffer
+    return get_cache, set_cache, refresh_cache_size, get_cache_height, get_cache_width
 
 
 def _make_buffer_manager() -> tuple[Callable, ...]:
-    """Creates functions to manage the display buffer."""
-    cache = deepcopy(get_empty_buffer())
-
-    def get_cache() -> list[list[str]]:
-        return cache
+    """Creates functions to manage the layered display buffer.
+
+    The WORLD layer is rasterized into its own preallocated flat list of cells,
+    the other layers only keep the spans their elements wrote, grouped by row.
+    A layer is only rasterized again once invalidated, and the frame is then
+    composited from the cached layers, in RENDER_LAYERS order. Small changes
+    of the WORLD layer can be patched into its cells instead, only the rows
+    they touch are composited again.
+
+    Each layer has an origin, the coordinates its elements use for the top
+    left cell of the screen, so a camera can scroll the WORLD and SPRITES
+    layers without changing their elements.
+
+    Cells are one-character strings rather than a bytearray or an array:
+    tiles and boxes use characters outside of one byte (║, ≈, ╔...), and
+    slice-assigning a string to the list still copies it without a Python
+    loop. For the same reason get_buffer() returns the frame as row strings,
+    which is also what curses draws, instead of lists of cells.
+    """
+    cache = []  # Composited frame, one flat list of cells row after row
+    base = []  # Rasterized WORLD layer
+    blank = []
+    layer_spans = {layer: {} for layer in RENDER_LAYERS}  # Row: [(x, text), ...]
+    origins = {layer: (0, 0) for layer in RENDER_LAYERS}
+    dirty_layers = set(RENDER_LAYERS)
+    patched_rows = set()  # Rows of the WORLD layer patched since the last composite
+    target_layer = RENDER_LAYERS.UI
+    height = 0
+    width = 0
+
+    def get_cache() -> list[str]:
+        """Return the composited frame as a list of row strings."""
+        return [get_cache_row(y) for y in range(height)]
+
+    def get_cache_row(y: int) -> str:
+        return "".join(cache[y * width:(y + 1) * width])
 
     def set_item(y: int, x: int, char: str = " ") -> None:
-        nonlocal cache
-        if 0 <= y < get_screen_height() and 0 <= x < get_screen_width():
-            cache[y][x] = char
+        set_items(y, x, char)
+
+    def set_items(y: int, x: int, text: str) -> None:
+        """Write text from (y, x) in the layer being rasterized, clipped to the screen."""
+        origin_y, origin_x = origins[target_layer]
+        y -= origin_y
+        x -= origin_x
+        if not 0 <= y < height:
+            return
+
+        start = max(x, 0)
+        end = min(x + len(text), width)
+        if start >= end:
+            return
+
+        if start != x or end - x != len(text):
+            text = text[start - x:end - x]
+
+        if target_layer == RENDER_LAYERS.WORLD:
+            offset = y * width
+            base[offset + start:offset + end] = text
+        else:
+            layer_spans[target_layer].setdefault(y, []).append((start, text))
+
+    def invalidate_layer(layer: int) -> None:
+        dirty_layers.add(layer)
+
+    def patch_layer(layer: int, patches: Iterable[tuple[int, int, tuple[str, ...]]]) -> None:
+        """Write each (y, x, rows) of patches from (y, x) in a layer, without rasterizing it again.
+
+        Spaces are written as they are, which is how a sprite is drawn over
+        the blank WORLD layer. Only the WORLD layer keeps its cells, other
+        layers are invalidated instead, so is a layer waiting to be rasterized.
+        """
+        if layer != RENDER_LAYERS.WORLD or layer in dirty_layers:
+            dirty_layers.add(layer)
+            return
+
+        origin_y, origin_x = origins[layer]
+        for y, x, rows in patches:
+            x -= origin_x
+            for row_y, text in enumerate(rows, y - origin_y):
+                if not 0 <= row_y < height:
+                    continue
+                start = max(x, 0)
+                end = min(x + len(text), width)
+                if start >= end:
+                    continue
+                offset = row_y * width
+                base[offset + start:offset + end] = text[start - x:end - x]
+                patched_rows.add(row_y)
+
+    def has_patched_rows() -> bool:
+        """Return whether rows were patched since the last composite, a frame is then due."""
+        return bool(patched_rows)
+
+    def pop_patched_rows() -> set[int]:
+        """Return the rows patched since the last call, which need to be composited again."""
+        rows = set(patched_rows)
+        patched_rows.clear()
+        return rows
+
+    def get_layer_origin(layer: int) -> tuple[int, int]:
+        return origins[layer]
+
+    def set_layer_origin(layer: int, y: int, x: int) -> None:
+        """Make (y, x) the top left cell of the screen in layer."""
+        if origins[layer] != (y, x):
+            origins[layer] = (y, x)
+            dirty_layers.add(layer)
+
+    def get_dirty_layers() -> list[int]:
+        return sorted(dirty_layers)
+
+    def rasterize_layer(layer: int, elements: list[object]) -> set[int] | None:
+        """Draw elements into layer.
+
+        Returns the rows whose content may have changed, None meaning all rows.
+        """
+        nonlocal target_layer
+
+        if layer == RENDER_LAYERS.WORLD:
+            base[:] = blank
+            changed_rows = None
+        else:
+            changed_rows = set(layer_spans[layer])
+            layer_spans[layer].clear()
+
+        target_layer = layer
+        for element in elements:
+            start = time.perf_counter()
+            element.draw()
+            profiler.add_section("draw", type(element).__name__, start)
+        target_layer = RENDER_LAYERS.UI
+        dirty_layers.discard(layer)
+
+        if changed_rows is not None:
+            changed_rows.update(layer_spans[layer])
+        return changed_rows
+
+    def composite_cache(rows: set[int] | None) -> None:
+        """Rebuild rows of the frame from the cached layers, None meaning all rows."""
+        if rows is None:
+            cache[:] = base
+            rows = range(height)
+        else:
+            for y in rows:
+                cache[y * width:(y + 1) * width] = base[y * width:(y + 1) * width]
+
+        for layer in RENDER_LAYERS:
+            spans = layer_spans[layer]
+            if not spans:
+                continue
+            for y in rows:
+                offset = y * width
+                for x, text in spans.get(y, ()):
+                    cache[offset + x:offset + x + len(text)] = text
+
+    def resize_cache(new_height: int, new_width: int) -> None:
+        nonlocal blank, height, width
+        height, width = new_height, new_width
+        blank = [" "] * (height * width)
+        cache[:] = blank
+        base[:] = blank
+        for spans in layer_spans.values():
+            spans.clear()
+        patched_rows.clear()
+        dirty_layers.update(RENDER_LAYERS)
+
+    return (
+        get_cache,
+        get_cache_row,
+        set_item,
+        set_items,
+        invalidate_layer,
+        patch_layer,
+        has_patched_rows,
+        pop_patched_rows,
+        get_layer_origin,
+        set_layer_origin,
+        get_dirty_layers,
+        rasterize_layer,
+        composite_cache,
+        resize_cache,
+    )
+
+
+def _make_sprite_cache_manager() -> tuple[Callable, ...]:
+    """Creates functions to compile sprites into cached opaque spans.
+
+    A compiled sprite is a tuple of (row, column, text) spans without spaces,
+    so drawing it is one buffer slice write per span. The SPRITE_CACHE_SIZE
+    most recently drawn sprites are kept, keyed by the sprite string.
+    """
+    cache = OrderedDict()
+    hits = 0
+    misses = 0
+    evictions = 0
+
+    def compile_item(sprite: str) -> tuple[tuple[int, int, str], ...]:
+        nonlocal hits, misses, evictions
+        spans = cache.get(sprite)
+        if spans is not None:
+            hits += 1
+            cache.move_to_end(sprite)
+            return spans
+
+        misses += 1
+        spans = []
+        for y, row in enumerate(sprite.split("\n")):
+            x = 0
+            for text in row.split(" "):
+                if text:
+                    spans.append((y, x, text))
+                x += len(text) + 1
+
+        spans = tuple(spans)
+        cache[sprite] = spans
+        if len(cache) > SPRITE_CACHE_SIZE:
+            cache.popitem(last=False)
+            evictions += 1
+
+        return spans
+
+    def get_stats() -> CacheStats:
+        return CacheStats(hits, misses, evictions, len(cache))
 
     def clear_cache() -> None:
-        nonlocal cache
-        cache = deepcopy(get_empty_buffer())
+        nonlocal hits, misses, evictions
+        cache.clear()
+        hits = 0
+        misses = 0
+        evictions = 0
+
+    return compile_item, get_stats, clear_cache
 
-    return get_cache, set_item, clear_cache
+
+def _make_layout_cache_manager() -> tuple[Callable, ...]:
+    """Creates functions to wrap text into cached TextLayouts.
+
+    Text is wrapped once per distinct text and width, the LAYOUT_CACHE_SIZE
+    most recently drawn layouts are kept. The box height is not part of the
+    key, elements clip or scroll through the layout when drawing it.
+    """
+    cache = OrderedDict()
+    hits = 0
+    misses = 0
+    evictions = 0
+
+    def get_item(key: tuple) -> TextLayout | None:
+        nonlocal hits, misses
+        layout = cache.get(key)
+        if layout is None:
+            misses += 1
+        else:
+            hits += 1
+            cache.move_to_end(key)
+        return layout
+
+    def set_item(key: tuple, layout: TextLayout) -> TextLayout:
+        nonlocal evictions
+        cache[key] = layout
+        if len(cache) > LAYOUT_CACHE_SIZE:
+            cache.popitem(last=False)
+            evictions += 1
+        return layout
+
+    def layout_item(text: str, width: int, prefix: str = "") -> TextLayout:
+        """Return prefix + text wrapped every width chars, "\n" starting a new row.
+
+        The prefix is kept apart from text in the key so that long texts are
+        not copied to look their layout up.
+        """
+        key = (text, width, prefix)
+        layout = get_item(key)
+        if layout is not None:
+            return layout
+
+        lines = []
+        offsets = []
+        offset = 0
+        for paragraph in (prefix + text).split("\n"):
+            for start in range(0, len(paragraph), width) or (0,):
+                lines.append(paragraph[start:start + width])
+                offsets.append(offset + start)
+            offset += len(paragraph) + 1
+
+        return set_item(key, TextLayout(tuple(lines), tuple(offsets)))
+
+    def layout_options(options: tuple[str, ...], width: int) -> TextLayout:
+        """Return options indented and wrapped every width chars, each followed by a blank row."""
+        key = (options, width)
+        layout = get_item(key)
+        if layout is not None:
+            return layout
+
+        lines = []
+        offsets = []
+        for option in options:
+            offsets.append(len(lines))
+            option = "  " + option
+            lines.extend(option[start:start + width] for start in range(0, len(option), width))
+            lines.append("")
+
+        return set_item(key, TextLayout(tuple(lines), tuple(offsets)))
+
+    def get_stats() -> CacheStats:
+        return CacheStats(hits, misses, evictions, len(cache))
+
+    def clear_cache() -> None:
+        nonlocal hits, misses, evictions
+        cache.clear()
+        hits = 0
+        misses = 0
+        evictions = 0
+
+    return layout_item, layout_options, get_stats, clear_cache
 
 
 def _make_element_manager() -> tuple[Callable, ...]:
-    """Creates functions to manage active UI elements."""
+    """Creates functions to manage active UI elements.
+
+    Each element belongs to a render layer, which is invalidated whenever one
+    of its elements is added, changed or removed.
+    """
     cache = {}
+    layers = {}
 
     def get_cache() -> dict[int, object]:
         return cache
 
-    def set_item(pid: int, element: object) -> None:
+    def get_layer_items(layer: int) -> list[object]:
+        return [element for pid, element in cache.items() if layers[pid] == layer]
+
+    def get_item_layer(pid: int) -> int:
+        return layers[pid]
+
+    def set_item(pid: int, element: object, layer: int = None) -> None:
+        """Add or replace an element, keeping its layer unless a new one is given."""
         nonlocal cache
+        old_layer = layers.get(pid)
+        if layer is None:
+            layer = RENDER_LAYERS.UI if old_layer is None else old_layer
+
+        if old_layer != layer:
+            if old_layer is not None:
+                invalidate_layer(old_layer)
+            invalidate_layer(layer)
+        elif cache[pid] != element:
+            invalidate_layer(layer)
+
+        cache[pid] = element
+        layers[pid] = layer
+
+    def patch_item(pid: int, element: object,
+                   patches: Iterable[tuple[int, int, tuple[str, ...]]]) -> None:
+        """Replace an element by a copy which only draws differently in patches.
+
+        Its layer is patched instead of invalidated, see patch_layer().
+        """
         cache[pid] = element
+        patch_layer(layers[pid], patches)
 
     def remove_item(pid: int) -> None:
         nonlocal cache
+        invalidate_layer(layers.pop(pid))
         del cache[pid]
 
-    return get_cache, set_item, remove_item
+    return get_cache, get_layer_items, get_item_layer, set_item, patch_item, remove_item
+
+
+def _make_scheduler_manager() -> tuple[Callable, ...]:
+    """Creates functions to pace frames.
+
+    Frames are spaced to reach the target FPS. When idle, meaning no layer
+    needs to be drawn again (animated elements keep theirs invalidated), input
+    is waited for until the next wake time instead, or indefinitely if none.
+    """
+    target_fps = DEFAULT_TARGET_FPS
+    frame_time = 0  # Start time of the last frame
+    wake_times = []
+
+    def get_target_fps() -> int:
+        return target_fps
+
+    def set_target_fps(fps: int) -> None:
+        nonlocal target_fps
+        target_fps = fps
+
+    def add_wake_time(wake_time: float) -> None:
+        """Make sure a frame runs at wake_time (time.time()), even when idle."""
+        wake_times.append(wake_time)
+
+    def start_frame() -> None:
+        nonlocal frame_time
+        frame_time = time.time()
+
+    def get_input_timeout(can_idle: bool = True) -> int:
+        """Return how long to wait for input before the next frame, in milliseconds.
+
+        Returns -1 to wait for input indefinitely.
+        """
+        nonlocal wake_times
+        current_time = time.time()
+        wake_times = [wake_time for wake_time in wake_times if wake_time > current_time]
+        next_frame_time = frame_time + 1 / target_fps if target_fps else current_time
+
+        is_idle = (
+            can_idle
+            and not get_dirty_layers()
+            and not has_patched_rows()
+            and get_last_frame() is not None
+        )
+        if is_idle:
+            if not wake_times:
+                return -1
+            next_frame_time = max(next_frame_time, min(wake_times))
+
+        return max(0, math.ceil((next_frame_time - current_time) * 1000))
+
+    return get_target_fps, set_target_fps, add_wake_time, start_frame, get_input_timeout
 
 
 def _make_event_manager() -> tuple[Callable, ...]:
@@ -694,52 +1301,144 @@ def _make_event_manager() -> tuple[Callable, ...]:
     return get_cache, add_item, clear_cache
 
 
+def _make_frame_manager() -> tuple[Callable, ...]:
+    """Creates functions to manage the last frame sent to the terminal."""
+    cache = None
+    stats = RenderStats()
+
+    def get_cache() -> list[str] | None:
+        return cache
+
+    def set_cache(frame: list[str]) -> None:
+        nonlocal cache
+        cache = frame
+
+    def clear_cache() -> None:
+        """Forget the last frame so the next one repaints the whole screen."""
+        nonlocal cache
+        cache = None
+
+    def get_stats() -> RenderStats:
+        return stats
+
+    def set_stats(render_stats: RenderStats) -> None:
+        nonlocal stats
+        stats = render_stats
+
+    return get_cache, set_cache, clear_cache, get_stats, set_stats
+
+
+def _get_changed_runs(row: str, last_row: str) -> list[tuple[int, str]]:
+    """Return the (x, text) runs of row that differ from last_row.
+
+    Runs separated by at most RUN_MERGE_GAP unchanged cells are merged, moving
+    the cursor costs more bytes than resending a few cells.
+    """
+    runs = []
+    start = None
+    end = 0
+
+    for x, (char, last_char) in enumerate(zip(row, last_row)):
+        if char == last_char:
+            continue
+
+        if start is None:
+            start = x
+        elif x - end > RUN_MERGE_GAP:
+            runs.append((start, row[start:end]))
+            start = x
+
+        end = x + 1
+
+    if start is not None:
+        runs.append((start, row[start:end]))
+
+    return runs
+
+
 def _draw() -> None:
-    """Display the buffer in rows instead of individual characters to improve performance."""
+    """Composite the invalidated layers and patched rows, send the cells that changed to curses.
+
+    The whole screen is only repainted after a resize or request_full_redraw().
+    """
     stdscr = get_stdscr()
     if stdscr is None:
         return
 
-    clear_buffer()
-    stdscr.clear()
+    last_frame = get_last_frame()
+    dirty_layers = get_dirty_layers()
+    changed_rows = pop_patched_rows()
+    if not dirty_layers and not changed_rows and last_frame is not None:
+        set_render_stats(RenderStats())
+        return
 
-    for element in get_elements().values():
-        element.draw()
+    for layer in dirty_layers:
+        layer_rows = rasterize_layer(layer, get_layer_elements(layer))
+        if layer_rows is None:
+            changed_rows = None
+        elif changed_rows is not None:
+            changed_rows.update(layer_rows)
+
+    is_full_redraw = last_frame is None
+    if is_full_redraw:
+        changed_rows = None
+
+    start = time.perf_counter()
+    composite_buffer(changed_rows)
+    profiler.add_section("composite", "composite_buffer", start)
+
+    screen_height = get_screen_height()
+    screen_width = get_screen_width()
+    if is_full_redraw:
+        stdscr.clear()
+        last_frame = [" " * screen_width] * screen_height
+    if changed_rows is None:
+        changed_rows = range(screen_height)
+
+    start = time.perf_counter()
+    cells = 0
+    byte_count = 0
+
+    for y in sorted(changed_rows):
+        row = get_buffer_row(y)
+        last_row = last_frame[y]
+        if row == last_row:
+            continue
 
-    for y, row in enumerate(get_buffer()):
-        row_str = ""
-        prev_x = 0
-        first_x = None
+        for x, run in _get_changed_runs(row, last_row):
+            # Writing the bottom right cell makes curses scroll, skip it
+            if y == screen_height - 1 and x + len(run) >= screen_width:
+                run = run[:screen_width - 1 - x]
+                if not run:
+                    continue
 
-        for x, char in enumerate(row):
-            if char == " ":
-                continue
+            stdscr.addstr(y, x, run)
+            cells += len(run)
+            byte_count += len(run.encode("utf-8"))
 
-            if first_x is None:
-                row_str += char
-                first_x = x
-            else:
-                row_str += " " * (x - prev_x - 1) + char
+        last_frame[y] = row
 
-            prev_x = x
+    stdscr.refresh()
+    profiler.add_section("flush", "addstr", start)
 
-        if first_x is None:
-            continue
+    # Layers holding animated elements are drawn again next frame
+    for pid, element in get_elements().items():
+        if getattr(element, "is_animated", False):
+            invalidate_layer(get_element_layer(pid))
 
-        if (
-            y == stdscr.getmaxyx()[0] - 1
-            and first_x + len(row_str) == stdscr.getmaxyx()[1]
-        ):
-            row_str = row_str[:-1]
+    set_last_frame(last_frame)
+    set_render_stats(RenderStats(cells, byte_count, is_full_redraw))
 
-        stdscr.move(y, first_x)
-        stdscr.addstr(row_str)
 
-    stdscr.refresh()
+def fullscreen() -> None:
+    """Simulate the F11 key being pressed to toggle fullscreen mode.
 
+    Only available on Windows, does nothing elsewhere.
+    """
+    if not hasattr(ctypes, "windll"):
+        logger.debug("Fullscreen toggle not available on this platform")
+        return
 
-def fullscreen() -> None:
-    """Simulate the F11 key being pressed to toggle fullscreen mode."""
     logger.debug("Toggling fullscreen")
 
     user32 = ctypes.windll.user32
@@ -747,34 +1446,63 @@ def fullscreen() -> None:
     user32.keybd_event(0x7A, 0, 0x0002, 0)
 
 
-def setup() -> None:
-    """Initialize the curses window and configure the UI."""
+def _setup_curses() -> object:
+    """Open the curses terminal in fullscreen."""
     time.sleep(0.5)
     fullscreen()
     time.sleep(0.5)
 
     stdscr = curses.initscr()
-
     curses.curs_set(0)  # Hide cursor
+
+    return stdscr
+
+
+def setup(backend: int = BACKEND_TYPES.CURSES, **kwargs) -> None:
+    """Initialize the terminal backend and configure the UI.
+
+    kwargs are passed to the backend setup function in BACKEND_SETUPS, such as
+    the size and scripted keys of the headless backend.
+    """
+    logger.debug(f"Setting up backend {backend}")
+
+    stdscr = BACKEND_SETUPS[backend](**kwargs)
+
     stdscr.nodelay(1)   # No input blocking
     stdscr.timeout(0)   # No input timeout
 
     set_stdscr(stdscr)
 
 
-def update() -> list[EnumObject]:
-    """Process inputs and draw active UI elements.
+def update(can_idle: bool = True) -> list[EnumObject]:
+    """Wait for the next frame, process inputs and draw active UI elements.
 
-    Returns a dictionary of events for main.py to handle.
+    Blocks on input until the next scheduled wake time when nothing is
+    animated, unless can_idle is False, for example while the caller still has
+    events to process. Returns a dictionary of events for main.py to handle.
     Doesn't behave like tkinter's mainloop, has to be called within a loop.
+
+    Each call starts a new profiler frame, whose input section includes the
+    time spent waiting in getch().
     """
     stdscr = get_stdscr()
     if stdscr is None:
         return []
 
     clear_events()
+    profiler.start_frame()
+    start = time.perf_counter()
+    stdscr.timeout(get_input_timeout(can_idle))
     key = stdscr.getch()
-    if not key is None:
+    profiler.add_section("input", "getch", start)
+    start_frame()
+
+    if key == curses.KEY_RESIZE:
+        refresh_screen_size()
+        request_full_redraw()
+
+    if key != curses.ERR:
+        start = time.perf_counter()
         for element in reversed(get_elements().values()):
             try:
                 element.key_input(key)
@@ -784,12 +1512,18 @@ def update() -> list[EnumObject]:
                 break
         else:
             add_event(EnumObject(EVENT_TYPES.PRESS_KEY, key))
+        profiler.add_section("input", "key_input", start)
 
     _draw()
 
     return get_events()
 
 
+BACKEND_SETUPS = {
+    BACKEND_TYPES.CURSES: _setup_curses,
+    BACKEND_TYPES.HEADLESS: HeadlessScreen.new,
+}
+
 UI_ELEMENT_CLASSES = {
     UI_ELEMENT_TYPES.LABEL: Label,
     UI_ELEMENT_TYPES.SPRITE_RENDERER: SpriteRenderer,
@@ -797,25 +1531,65 @@ UI_ELEMENT_CLASSES = {
     UI_ELEMENT_TYPES.TEXT_BOX: TextBox,
     UI_ELEMENT_TYPES.DIALOG_BOX: DialogBox,
     UI_ELEMENT_TYPES.CHOICE_BOX: ChoiceBox,
+    UI_ELEMENT_TYPES.MINIMAP: Minimap,
 }
 
 (
     get_stdscr,
     set_stdscr,
+    refresh_screen_size,
     get_screen_height,
     get_screen_width,
-    get_empty_buffer,
 ) = _make_stdscr_manager()
 (
     get_buffer,
+    get_buffer_row,
     set_cell,
-    clear_buffer,
+    set_span,
+    invalidate_layer,
+    patch_layer,
+    has_patched_rows,
+    pop_patched_rows,
+    get_layer_origin,
+    set_layer_origin,
+    get_dirty_layers,
+    rasterize_layer,
+    composite_buffer,
+    resize_buffer,
 ) = _make_buffer_manager()
+(
+    compile_sprite,
+    get_sprite_cache_stats,
+    clear_sprite_cache,
+) = _make_sprite_cache_manager()
+(
+    layout_text,
+    layout_options,
+    get_layout_cache_stats,
+    clear_layout_cache,
+) = _make_layout_cache_manager()
+(
+    get_last_frame,
+    set_last_frame,
+    request_full_redraw,
+    get_render_stats,
+    set_render_stats,
+) = _make_frame_manager()
 (
     get_elements,
+    get_layer_elements,
+    get_element_layer,
     set_element,
+    patch_element,
     remove_element,
 ) = _make_element_manager()
+(
+    get_target_fps,
+    set_target_fps,
+    add_wake_time,
+    start_frame,
+    get_input_timeout,
+) = _make_scheduler_manager()
 (
     get_events,
     add_event,
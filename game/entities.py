@@ -0,0 +1,488 @@
+"""Entity-component store of the world objects of a zone.
+
+World objects are entities, plain int ids, whose data is split into
+components: a grid position, a sprite, a walk trigger, a character. Each
+component is stored as a struct of arrays, one column per field and one row
+per entity having it, so systems go through flat columns instead of
+NamedTuples, and moving an entity writes its position in place instead of
+building new objects. Rows are kept dense, removing an entity moves the last
+row into its place.
+
+A tile index finds the entities on a tile, and a single EntityRenderer draws
+the sprites of the entities on the tiles the camera sees, so walking around
+and drawing a zone of tens of thousands of world objects costs as much as
+the part of it on screen.
+
+Contributors:
+    Romain
+"""
+
+from __future__ import annotations
+from array import array
+from itertools import count
+import logging
+from typing import Callable, Iterable, Iterator, NamedTuple
+from uuid import uuid4
+from common import EnumObject
+import cuinter
+from cuinter import compile_sprite, set_span
+from enums import COMPONENTS, RENDER_LAYERS
+from world import TILE_HEIGHT, TILE_WIDTH, CollisionMap, GridMultiSprite, GridSprite
+from world import WalkTrigger, WorldCharacter
+
+logger = logging.getLogger(__name__)
+
+DRAW_MARGIN = 1  # Tiles drawn around the camera view, for sprites overflowing their tile
+
+
+class ComponentArrays(NamedTuple):
+    """The values of a component for the entities which have it, as parallel columns.
+
+    Attributes:
+        entities (list[int]): Entity of each row.
+        rows (dict[int, int]): Row of each entity.
+        columns (tuple[list | array, ...]): One column per field of the component.
+    """
+    entities: list[int]
+    rows: dict[int, int]
+    columns: tuple[list | array, ...]
+
+    @classmethod
+    def new(cls, *columns: list | array) -> ComponentArrays:
+        return cls([], {}, columns)
+
+    def get(self, entity: int) -> tuple | None:
+        """Return the fields of entity, None if it doesn't have the component."""
+        row = self.rows.get(entity)
+        if row is None:
+            return None
+        return tuple(column[row] for column in self.columns)
+
+    def set(self, entity: int, values: tuple) -> None:
+        """Give entity the component with values, one per column."""
+        row = self.rows.get(entity)
+        if row is None:
+            self.rows[entity] = len(self.entities)
+            self.entities.append(entity)
+            for column, value in zip(self.columns, values):
+                column.append(value)
+        else:
+            for column, value in zip(self.columns, values):
+                column[row] = value
+
+    def remove(self, entity: int) -> None:
+        """Remove the component from entity, the last row taking its place."""
+        row = self.rows.pop(entity, None)
+        if row is None:
+            return
+
+        last_entity = self.entities.pop()
+        if last_entity != entity:
+            self.entities[row] = last_entity
+            self.rows[last_entity] = row
+        for column in self.columns:
+            value = column.pop()
+            if last_entity != entity:
+                column[row] = value
+
+
+class EntityStore(NamedTuple):
+    """The entities of a zone and their components.
+
+    Every entity has a POSITION, (grid_y, grid_x, y_offset, x_offset) with
+    offsets in world coordinates. The other components are SPRITE (sprite,
+    sprite_sheet, sprite_key), TRIGGER (on_trigger_event, key) and
+    CHARACTER (character,). Listeners are called with the entities drawn
+    differently, whose sprite changed or which moved, see EntityRenderer.
+
+    Attributes:
+        components (tuple[ComponentArrays, ...]): Indexed by COMPONENTS.
+        tile_index (dict[tuple[int, int], list[int]]): Entities on each (grid_y, grid_x) tile.
+        entity_ids (Iterator[int]): Ids given to the next entities.
+        listeners (list[Callable]): Called with the entities drawn differently.
+    """
+    components: tuple[ComponentArrays, ...]
+    tile_index: dict[tuple[int, int], list[int]]
+    entity_ids: Iterator[int]
+    listeners: list[Callable]
+
+    @classmethod
+    def new(cls) -> EntityStore:
+        components = [None] * len(COMPONENTS)
+        components[COMPONENTS.POSITION] = ComponentArrays.new(
+            array("i"), array("i"), array("i"), array("i"),
+        )
+        components[COMPONENTS.SPRITE] = ComponentArrays.new([], [], [])
+        components[COMPONENTS.TRIGGER] = ComponentArrays.new([], [])
+        components[COMPONENTS.CHARACTER] = ComponentArrays.new([])
+        return cls(tuple(components), {}, count(), [])
+
+    @property
+    def entity_count(self) -> int:
+        return len(self.components[COMPONENTS.POSITION].entities)
+
+    def add_entity(self, grid_y: int, grid_x: int, y_offset: int = 0, x_offset: int = 0) -> int:
+        """Create an entity on a tile and return it."""
+        entity = next(self.entity_ids)
+        self.components[COMPONENTS.POSITION].set(entity, (grid_y, grid_x, y_offset, x_offset))
+        self.tile_index.setdefault((grid_y, grid_x), []).append(entity)
+        return entity
+
+    def remove_entity(self, entity: int) -> None:
+        """Remove entity and all its components."""
+        position = self.get(entity, COMPONENTS.POSITION)
+        if position is None:
+            return
+
+        is_drawn = self.has(entity, COMPONENTS.SPRITE)
+        self._unindex(entity, position[0], position[1])
+        for component in self.components:
+            component.remove(entity)
+        if is_drawn:
+            self._notify([entity])
+
+    def has(self, entity: int, component: int) -> bool:
+        return entity in self.components[component].rows
+
+    def get(self, entity: int, component: int) -> tuple | None:
+        """Return the fields of a component of entity, None if it doesn't have it."""
+        return self.components[component].get(entity)
+
+    def set(self, entity: int, component: int, values: Iterable[object]) -> None:
+        """Give entity a component with values, or change its values.
+
+        Raises KeyError if entity doesn't exist.
+        """
+        values = tuple(values)
+        if component == COMPONENTS.POSITION:
+            # Moved in place through the tile index, then only the offsets are written
+            is_changed = self._move(entity, values[0], values[1])
+            position = self.components[COMPONENTS.POSITION]
+            row = position.rows[entity]
+            for column, value in zip(position.columns[2:], values[2:]):
+                if column[row] != value:
+                    column[row] = value
+                    is_changed = True
+            if is_changed and self.has(entity, COMPONENTS.SPRITE):
+                self._notify([entity])
+            return
+        if not self.has(entity, COMPONENTS.POSITION):
+            raise KeyError(f"No entity {entity}")
+
+        self.components[component].set(entity, values)
+        if component == COMPONENTS.SPRITE:
+            self._notify([entity])
+
+    def remove(self, entity: int, component: int) -> None:
+        """Remove a component from entity, which can't lose its POSITION, see remove_entity()."""
+        if component == COMPONENTS.POSITION:
+            raise ValueError("Entities can't lose their position, remove them instead")
+        is_drawn = component == COMPONENTS.SPRITE and self.has(entity, component)
+        self.components[component].remove(entity)
+        if is_drawn:
+            self._notify([entity])
+
+    def query(self, *components: int) -> list[int]:
+        """Return the entities having all of components, in the row order of the rarest one."""
+        component_arrays = sorted(
+            (self.components[component] for component in components),
+            key=lambda component_array: len(component_array.entities),
+        )
+        rarest = component_arrays[0]
+        others = [component_array.rows for component_array in component_arrays[1:]]
+        if not others:
+            return list(rarest.entities)
+        return [entity for entity in rarest.entities if all(entity in rows for rows in others)]
+
+    def get_entities_at(self, grid_y: int, grid_x: int) -> list[int]:
+        """Return the entities on a tile, in the order they got there."""
+        return self.tile_index.get((grid_y, grid_x), [])
+
+    def get_position(self, entity: int) -> tuple[int, int]:
+        """Return the (grid_y, grid_x) tile of entity."""
+        position = self.components[COMPONENTS.POSITION]
+        row = position.rows[entity]
+        return position.columns[0][row], position.columns[1][row]
+
+    def set_position(self, entity: int, grid_y: int, grid_x: int) -> None:
+        """Move entity to a tile, in place."""
+        if self._move(entity, grid_y, grid_x) and self.has(entity, COMPONENTS.SPRITE):
+            self._notify([entity])
+
+    def add_listener(self, listener: Callable) -> None:
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener: Callable) -> None:
+        self.listeners.remove(listener)
+
+    def _move(self, entity: int, grid_y: int, grid_x: int) -> bool:
+        """Move entity to a tile without notifying, return whether it moved."""
+        position = self.components[COMPONENTS.POSITION]
+        row = position.rows[entity]
+        grid_ys, grid_xs = position.columns[0], position.columns[1]
+        if grid_ys[row] == grid_y and grid_xs[row] == grid_x:
+            return False
+
+        self._unindex(entity, grid_ys[row], grid_xs[row])
+        grid_ys[row] = grid_y
+        grid_xs[row] = grid_x
+        self.tile_index.setdefault((grid_y, grid_x), []).append(entity)
+        return True
+
+    def _unindex(self, entity: int, grid_y: int, grid_x: int) -> None:
+        entities = self.tile_index[grid_y, grid_x]
+        entities.remove(entity)
+        if not entities:
+            del self.tile_index[grid_y, grid_x]
+
+    def _notify(self, entities: list[int]) -> None:
+        for listener in list(self.listeners):
+            listener(entities)
+
+
+def add_world_object(store: EntityStore, world_object: object) -> int:
+    """Add a GridSprite, GridMultiSprite, WorldCharacter or WalkTrigger as an entity and return it.
+
+    The world object's own sprite is removed, the store's EntityRenderer
+    draws it from then on.
+    """
+    if isinstance(world_object, WalkTrigger):
+        entity = store.add_entity(world_object.grid_y, world_object.grid_x)
+        store.set(entity, COMPONENTS.TRIGGER, (world_object.on_trigger_event, world_object.key))
+        return entity
+
+    character = None
+    grid_multi_sprite = world_object
+    if isinstance(world_object, WorldCharacter):
+        character = world_object.character
+        grid_multi_sprite = world_object.grid_multi_sprite
+
+    if isinstance(grid_multi_sprite, GridMultiSprite):
+        grid_sprite = grid_multi_sprite.grid_sprite
+        sprite_sheet = grid_multi_sprite.sprite_sheet
+        sprite_key = grid_multi_sprite.sprite_key
+    elif isinstance(grid_multi_sprite, GridSprite):
+        grid_sprite = grid_multi_sprite
+        sprite_sheet = None
+        sprite_key = None
+    else:
+        raise TypeError(f"Not a world object: {world_object!r}")
+
+    entity = store.add_entity(
+        grid_sprite.grid_y,
+        grid_sprite.grid_x,
+        grid_sprite.y_offset,
+        grid_sprite.x_offset,
+    )
+    sprite = grid_sprite.sprite_renderer.sprite
+    store.set(entity, COMPONENTS.SPRITE, (sprite, sprite_sheet, sprite_key))
+    if character is not None:
+        store.set(entity, COMPONENTS.CHARACTER, (character,))
+    world_object.delete()
+    return entity
+
+
+def set_sprite_key(store: EntityStore, entity: int, sprite_key: str) -> None:
+    """Show the sprite of sprite_key in the sprite sheet of entity."""
+    sprite, sprite_sheet, old_sprite_key = store.get(entity, COMPONENTS.SPRITE)
+    if sprite_key != old_sprite_key:
+        store.set(entity, COMPONENTS.SPRITE, (sprite_sheet[sprite_key], sprite_sheet, sprite_key))
+
+
+def move_entities(store: EntityStore, entities: Iterable[int], move_y: int, move_x: int,
+                  collision_map: CollisionMap = None) -> list[int]:
+    """Move entities by (move_y, move_x) tiles in place and return those which moved.
+
+    Entities whose destination isn't walkable in collision_map stay where
+    they are. Listeners are called once, with all the moved sprites.
+    """
+    position = store.components[COMPONENTS.POSITION]
+    grid_ys, grid_xs = position.columns[0], position.columns[1]
+    rows = [(entity, position.rows[entity]) for entity in entities]
+    destinations = [(grid_ys[row] + move_y, grid_xs[row] + move_x) for _, row in rows]
+    if collision_map is None:
+        are_walkable = [True] * len(rows)
+    else:
+        are_walkable = collision_map.are_walkable(destinations)
+
+    tile_index = store.tile_index
+    moved = []
+    for (entity, row), (grid_y, grid_x), is_walkable in zip(rows, destinations, are_walkable):
+        if not is_walkable:
+            continue
+        store._unindex(entity, grid_ys[row], grid_xs[row])
+        grid_ys[row] = grid_y
+        grid_xs[row] = grid_x
+        tile_index.setdefault((grid_y, grid_x), []).append(entity)
+        moved.append(entity)
+
+    sprite_rows = store.components[COMPONENTS.SPRITE].rows
+    drawn = [entity for entity in moved if entity in sprite_rows]
+    if drawn:
+        store._notify(drawn)
+    return moved
+
+
+def get_trigger_events_at(store: EntityStore, grid_y: int, grid_x: int,
+                          key: int = None) -> list[EnumObject]:
+    """Return the events of the walk triggers on a tile bound to key, or to no key if None."""
+    trigger = store.components[COMPONENTS.TRIGGER]
+    events, keys = trigger.columns
+    trigger_events = []
+    for entity in store.tile_index.get((grid_y, grid_x), ()):
+        row = trigger.rows.get(entity)
+        if row is not None and keys[row] == key and events[row] is not None:
+            trigger_events.append(events[row])
+    return trigger_events
+
+
+def get_trigger_events(store: EntityStore) -> list[EnumObject]:
+    """Return the events of all the walk triggers."""
+    return list(store.components[COMPONENTS.TRIGGER].columns[0])
+
+
+def get_trigger_positions(store: EntityStore, key: int = None) -> list[tuple[int, int]]:
+    """Return the (grid_y, grid_x) tile of each walk trigger bound to key, or to no key if None."""
+    position = store.components[COMPONENTS.POSITION]
+    position_rows = position.rows
+    grid_ys, grid_xs = position.columns[0], position.columns[1]
+    trigger = store.components[COMPONENTS.TRIGGER]
+    keys = trigger.columns[1]
+    return [
+        (grid_ys[position_rows[entity]], grid_xs[position_rows[entity]])
+        for entity, trigger_key in zip(trigger.entities, keys)
+        if trigger_key == key
+    ]
+
+
+def _invalidate_sprites(entities: list[int]) -> None:
+    cuinter.invalidate_layer(RENDER_LAYERS.SPRITES)
+
+
+class EntityRenderer(NamedTuple):
+    """Draws the sprites of the entities of an EntityStore in the SPRITES layer.
+
+    Only the tiles seen through the layer's origin, and DRAW_MARGIN tiles
+    around them, are looked up in the tile index. They are drawn top to
+    bottom, so lower sprites are drawn over higher ones. The layer is
+    invalidated whenever the store's sprites change.
+
+    Attributes:
+        pid (int): Persistent identifier.
+        store (EntityStore): The entities drawn.
+    """
+    pid: int
+    store: EntityStore
+
+    @classmethod
+    def new(cls, store: EntityStore, is_top_level: bool = True) -> EntityRenderer:
+        logger.debug("Creating new EntityRenderer")
+        entity_renderer = cls(int(uuid4()), store)
+        store.add_listener(_invalidate_sprites)
+        if is_top_level:
+            cuinter.set_element(entity_renderer.pid, entity_renderer, RENDER_LAYERS.SPRITES)
+        return entity_renderer
+
+    def config(self, is_top_level: bool = True, **kwargs) -> EntityRenderer:
+        """Clone the EntityRenderer with updated attributes, moving its listener to a new store."""
+        store = kwargs.get("store", self.store)
+        if store is not self.store:
+            self.store.remove_listener(_invalidate_sprites)
+            store.add_listener(_invalidate_sprites)
+
+        entity_renderer = EntityRenderer(self.pid, store)
+        if is_top_level:
+            cuinter.set_element(self.pid, entity_renderer)
+        return entity_renderer
+
+    def delete(self) -> None:
+        self.store.remove_listener(_invalidate_sprites)
+        cuinter.remove_element(self.pid)
+
+    def draw(self) -> None:
+        origin_y, origin_x = cuinter.get_layer_origin(RENDER_LAYERS.SPRITES)
+        top = origin_y // TILE_HEIGHT - DRAW_MARGIN
+        left = origin_x // TILE_WIDTH - DRAW_MARGIN
+        bottom = (origin_y + cuinter.get_screen_height()) // TILE_HEIGHT + DRAW_MARGIN + 1
+        right = (origin_x + cuinter.get_screen_width()) // TILE_WIDTH + DRAW_MARGIN + 1
+
+        tile_index = self.store.tile_index
+        position = self.store.components[COMPONENTS.POSITION]
+        sprite = self.store.components[COMPONENTS.SPRITE]
+        y_offsets, x_offsets = position.columns[2], position.columns[3]
+        sprites = sprite.columns[0]
+        for grid_y in range(top, bottom):
+            for grid_x in range(left, right):
+                entities = tile_index.get((grid_y, grid_x))
+                if entities is None:
+                    continue
+                for entity in entities:
+                    row = sprite.rows.get(entity)
+                    if row is None or sprites[row] is None:
+                        continue
+                    position_row = position.rows[entity]
+                    y = grid_y * TILE_HEIGHT + y_offsets[position_row]
+                    x = grid_x * TILE_WIDTH + x_offsets[position_row]
+                    for span_y, span_x, text in compile_sprite(sprites[row]):
+                        set_span(y + span_y, x + span_x, text)
+
+
+def _test():
+    """Turn world objects into entities, draw, move and remove them, and check the triggers."""
+    from enums import BACKEND_TYPES, EVENT_TYPES
+    from world import Grid
+    cuinter.setup(BACKEND_TYPES.HEADLESS, height=16, width=64)
+    tileset = {
+        " ": "\n".join([" " * TILE_WIDTH] * TILE_HEIGHT),
+        "║": "\n".join(["#" * TILE_WIDTH] * TILE_HEIGHT),
+    }
+    grid = Grid.new(tileset, ("    ", "  ║ "))
+    store = EntityStore.new()
+    entity_renderer = EntityRenderer.new(store)
+
+    grid_sprite = GridSprite.new(grid, 0, 1, "ab\ncd", 1, 2)
+    sprite_entity = add_world_object(store, grid_sprite)
+    assert grid_sprite.sprite_renderer.pid not in cuinter.get_elements()
+    event = EnumObject(EVENT_TYPES.QUIT_GAME)
+    key_entity = add_world_object(store, WalkTrigger.new(1, 0, event, ord("w")))
+    walk_entity = add_world_object(store, WalkTrigger.new(0, 1, event))
+    assert store.entity_count == 3 and store.get_entities_at(0, 1) == [sprite_entity, walk_entity]
+    assert store.query(COMPONENTS.POSITION, COMPONENTS.TRIGGER) == [key_entity, walk_entity]
+    assert get_trigger_events_at(store, 1, 0, ord("w")) == [event]
+    assert get_trigger_events_at(store, 1, 0) == []
+    assert get_trigger_events_at(store, 0, 1) == [event]
+    assert get_trigger_positions(store) == [(0, 1)]
+    assert get_trigger_positions(store, ord("w")) == [(1, 0)]
+
+    cuinter.update()
+    assert cuinter.get_buffer_row(1)[18:20] == "ab" and cuinter.get_buffer_row(2)[18:20] == "cd"
+    store.set_position(sprite_entity, 1, 3)
+    assert cuinter.get_dirty_layers() == [RENDER_LAYERS.SPRITES]
+    cuinter.update()
+    assert cuinter.get_buffer_row(1)[18:20] == "  " and cuinter.get_buffer_row(9)[50:52] == "ab"
+    moved = move_entities(store, [sprite_entity, walk_entity], 0, 1, grid.collision_map)
+    assert moved == [walk_entity] and store.get_position(sprite_entity) == (1, 3)
+    assert store.get_entities_at(0, 1) == [] and store.get_entities_at(0, 2) == [walk_entity]
+    notified = []
+    store.add_listener(notified.append)
+    store.set(sprite_entity, COMPONENTS.POSITION, (1, 2, 1, 2))
+    store.set(sprite_entity, COMPONENTS.POSITION, (1, 2, 0, 2))
+    store.set(sprite_entity, COMPONENTS.POSITION, (1, 2, 0, 2))
+    assert notified == [[sprite_entity]] * 2 and store.get_entities_at(1, 2) == [sprite_entity]
+    assert store.get_position(sprite_entity) == (1, 2) and store.get_entities_at(1, 3) == []
+    store.remove_listener(notified.append)
+
+    store.remove_entity(key_entity)
+    assert store.query(COMPONENTS.TRIGGER) == [walk_entity]
+    assert store.get(walk_entity, COMPONENTS.POSITION) == (0, 2, 0, 0)
+    store.remove(sprite_entity, COMPONENTS.SPRITE)
+    cuinter.update()
+    assert cuinter.get_buffer_row(9)[50:52] == "  "
+
+    entity_renderer.delete()
+    assert not store.listeners
+    print("all Tests passed")
+
+
+if __name__ == "__main__":
+    _test()
@@ -11,6 +11,26 @@ from __future__ import annotations
 from typing import NamedTuple
 
 
+class _BackendTypes(NamedTuple):
+    CURSES: int
+    HEADLESS: int
+
+    @classmethod
+    def new(cls) -> _BackendTypes:
+        return cls(*range(len(cls.__annotations__)))
+
+
+class _Components(NamedTuple):
+    POSITION: int
+    SPRITE: int
+    TRIGGER: int
+    CHARACTER: int
+
+    @classmethod
+    def new(cls) -> _Components:
+        return cls(*range(len(cls.__annotations__)))
+
+
 class _EventTypes(NamedTuple):
     PRESS_KEY: int
     MAKE_UI_ELEMENT: int
@@ -35,6 +55,7 @@ class _EventTypes(NamedTuple):
     LOAD_GAME: int
     QUIT_GAME: int
     MULTI_EVENT: int
+    FAST_TRAVEL: int
 
     @classmethod
     def new(cls) -> _EventTypes:
@@ -57,6 +78,7 @@ class _UIElementTypes(NamedTuple):
     TEXT_BOX: int
     DIALOG_BOX: int
     CHOICE_BOX: int
+    MINIMAP: int
 
     @classmethod
     def new(cls) -> _UIElementTypes:
@@ -72,19 +94,33 @@ class _RectanglePresets(NamedTuple):
         return cls(*range(len(cls.__annotations__)))
 
 
+class _RenderLayers(NamedTuple):
+    WORLD: int
+    SPRITES: int
+    UI: int
+
+    @classmethod
+    def new(cls) -> _RenderLayers:
+        return cls(*range(len(cls.__annotations__)))
+
+
 class _WorldObjectTypes(NamedTuple):
     GRID_SPRITE: int
     GRID_MULTI_SPRITE: int
     WORLD_CHARACTER: int
     WALK_TRIGGER: int
+    NPC: int
 
     @classmethod
     def new(cls) -> _WorldObjectTypes:
         return cls(*range(len(cls.__annotations__)))
 
 
+BACKEND_TYPES = _BackendTypes.new()
+COMPONENTS = _Components.new()
 EVENT_TYPES = _EventTypes.new()
 LANGUAGE_ENUM = _LanguageEnum.new()
 UI_ELEMENT_TYPES = _UIElementTypes.new()
 RECTANGLE_PRESETS = _RectanglePresets.new()
+RENDER_LAYERS = _RenderLayers.new()
 WORLD_OBJECT_TYPES = _WorldObjectTypes.new()
@@ -5,6 +5,7 @@ Contributors:
 """
 
 from __future__ import annotations
+import json
 import logging
 import os
 import pickle
@@ -12,12 +13,17 @@ import pickle
 logger = logging.getLogger(__name__)
 
 
+def native_path(path: str) -> str:
+    """Return path with the backslash separators used in assets replaced by the OS separator."""
+    return path.replace("\\", os.sep)
+
+
 def load_text(path: str) -> str:
     """Read and return the content of the text file at the provided path."""
     logger.debug(f"Loading text file: {path}")
 
     try:
-        with open(path, "r", encoding="utf-8") as file:
+        with open(native_path(path), "r", encoding="utf-8") as file:
             return file.read()
 
     except FileNotFoundError:
@@ -35,7 +41,7 @@ def load_text_dir(path: str) -> dict[str, str]:
     logger.debug(f"Loading text file directory: {path}")
 
     texts = {}
-    for entry in os.listdir(path):
+    for entry in os.listdir(native_path(path)):
         full_path = os.path.join(path, entry)
         name, ext = os.path.splitext(entry)
 
@@ -48,10 +54,17 @@ def load_text_dir(path: str) -> dict[str, str]:
     return texts
 
 
+def save_json(obj: object, path: str) -> None:
+    """Save an object as an indented JSON file at the provided path."""
+    logger.debug(f"Saving JSON file: {path}")
+    with open(native_path(path), "w", encoding="utf-8") as file:
+        json.dump(obj, file, indent=4)
+
+
 def save_pickle(obj: object, path: str) -> None:
     """Save an object as a pickle file at the provided path."""
     logger.debug(f"Saving pickle file: {path}")
-    with open(path, "wb") as file:
+    with open(native_path(path), "wb") as file:
         pickle.dump(obj, file)
 
 
@@ -59,7 +72,7 @@ def load_pickle(path: str) -> object:
     """Read and return the pickle object at the provided path."""
     logger.debug(f"Loading pickle file: {path}")
     try:
-        with open(path, "rb") as file:
+        with open(native_path(path), "rb") as file:
             return pickle.load(file)
 
     except FileNotFoundError:
@@ -70,7 +83,7 @@ def load_pickle(path: str) -> object:
 
 def delete(path: str) -> None:
     """Delete the file at the provided path."""
-    os.remove(path)
+    os.remove(native_path(path))
 
 
 def _test():
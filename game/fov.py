@@ -0,0 +1,389 @@
+"""Field of view on the walkable tiles of a world.Grid, for dungeons.
+
+Tiles which aren't walkable block the view, overrides included, so a closed
+door hides what is behind it. Fields of view are computed by recursive
+shadowcasting over the eight octants around the viewer, and cached by
+collision map, position and radius: the FOV_CACHE_SIZE most recently used
+are kept, walking back and forth doesn't compute them again. A field of view
+is dropped by the collision map listener when the walkability of a tile
+within its radius changes, as when Grid.set_tiles() opens a door: the map is
+updated in place then, not replaced.
+
+The grid is then shown through the field of view by patching its window
+tile by tile: visible tiles as in the tileset, tiles seen before dimmed,
+from the remembered tiles of the zone, and the others blank. Nothing is done
+while the viewer stands still and the window doesn't change, whatever the
+size of the zone.
+
+Contributors:
+    Romain
+"""
+
+from __future__ import annotations
+from collections import OrderedDict
+import logging
+from typing import Callable, NamedTuple
+from common import CacheStats
+from world import TILE_HEIGHT, TILE_WIDTH, CollisionMap, Grid, get_tile_rows
+
+logger = logging.getLogger(__name__)
+
+FOV_RADIUS = 10  # Default view distance in tiles
+FOV_CACHE_SIZE = 256  # Number of fields of view kept in memory
+EXPLORED_BLOCK_SIZE = 64  # Tiles per side of the blocks of remembered tiles
+DIM_TILE_CHARS = str.maketrans("█▓▒░≈~▀", "▒░░·~··")  # Remembered tiles are drawn with these
+BLANK_TILE_ROWS = (" " * TILE_WIDTH,) * TILE_HEIGHT
+OCTANTS = (  # (xx, xy, yx, yy) transforms from the first octant
+    (1, 0, 0, 1),
+    (0, 1, 1, 0),
+    (0, -1, 1, 0),
+    (-1, 0, 0, 1),
+    (-1, 0, 0, -1),
+    (0, -1, -1, 0),
+    (0, 1, -1, 0),
+    (1, 0, 0, -1),
+)
+
+# Tile states in the view
+VISIBLE = 0
+REMEMBERED = 1
+UNKNOWN = 2
+
+
+class FieldOfView(NamedTuple):
+    """Tiles seen from a position of a collision map.
+
+    Attributes:
+        y (int): Row of the viewer.
+        x (int): Column of the viewer.
+        radius (int): View distance in tiles.
+        visible (frozenset[tuple[int, int]]): (y, x) of the visible tiles,
+            the viewer's and the first blocking tiles included.
+    """
+    y: int
+    x: int
+    radius: int
+    visible: frozenset[tuple[int, int]]
+
+    @classmethod
+    def new(cls, collision_map: CollisionMap, y: int, x: int, radius: int) -> FieldOfView:
+        """Compute the tiles of collision_map visible from (y, x) within radius."""
+        visible = {(y, x)}
+        for xx, xy, yx, yy in OCTANTS:
+            _cast_light(collision_map, y, x, radius, 1, 1.0, 0.0, xx, xy, yx, yy, visible)
+        return cls(y, x, radius, frozenset(visible))
+
+    def is_visible(self, y: int, x: int) -> bool:
+        return (y, x) in self.visible
+
+
+def _cast_light(collision_map: CollisionMap, origin_y: int, origin_x: int, radius: int,
+                row: int, start: float, end: float, xx: int, xy: int, yx: int, yy: int,
+                visible: set[tuple[int, int]]) -> None:
+    """Add the tiles lit in an octant between the start and end slopes, from row on.
+
+    Blocking tiles split the light, the part beyond them is cast again
+    recursively with narrower slopes.
+    """
+    if start < end:
+        return
+
+    height = collision_map.height
+    width = collision_map.width
+    cells = collision_map.cells
+    radius_squared = radius * radius
+    for distance in range(row, radius + 1):
+        dx = -distance - 1
+        dy = -distance
+        blocked = False
+        new_start = start
+        while dx <= 0:
+            dx += 1
+            left_slope = (dx - 0.5) / (dy + 0.5)
+            right_slope = (dx + 0.5) / (dy - 0.5)
+            if start < right_slope:
+                continue
+            if end > left_slope:
+                break
+
+            y = origin_y + dx * yx + dy * yy
+            x = origin_x + dx * xx + dy * xy
+            is_in_map = 0 <= y < height and 0 <= x < width
+            if is_in_map and dx * dx + dy * dy <= radius_squared:
+                visible.add((y, x))
+            is_blocking = not is_in_map or not cells[y * width + x]
+
+            if blocked:
+                if is_blocking:
+                    new_start = right_slope
+                    continue
+                blocked = False
+                start = new_start
+            elif is_blocking and distance < radius:
+                blocked = True
+                _cast_light(collision_map, origin_y, origin_x, radius, distance + 1, start,
+                            left_slope, xx, xy, yx, yy, visible)
+                new_start = right_slope
+        if blocked:
+            break
+
+
+def _make_fov_manager() -> tuple[Callable, ...]:
+    """Creates functions to get fields of view through an LRU cache.
+
+    Entries are keyed by collision map identity, position and radius. A
+    listener is added to each collision map with fields of view in the
+    cache, it drops those within reach of a tile whose walkability changed.
+    """
+    cache = OrderedDict()  # (id(collision_map), y, x, radius): (collision_map, FieldOfView)
+    listeners = {}  # id(collision_map): (collision_map, listener)
+    hits = 0
+    misses = 0
+    evictions = 0
+
+    def remove_listener(map_id: int) -> None:
+        collision_map, listener = listeners.pop(map_id)
+        collision_map.remove_listener(listener)
+
+    def remove_item(key: tuple) -> None:
+        del cache[key]
+        if not any(other_key[0] == key[0] for other_key in cache):
+            remove_listener(key[0])
+
+    def get_item(collision_map: CollisionMap, y: int, x: int,
+                 radius: int = FOV_RADIUS) -> FieldOfView:
+        """Return the field of view from (y, x), computing it if needed."""
+        nonlocal hits, misses, evictions
+        map_id = id(collision_map)
+        key = (map_id, y, x, radius)
+        entry = cache.get(key)
+        if entry is not None and entry[0] is collision_map:
+            hits += 1
+            cache.move_to_end(key)
+            return entry[1]
+
+        misses += 1
+        if map_id in listeners and listeners[map_id][0] is not collision_map:
+            # Fields of view of a dead collision map with a reused id
+            for other_key in [other_key for other_key in cache if other_key[0] == map_id]:
+                del cache[other_key]
+            remove_listener(map_id)
+        if map_id not in listeners:
+            def listener(positions: list[tuple[int, int]]) -> None:
+                for other_key in [other_key for other_key in cache if other_key[0] == map_id]:
+                    _, view_y, view_x, view_radius = other_key
+                    if any(
+                        abs(tile_y - view_y) <= view_radius and abs(tile_x - view_x) <= view_radius
+                        for tile_y, tile_x in positions
+                    ):
+                        remove_item(other_key)
+
+            collision_map.add_listener(listener)
+            listeners[map_id] = (collision_map, listener)
+
+        field_of_view = FieldOfView.new(collision_map, y, x, radius)
+        cache[key] = (collision_map, field_of_view)
+        if len(cache) > FOV_CACHE_SIZE:
+            remove_item(next(iter(cache)))
+            evictions += 1
+        return field_of_view
+
+    def get_stats() -> CacheStats:
+        return CacheStats(hits, misses, evictions, len(cache))
+
+    def clear_cache() -> None:
+        nonlocal hits, misses, evictions
+        cache.clear()
+        for map_id in list(listeners):
+            remove_listener(map_id)
+        hits = 0
+        misses = 0
+        evictions = 0
+
+    return get_item, get_stats, clear_cache
+
+
+(
+    get_fov,
+    get_fov_stats,
+    clear_fovs,
+) = _make_fov_manager()
+
+
+def _make_fov_view_manager() -> tuple[Callable, ...]:
+    """Creates functions to show a grid through the field of view of the player.
+
+    Remembered tiles are kept per zone in blocks of EXPLORED_BLOCK_SIZE tiles
+    per side, created as they are explored, in zone coordinates so they
+    survive chunk windows moving. The state each window tile is shown in is
+    kept along with the window and tilemap it was patched for; a new window
+    or tilemap means a new window sprite, which is patched whole.
+    """
+    explored = {}  # zone_path: {(block_y, block_x): bytearray}
+    dim_rows = {}  # char: dimmed tile rows
+    shown = {}  # (y, x): tile state, for the tiles of the window
+    shown_key = None  # (window, tilemap) the shown states are for
+    field_of_view = None  # Last field of view shown
+
+    def get_dim_rows(tileset: dict[str, str], char: str) -> tuple[str, ...]:
+        rows = dim_rows.get(char)
+        if rows is None:
+            rows = tuple(row.translate(DIM_TILE_CHARS) for row in get_tile_rows(tileset)[char])
+            dim_rows[char] = rows
+        return rows
+
+    def update_view(grid: Grid, zone_path: str, origin_y: int, origin_x: int, y: int, x: int,
+                    radius: int = FOV_RADIUS) -> Grid:
+        """Return grid showing what can be seen from (y, x), and remember the tiles seen.
+
+        origin is the zone coordinates of the grid's top-left tile, see
+        chunks, so remembered tiles are kept in zone coordinates.
+        """
+        nonlocal shown_key, field_of_view
+        if grid.collision_map is None or grid.sprite_renderer.sprite is None:
+            return grid
+
+        new_field_of_view = get_fov(grid.collision_map, y, x, radius)
+        key = (grid.window, grid.tilemap)
+        is_new_window = shown_key is None or key[0] != shown_key[0] or key[1] is not shown_key[1]
+        if not is_new_window and new_field_of_view is field_of_view:
+            return grid
+
+        blocks = explored.setdefault(zone_path, {})
+        for tile_y, tile_x in new_field_of_view.visible:
+            block_y, offset_y = divmod(tile_y + origin_y, EXPLORED_BLOCK_SIZE)
+            block_x, offset_x = divmod(tile_x + origin_x, EXPLORED_BLOCK_SIZE)
+            block = blocks.get((block_y, block_x))
+            if block is None:
+                block = bytearray(EXPLORED_BLOCK_SIZE * EXPLORED_BLOCK_SIZE)
+                blocks[block_y, block_x] = block
+            block[offset_y * EXPLORED_BLOCK_SIZE + offset_x] = 1
+
+        if is_new_window:
+            shown.clear()
+        tile_rows = get_tile_rows(grid.tileset)
+        top, left, bottom, right = grid.window
+        tiles = []
+        for tile_y in range(top, bottom):
+            row = grid.tilemap[tile_y]
+            for tile_x in range(left, right):
+                if (tile_y, tile_x) in new_field_of_view.visible:
+                    state = VISIBLE
+                else:
+                    block_y, offset_y = divmod(tile_y + origin_y, EXPLORED_BLOCK_SIZE)
+                    block_x, offset_x = divmod(tile_x + origin_x, EXPLORED_BLOCK_SIZE)
+                    block = blocks.get((block_y, block_x))
+                    if block is not None and block[offset_y * EXPLORED_BLOCK_SIZE + offset_x]:
+                        state = REMEMBERED
+                    else:
+                        state = UNKNOWN
+                if shown.get((tile_y, tile_x)) == state:
+                    continue
+
+                shown[tile_y, tile_x] = state
+                char = row[tile_x]
+                if state == VISIBLE:
+                    tiles.append((tile_y, tile_x, tile_rows[char]))
+                elif state == REMEMBERED:
+                    tiles.append((tile_y, tile_x, get_dim_rows(grid.tileset, char)))
+                else:
+                    tiles.append((tile_y, tile_x, BLANK_TILE_ROWS))
+
+        shown_key = key
+        field_of_view = new_field_of_view
+        return grid.patch_tiles(tiles)
+
+    def is_tile_visible(y: int, x: int) -> bool:
+        """Return whether the tile at (y, x) of the grid is in the last field of view shown."""
+        return field_of_view is None or (y, x) in field_of_view.visible
+
+    def clear_view(grid: Grid) -> Grid:
+        """Return grid showing every tile of its window again, without field of view."""
+        nonlocal shown_key, field_of_view
+        tile_rows = get_tile_rows(grid.tileset)
+        tiles = []
+        if shown_key is not None and grid.window == shown_key[0] and grid.tilemap is shown_key[1]:
+            tiles = [
+                (y, x, tile_rows[grid.tilemap[y][x]])
+                for (y, x), state in shown.items() if state != VISIBLE
+            ]
+        shown.clear()
+        shown_key = None
+        field_of_view = None
+        dim_rows.clear()
+        return grid.patch_tiles(tiles)
+
+    def count_explored(zone_path: str) -> int:
+        """Return the number of remembered tiles of the zone at zone_path."""
+        return sum(block.count(1) for block in explored.get(zone_path, {}).values())
+
+    def clear_explored() -> None:
+        """Forget the remembered tiles of every zone."""
+        explored.clear()
+
+    return update_view, is_tile_visible, clear_view, count_explored, clear_explored
+
+
+(
+    update_view,
+    is_tile_visible,
+    clear_view,
+    count_explored,
+    clear_explored,
+) = _make_fov_view_manager()
+
+
+def _test():
+    """See around walls, close a door, then walk away and check what is remembered."""
+    tilemap = (
+        "          ",
+        "  ║║║║║   ",
+        "  ║   ║   ",
+        "  ║   ║   ",
+        "  ║║ ║║   ",
+        "          ",
+    )
+    collision_map = CollisionMap.new(tilemap)
+    field_of_view = get_fov(collision_map, 3, 4, 5)
+    assert field_of_view.is_visible(3, 4) and field_of_view.is_visible(2, 3)
+    assert field_of_view.is_visible(1, 4), "Walls are seen"
+    assert not field_of_view.is_visible(0, 4), "Nothing is seen behind walls"
+    assert field_of_view.is_visible(5, 4), "The door lets the view through"
+    assert get_fov(collision_map, 3, 4, 5) is field_of_view and get_fov_stats().hits == 1
+
+    collision_map.set_override(4, 4, False)
+    assert get_fov_stats().size == 0
+    assert not get_fov(collision_map, 3, 4, 5).is_visible(5, 4)
+    assert get_fov(collision_map, 0, 0, 20).is_visible(5, 0)
+    clear_fovs()
+    assert not collision_map.listeners
+
+    import cuinter
+    from enums import BACKEND_TYPES
+    cuinter.setup(BACKEND_TYPES.HEADLESS, height=48, width=160)
+    tileset = {
+        " ": "\n".join(["░" * TILE_WIDTH] * TILE_HEIGHT),
+        "║": "\n".join(["█" * TILE_WIDTH] * TILE_HEIGHT),
+    }
+    grid = Grid.new(tileset, tilemap)
+    grid = update_view(grid, "test_zone", 0, 0, 3, 4, 5)
+    assert update_view(grid, "test_zone", 0, 0, 3, 4, 5) is grid
+    cuinter.update()
+    assert cuinter.get_buffer_row(3 * TILE_HEIGHT)[4 * TILE_WIDTH] == "░"
+    assert cuinter.get_buffer_row(0)[4 * TILE_WIDTH] == " "
+
+    grid = update_view(grid, "test_zone", 0, 0, 0, 0, 2)
+    cuinter.update()
+    assert cuinter.get_buffer_row(3 * TILE_HEIGHT)[4 * TILE_WIDTH] == "·"
+    assert not is_tile_visible(3, 4) and count_explored("test_zone") > 0
+
+    grid = clear_view(grid)
+    cuinter.update()
+    assert cuinter.get_buffer_row(3 * TILE_HEIGHT)[4 * TILE_WIDTH] == "░"
+    clear_explored()
+    clear_fovs()
+    print("all Tests passed")
+
+
+if __name__ == "__main__":
+    _test()
@@ -0,0 +1,128 @@
+"""Headless in-memory terminal backend for cuinter.
+
+Mimics the part of the curses window API used by cuinter, recording writes
+in an in-memory grid instead of a real terminal. Keys are read from a scripted
+source, so the game can be benchmarked and soak-tested without a terminal.
+
+Contributors:
+    Romain
+"""
+
+from __future__ import annotations
+from collections import Counter
+import curses
+import logging
+from typing import Iterable, Iterator, NamedTuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HEIGHT = 50
+DEFAULT_WIDTH = 200
+
+
+class HeadlessScreen(NamedTuple):
+    """A virtual terminal standing in for the curses stdscr.
+
+    Timeouts are recorded but never waited for, getch() returns curses.ERR
+    right away once the scripted keys run out.
+
+    Attributes:
+        height (int): Number of rows.
+        width (int): Number of columns.
+        cells (list[str]): Displayed cells, row after row.
+        cursor (list[int]): Cursor position as [y, x].
+        keys (Iterator[int]): Scripted key codes, None meaning no key.
+        stats (Counter): Number of calls per method, cells and bytes written.
+    """
+    height: int
+    width: int
+    cells: list[str]
+    cursor: list[int]
+    keys: Iterator[int]
+    stats: Counter
+
+    @classmethod
+    def new(cls, height: int = DEFAULT_HEIGHT, width: int = DEFAULT_WIDTH,
+            keys: Iterable[int | str] = ()) -> HeadlessScreen:
+        """Create a blank HeadlessScreen, keys can be given as codes or characters."""
+        logger.debug(f"Creating new HeadlessScreen ({height}x{width})")
+
+        return cls(
+            height,
+            width,
+            [" "] * (height * width),
+            [0, 0],
+            iter([ord(key) if isinstance(key, str) else key for key in keys]),
+            Counter(),
+        )
+
+    def get_rows(self) -> list[str]:
+        """Return the displayed rows as strings."""
+        return [
+            "".join(self.cells[y * self.width:(y + 1) * self.width])
+            for y in range(self.height)
+        ]
+
+    def getmaxyx(self) -> tuple[int, int]:
+        return self.height, self.width
+
+    def move(self, y: int, x: int) -> None:
+        self.stats["move"] += 1
+        if not (0 <= y < self.height and 0 <= x < self.width):
+            raise curses.error("move() returned ERR")
+        self.cursor[:] = [y, x]
+
+    def addstr(self, *args) -> None:
+        """Write a string at the cursor, or at (y, x) if given, like curses."""
+        if len(args) == 3:
+            y, x, text = args
+            self.move(y, x)
+        else:
+            text, = args
+            y, x = self.cursor
+
+        self.stats["addstr"] += 1
+        self.stats["cells"] += len(text)
+        self.stats["bytes"] += len(text.encode("utf-8"))
+
+        offset = y * self.width + x
+        if offset + len(text) > len(self.cells):
+            raise curses.error("addstr() returned ERR")
+        self.cells[offset:offset + len(text)] = text
+        self.cursor[:] = divmod(offset + len(text), self.width)
+
+    def clear(self) -> None:
+        self.stats["clear"] += 1
+        self.cells[:] = [" "] * len(self.cells)
+
+    def refresh(self) -> None:
+        self.stats["refresh"] += 1
+
+    def getch(self) -> int:
+        self.stats["getch"] += 1
+        key = next(self.keys, None)
+        return curses.ERR if key is None else key
+
+    def timeout(self, delay: int) -> None:
+        self.stats["timeout"] += 1
+
+    def nodelay(self, flag: bool) -> None:
+        pass
+
+
+def _test():
+    """Check that the screen records writes like a terminal would."""
+    screen = HeadlessScreen.new(3, 10, "ab")
+    screen.addstr(1, 2, "héllo")
+    assert screen.get_rows()[1] == "  héllo   "
+    assert screen.stats["bytes"] == 6
+    assert screen.getch() == ord("a")
+    assert screen.getch() == ord("b")
+    assert screen.getch() == curses.ERR
+    screen.clear()
+    assert screen.get_rows() == [" " * 10] * 3
+    print("all Tests passed")
+
+
+if __name__ == "__main__":
+    _test()
@@ -245,6 +245,9 @@ ENGLISH = _Lang(
         "hobgoblin": "Hobgoblin",
         "goblin_chief": "Goblin chieftain",
         "bandit": "Bandit",
+        "tavernkeep": "Tavernkeep",
+        "merchant": "Merchant",
+        "blacksmith": "Blacksmith",
     },
 
     # Slots
@@ -341,6 +344,9 @@ FRENCH = _Lang(
         "hobgoblin": "Hobgobelin",
         "goblin_chief": "Chef gobelin",
         "bandit": "Bandit",
+        "tavernkeep": "Aubergiste",
+        "merchant": "Marchand",
+        "blacksmith": "Forgeron",
     },
 
     # Slots
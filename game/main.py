@@ -22,23 +22,33 @@ import os
 import time
 from typing import Callable, NamedTuple
 from uuid import UUID
+import chunks
 from combat import Battle
 from common import EnumObject, remap_dict
 import cuinter
 from cuinter import UI_ELEMENT_CLASSES
-from enums import EVENT_TYPES, UI_ELEMENT_TYPES, RECTANGLE_PRESETS
-from files import load_text_dir, load_pickle, save_pickle
+import entities
+from enums import BACKEND_TYPES, EVENT_TYPES, UI_ELEMENT_TYPES, RECTANGLE_PRESETS, WORLD_OBJECT_TYPES
+from files import load_text_dir, load_pickle, native_path, save_pickle
+import fov
 from game_classes import Action, Character, DamageInstance, Item, Party
 from game_save import DEFAULT_ZONE_PATH, GameSave
 from lang import DialogLine, translate
 import monsters
+import npcs
+import pathfinding
+import prefetch
+import profiler
 import settings
+import tile_animation
+import visited_zones
 import world
 from world import WORLD_OBJECT_CLASSES
+import zone_graph
 
 # Configure logging
 logging.basicConfig(
-    filename="logs\\game.log",
+    filename=native_path("logs\\game.log"),
     filemode="w",
     encoding="utf-8",
     level=logging.DEBUG,
@@ -54,9 +64,17 @@ MOVE_MAP = {
     ord("a"): (0, -1, "left"),
     ord("d"): (0, 1, "right"),
 }
+MOVE_DIRECTIONS = {(move_y, move_x): direction for move_y, move_x, direction in MOVE_MAP.values()}
+AUTO_WALK_STEP_TIME = 0.1  # Time between each auto-walk step (in seconds)
+MINIMAP_HEIGHT = 12
+MINIMAP_WIDTH = 40
+MINIMAP_SCALE = 1  # Characters per tile in the minimap
+ZOOMED_VIEW_SCALE = 2  # Characters per tile in the zoomed-out view
+PLAYER_MARKER = "@"  # Player position in the minimap and the zoomed-out view
 
 GAME_SAVE_PATH = "user_data\\game_saves\\save_1.pkl"
 TILE_SPRITE_DIR_PATH = "assets\\sprites\\tiles"
+TILE_ANIMATION_DIR_PATH = "assets\\sprites\\tile_animations"
 MENU_CHOICE_PATH = "assets\\choices\\menu_choice.pkl"
 
 
@@ -71,6 +89,12 @@ class Globals(NamedTuple):
         battle: Current battle instance or None
         battle_action: Tuple of (Action, Item) for battle actions
         battle_target: UUID of battle target
+        profiler_label: UI label displaying the frame breakdown, hidden if its text is None
+        auto_walk_path: Tiles left to walk on to reach a walk trigger, empty
+            when not auto-walking
+        minimap: Minimap of the zone around the player, None when hidden
+        zoomed_view: Full screen zoomed-out view of the zone, None when hidden
+        fov_radius: View distance of the player in tiles, None to see the whole zone
     """
     grid: world.Grid
     player: world.WorldCharacter
@@ -79,6 +103,11 @@ class Globals(NamedTuple):
     battle: Battle
     battle_action: tuple[Action, Item]
     battle_target: UUID
+    profiler_label: cuinter.Label
+    auto_walk_path: tuple[tuple[int, int], ...]
+    minimap: cuinter.Minimap
+    zoomed_view: cuinter.Minimap
+    fov_radius: int
 
     @classmethod
     def new(cls) -> Globals:
@@ -89,8 +118,12 @@ class Globals(NamedTuple):
         """
         tile_sprites = load_text_dir(TILE_SPRITE_DIR_PATH)
         tileset = remap_dict(tile_sprites, world.TILE_NAME_TO_CHAR)
+        tile_animation.load_tile_animations(
+            load_text_dir(TILE_ANIMATION_DIR_PATH),
+            world.TILE_NAME_TO_CHAR,
+        )
 
-        grid = world.Grid.new(tileset)
+        grid = world.Grid.new(tileset, camera=world.Camera.new())
         player = world.WorldCharacter.new(
             grid=grid,
             grid_y=0,
@@ -105,6 +138,10 @@ class Globals(NamedTuple):
             x=0,
             text=f"♥ {player.character.health}/{player.character.current.max_health}"
         )
+        profiler_label = cuinter.Label.new(
+            y=2,
+            x=0,
+        )
 
         return cls(
             grid=grid,
@@ -114,6 +151,11 @@ class Globals(NamedTuple):
             battle=None,
             battle_action=None,
             battle_target=None,
+            profiler_label=profiler_label,
+            auto_walk_path=(),
+            minimap=None,
+            zoomed_view=None,
+            fov_radius=None,
         )
 
 
@@ -148,41 +190,58 @@ def _make_globals_manager() -> tuple[Callable, ...]:
 
 def _make_world_object_manager() -> tuple[Callable, ...]:
     """Create manager functions for world objects.
+
+    World objects are the entities of an entities.EntityStore, one per zone,
+    whose sprites are drawn by a single EntityRenderer. The store of a zone
+    is kept as it is in the visited zones when leaving it, and drawn again
+    when coming back.
     
     Returns:
-        A tuple of functions (get_cache, add_item, clear_cache) for managing
-        world objects like triggers and NPCs.
+        A tuple of functions (get_cache, set_cache, add_item, clear_cache)
+        for managing world objects like triggers and sprites.
     """
-    cache = []
+    store = entities.EntityStore.new()
+    entity_renderer = entities.EntityRenderer.new(store)
 
-    def get_cache() -> list[object]:
-        """Get all current world objects.
+    def get_cache() -> entities.EntityStore:
+        """Get the entity store of the current zone.
         
         Returns:
-            List of active world objects.
+            The store of the active world objects.
         """
-        return cache
+        return store
+
+    def set_cache(new_store: entities.EntityStore) -> None:
+        """Make new_store the world objects of the current zone, and draw its sprites.
+
+        Args:
+            new_store: The entity store of the zone, such as one left in the visited zones
+        """
+        nonlocal store, entity_renderer
+        store = new_store
+        entity_renderer = entity_renderer.config(store=store)
 
-    def add_item(world_object: object) -> None:
-        """Add a new world object to the cache.
+    def add_item(world_object: object) -> int | None:
+        """Add a new world object to the store.
         
         Args:
             world_object: The object to add (None values are ignored)
+
+        Returns:
+            The entity of the world object, None if it was None.
         """
         if world_object is None:
-            return
+            return None
 
         logger.debug(f"Adding world object: {world_object}")
-        nonlocal cache
-        cache.append(world_object)
+        return entities.add_world_object(store, world_object)
 
     def clear_cache() -> None:
-        """Clear all world objects from the cache."""
+        """Replace the world objects with an empty store, leaving the old one as it is."""
         logger.debug("Clearing world objects")
-        nonlocal cache
-        cache.clear()
+        set_cache(entities.EntityStore.new())
 
-    return get_cache, add_item, clear_cache
+    return get_cache, set_cache, add_item, clear_cache
 
 
 def _make_event_manager() -> tuple[Callable, ...]:
@@ -231,42 +290,135 @@ def press_key(key: int) -> None:
     player = get_globals().player
 
     # Check for walk triggers bound to specific keys
-    for world_object in get_world_objects():
-        if (
-            not isinstance(world_object, world.WalkTrigger)
-            or key != world_object.key
-        ):
-            continue
-
-        add_event(world_object.on_walk(player.grid_y, player.grid_x))
+    store = get_world_object_store()
+    for event in entities.get_trigger_events_at(store, player.grid_y, player.grid_x, key):
+        add_event(event)
 
     # Handle movement keys
     if key in MOVE_MAP:
-        old_y, old_x = player.grid_y, player.grid_x
-        move_y, move_x, direction = MOVE_MAP[key]
-        player = player.move(move_y, move_x)
-
-        if player.grid_multi_sprite.sprite_key != direction:
-            player = player.config(sprite_key=direction)
-
-        if old_y != player.grid_y or old_x != player.grid_x:
-            # Check for walk triggers not bound to specific keys
-            for world_object in get_world_objects():
-                if (
-                    not isinstance(world_object, world.WalkTrigger)
-                    or world_object.key is not None
-                ):
-                    continue
+        config_globals(auto_walk_path=())
+        move_player(*MOVE_MAP[key])
+        player = get_globals().player
 
-                add_event(world_object.on_walk(player.grid_y, player.grid_x))
+    elif key == ord("t"):
+        auto_walk_to_trigger()
 
     elif key == ord("m"):
         # Open menu
         load_ui_element(MENU_CHOICE_PATH)
 
+    elif key == ord("n"):
+        toggle_minimap()
+
+    elif key == ord("z"):
+        toggle_zoomed_view()
+
+    elif key == ord("v"):
+        toggle_fov()
+
+    elif key == ord("p"):
+        toggle_profiler_hud()
+
+    elif key == ord("o"):
+        profiler.dump_trace()
+
     config_globals(player=player)
 
 
+def move_player(move_y: int, move_x: int, direction: str) -> None:
+    """Move the player by one tile if walkable and free, and check the walk triggers they step on.
+
+    Args:
+        move_y: Rows to move by
+        move_x: Columns to move by
+        direction: Sprite key the player turns to
+    """
+    player = get_globals().player
+    old_y, old_x = player.grid_y, player.grid_x
+    if npcs.get_npc_at(old_y + move_y, old_x + move_x) is None:
+        player = player.move(move_y, move_x)
+
+    if player.grid_multi_sprite.sprite_key != direction:
+        player = player.config(sprite_key=direction)
+
+    config_globals(player=player)
+    if old_y == player.grid_y and old_x == player.grid_x:
+        return
+
+    stream_chunks()
+    follow_player()
+    player = get_globals().player
+
+    # Check for walk triggers not bound to specific keys
+    store = get_world_object_store()
+    for event in entities.get_trigger_events_at(store, player.grid_y, player.grid_x):
+        add_event(event)
+
+
+def auto_walk_to_trigger() -> None:
+    """Start walking the player to the nearest walk trigger, such as a zone exit.
+
+    Only triggers set off by walking on them are targeted, not those bound to a key.
+
+    The distance field toward the triggers is cached, so it is only computed
+    again when the zone or its walkability changes.
+    """
+    grid = get_globals().grid
+    player = get_globals().player
+    targets = [
+        position
+        for position in entities.get_trigger_positions(get_world_object_store())
+        if position != (player.grid_y, player.grid_x)
+    ]
+    if not targets or grid.collision_map is None:
+        return
+
+    distance_field = pathfinding.get_distance_field(grid.collision_map, targets)
+    path = distance_field.get_path(player.grid_y, player.grid_x)
+    if not path:
+        logger.debug("No walk trigger can be reached")
+        return
+    config_globals(auto_walk_path=tuple(path))
+
+
+def step_auto_walk() -> None:
+    """Move the player to the next tile of the auto-walk path.
+
+    Auto-walk stops if the player can't move there. The rest of the path is
+    moved along with the grid when the chunk window is rebuilt.
+    """
+    path = get_globals().auto_walk_path
+    player = get_globals().player
+    next_y, next_x = path[0]
+    direction = MOVE_DIRECTIONS.get((next_y - player.grid_y, next_x - player.grid_x))
+    if direction is None:
+        config_globals(auto_walk_path=())
+        return
+
+    old_origin_y, old_origin_x = get_zone_origin()
+    move_player(next_y - player.grid_y, next_x - player.grid_x, direction)
+    origin_y, origin_x = get_zone_origin()
+    path = tuple(
+        (y + old_origin_y - origin_y, x + old_origin_x - origin_x)
+        for y, x in path
+    )
+
+    player = get_globals().player
+    if (player.grid_y, player.grid_x) != path[0]:
+        path = ()
+    config_globals(auto_walk_path=path[1:])
+
+
+def toggle_profiler_hud() -> None:
+    """Show or hide the per-frame timing breakdown below the health label."""
+    profiler_label = get_globals().profiler_label
+    if profiler_label.text is None:
+        text = profiler.format_summary(profiler.get_summary())
+    else:
+        text = None
+    config_globals(profiler_label=profiler_label.config(text=text))
+
+
 def make_ui_element(constructor: EnumObject) -> None:
     """Create a UI element from a constructor specification.
     
@@ -313,7 +465,10 @@ def make_world_object(constructor: EnumObject) -> None:
             world_object = world_object_class.new(grid=grid, *args)
         else:
             world_object = world_object_class.new(grid, args)
-        add_world_object(world_object)
+        if isinstance(world_object, world.NPC):
+            npcs.add_npc(world_object)
+        else:
+            add_world_object(world_object)
     except AttributeError:
         logger.error(f"Not implemented: {world_object_class}.new()")
 
@@ -330,18 +485,59 @@ def load_ui_element(ui_element_path: str) -> None:
 
 def load_zone(zone_path: str, player_grid_y: int = 0, player_grid_x: int = 0) -> None:
     """Load a game zone and place the player in it.
+
+    Chunked zones are streamed, only the window of chunks around the player
+    is loaded. Other zones are kept as they were left in the visited zone
+    cache, and their NPCs are kept to be fast-forwarded when coming back.
+    They are compiled through the on-disk zone cache if they weren't visited
+    recently. Zones the new one leads to are then prefetched in the background.
     
     Args:
         zone_path: Path to the zone data file
         player_grid_y: Y coordinate to place player (default: 0)
         player_grid_x: X coordinate to place player (default: 0)
     """
-    zone_data = load_pickle(zone_path)
-    tilemap, world_object_constructors = zone_data
-
     grid = get_globals().grid
-    grid = grid.load_tilemap(tilemap)
-    grid = grid.center(cuinter.get_screen_height(), cuinter.get_screen_width())
+    if chunks.get_zone() is None:
+        npcs.store_zone(get_globals().zone_path)
+        if grid.tilemap is not None:
+            visited_zones.add_visited_zone(
+                get_globals().zone_path,
+                grid,
+                get_world_object_store(),
+                settings.get().zone_memory_budget,
+            )
+    else:
+        npcs.clear_npcs()
+
+    visited_zone = visited_zones.get_visited_zone(zone_path)
+    compiled_zone = None
+    if visited_zone is None:
+        compiled_zone = prefetch.get_compiled_zone(zone_path, grid.tileset, TILE_SPRITE_DIR_PATH)
+
+    store = None
+    triggers = ()
+    world_object_constructors = ()
+    if visited_zone is not None:
+        chunks.close_zone()
+        grid = visited_zone.grid.config(camera=grid.camera)
+        store = visited_zone.world_objects
+    elif compiled_zone is None:
+        chunks.open_zone(load_pickle(zone_path))
+        window = chunks.update_window(player_grid_y, player_grid_x)
+        grid = grid.load_tilemap(window.tilemap, window.walkability)
+        world_object_constructors = window.world_object_constructors
+        player_grid_y -= window.origin_y
+        player_grid_x -= window.origin_x
+    else:
+        chunks.close_zone()
+        grid = grid.load_tilemap(
+            compiled_zone.tilemap,
+            compiled_zone.walkability,
+            compiled_zone.sprite_rows,
+        )
+        triggers = compiled_zone.triggers
+        world_object_constructors = compiled_zone.world_object_constructors
 
     player = get_globals().player
     player = player.config(
@@ -354,12 +550,190 @@ def load_zone(zone_path: str, player_grid_y: int = 0, player_grid_x: int = 0) ->
         grid=grid,
         player=player,
         zone_path=zone_path,
+        auto_walk_path=(),
     )
+    follow_player()
 
-    clear_world_objects()
+    if store is None:
+        clear_world_objects()
+    else:
+        set_world_object_store(store)
+    for trigger in triggers:
+        add_world_object(trigger)
+    has_npcs = npcs.restore_zone(zone_path, grid)
     for constructor in world_object_constructors:
+        if has_npcs and constructor.enum == WORLD_OBJECT_TYPES.NPC:
+            continue
+        make_world_object(constructor)
+
+    prefetch.prefetch_zones(
+        prefetch.get_load_zone_paths(entities.get_trigger_events(get_world_object_store())),
+        grid.tileset,
+        TILE_SPRITE_DIR_PATH,
+    )
+
+
+def fast_travel(zone_path: str, player_grid_y: int = 0, player_grid_x: int = 0) -> None:
+    """Load a zone the current one leads to through walk triggers, without walking there.
+
+    The zone graph is updated first, so zones edited since the last update
+    are scanned again. Nothing happens if no route leads to the tile.
+
+    Args:
+        zone_path: Path to the zone data file
+        player_grid_y: Y coordinate to place player (default: 0)
+        player_grid_x: X coordinate to place player (default: 0)
+    """
+    zone_graph.update_zone_graph()
+    origin_y, origin_x = get_zone_origin()
+    player = get_globals().player
+    route = zone_graph.find_route(
+        get_globals().zone_path,
+        player.grid_y + origin_y,
+        player.grid_x + origin_x,
+        zone_path,
+        player_grid_y,
+        player_grid_x,
+    )
+    if route is None:
+        logger.warning(f"No route to {zone_path} ({player_grid_y}, {player_grid_x})")
+        return
+
+    logger.debug(f"Fast travel of {route.distance} tiles through {len(route.legs)} zones")
+    load_zone(zone_path, player_grid_y, player_grid_x)
+
+
+def get_zone_origin() -> tuple[int, int]:
+    """Return the zone coordinates of the top-left tile of the grid.
+
+    Only differs from (0, 0) in chunked zones, where the grid is a window.
+    """
+    window = chunks.get_window()
+    if window is None:
+        return 0, 0
+    return window.origin_y, window.origin_x
+
+
+def stream_chunks() -> None:
+    """Rebuild the grid around the player when they enter another chunk, and prefetch the zones it leads to."""
+    origin_y, origin_x = get_zone_origin()
+    player = get_globals().player
+    window = chunks.update_window(player.grid_y + origin_y, player.grid_x + origin_x)
+    if window is None:
+        return
+
+    logger.debug(f"Moving chunked zone window to ({window.origin_y}, {window.origin_x})")
+    grid = get_globals().grid.load_tilemap(window.tilemap, window.walkability)
+    player = player.config(
+        grid=grid,
+        grid_y=player.grid_y + origin_y - window.origin_y,
+        grid_x=player.grid_x + origin_x - window.origin_x,
+    )
+    config_globals(grid=grid, player=player)
+    npcs.shift_npcs(grid, origin_y - window.origin_y, origin_x - window.origin_x)
+
+    clear_world_objects()
+    for constructor in window.world_object_constructors:
+        if (
+            constructor.enum == WORLD_OBJECT_TYPES.NPC
+            and npcs.has_npc_home(*chunks.get_constructor_position(constructor))
+        ):
+            continue  # Still in the window since the last one
         make_world_object(constructor)
 
+    prefetch.prefetch_zones(
+        prefetch.get_load_zone_paths(entities.get_trigger_events(get_world_object_store())),
+        grid.tileset,
+        TILE_SPRITE_DIR_PATH,
+    )
+
+
+def follow_player() -> None:
+    """Center the camera on the player, resizing it to the screen."""
+    grid = get_globals().grid
+    player = get_globals().player
+    camera = grid.camera.config(
+        height=cuinter.get_screen_height(),
+        width=cuinter.get_screen_width(),
+    )
+    grid = grid.config(camera=camera).follow(player.grid_y, player.grid_x)
+    grid.camera.apply()
+    config_globals(grid=grid)
+    update_minimaps()
+
+
+def toggle_minimap() -> None:
+    """Show or hide the minimap in the top right corner of the screen."""
+    minimap = get_globals().minimap
+    if minimap is None:
+        config_globals(minimap=cuinter.Minimap.new(
+            y=0,
+            x=cuinter.get_screen_width() - MINIMAP_WIDTH - 1,
+            height=MINIMAP_HEIGHT,
+            width=MINIMAP_WIDTH,
+            marker=PLAYER_MARKER,
+        ))
+        update_minimaps()
+    else:
+        minimap.delete()
+        config_globals(minimap=None)
+
+
+def toggle_zoomed_view() -> None:
+    """Show or hide the zoomed-out view of the zone, over the whole screen."""
+    zoomed_view = get_globals().zoomed_view
+    if zoomed_view is None:
+        config_globals(zoomed_view=cuinter.Minimap.new(
+            y=0,
+            x=0,
+            height=cuinter.get_screen_height() - 1,
+            width=cuinter.get_screen_width() - 1,
+            marker=PLAYER_MARKER,
+        ))
+        update_minimaps()
+    else:
+        zoomed_view.delete()
+        config_globals(zoomed_view=None)
+
+
+def toggle_fov() -> None:
+    """Show the zone through the field of view of the player, or whole again."""
+    if get_globals().fov_radius is None:
+        config_globals(fov_radius=fov.FOV_RADIUS)
+    else:
+        config_globals(fov_radius=None, grid=fov.clear_view(get_globals().grid))
+
+
+def update_minimaps() -> None:
+    """Center the minimap and the zoomed-out view on the player, if they are shown.
+
+    Their rows are the zoomed-out tilemap, compiled once per tilemap by
+    world.tilemap_to_lod_rows().
+    """
+    grid = get_globals().grid
+    player = get_globals().player
+    screen_height = cuinter.get_screen_height()
+    screen_width = cuinter.get_screen_width()
+
+    minimap = get_globals().minimap
+    if minimap is not None:
+        config_globals(minimap=minimap.config(
+            x=screen_width - MINIMAP_WIDTH - 1,
+            rows=grid.get_lod_rows(MINIMAP_SCALE),
+            center_y=player.grid_y,
+            center_x=player.grid_x * MINIMAP_SCALE,
+        ))
+
+    zoomed_view = get_globals().zoomed_view
+    if zoomed_view is not None:
+        config_globals(zoomed_view=zoomed_view.config(
+            height=screen_height - 1,
+            width=screen_width - 1,
+            rows=grid.get_lod_rows(ZOOMED_VIEW_SCALE),
+            center_y=player.grid_y,
+            center_x=player.grid_x * ZOOMED_VIEW_SCALE,
+        ))
+
 
 def load_battle(battle_path: str) -> None:
     """Load and start a battle.
@@ -697,6 +1071,7 @@ def config_settings(**kwargs) -> None:
         **kwargs: Setting names and values to update
     """
     settings.config(**kwargs)
+    cuinter.set_target_fps(settings.get().target_fps)
 
 
 def save_game() -> None:
@@ -705,12 +1080,13 @@ def save_game() -> None:
 
     player = get_globals().player
     zone_path = get_globals().zone_path
+    origin_y, origin_x = get_zone_origin()
 
     game_save = GameSave(
         player.character,
         zone_path,
-        player.grid_y,
-        player.grid_x,
+        player.grid_y + origin_y,
+        player.grid_x + origin_x,
     )
 
     save_pickle(game_save, GAME_SAVE_PATH)
@@ -720,7 +1096,7 @@ def load_game() -> None:
     """Load game state from file or create new game if no save exists."""
     logger.debug("Loading game")
 
-    if os.path.exists(GAME_SAVE_PATH):
+    if os.path.exists(native_path(GAME_SAVE_PATH)):
         game_save = load_pickle(GAME_SAVE_PATH)
     else:
         game_save = GameSave.new()
@@ -751,11 +1127,19 @@ def multi_event(*args: EnumObject) -> None:
         add_event(event)
 
 
-def main() -> None:
-    """Main game loop and initialization."""
+def main(backend: int = BACKEND_TYPES.CURSES, max_frames: int = None,
+         **backend_args) -> None:
+    """Main game loop and initialization.
+
+    Args:
+        backend: Terminal backend from BACKEND_TYPES (default: curses)
+        max_frames: Number of frames to run before returning (default: no limit)
+        **backend_args: Passed to the backend, e.g. height, width and keys
+            for the headless backend
+    """
     settings.load()
 
-    cuinter.setup()
+    cuinter.setup(backend, **backend_args)
 
     add_event(EnumObject(
         EVENT_TYPES.LOAD_GAME,
@@ -771,11 +1155,22 @@ def main() -> None:
         x=0,
         text="FPS:"
     )
+    cuinter.set_target_fps(settings.get().target_fps)
+
     last_time = time.time()
     fps_timer = last_time  # Time of the last FPS update
+    cpu_timer = time.process_time()  # CPU time at the last FPS update
+    auto_walk_timer = last_time  # Time of the next auto-walk step
+    npc_wake_time = None  # Time of the next NPC tick
     frame_count = 0
+    cell_count = 0  # Cells sent to the terminal since the last FPS update
+    byte_count = 0  # Bytes sent to the terminal since the last FPS update
+    cuinter.add_wake_time(fps_timer + FPS_COUNTER_REFRESH)
+
+    while max_frames is None or max_frames > 0:
+        if max_frames is not None:
+            max_frames -= 1
 
-    while True:
         current_time = time.time()
         delta_time = current_time - last_time  # Time since last frame
         last_time = current_time
@@ -783,15 +1178,42 @@ def main() -> None:
         frame_count += 1
         if current_time - fps_timer >= FPS_COUNTER_REFRESH:
             average_fps = frame_count / (current_time - fps_timer)
-            fps_label.config(text=f"FPS: {round(average_fps)}")
+            frame_ms = 1000 * (current_time - fps_timer) / frame_count
+            cpu_ms = 1000 * (time.process_time() - cpu_timer) / frame_count
+            fps_label.config(
+                text=f"FPS: {round(average_fps)}"
+                + f" | {frame_ms:.1f} ms (CPU {cpu_ms:.1f} ms)"
+                + f" | {round(cell_count / frame_count)} cells"
+                + f" | {round(byte_count / frame_count)} B"
+            )
             fps_timer = current_time
+            cpu_timer = time.process_time()
             frame_count = 0
+            cell_count = 0
+            byte_count = 0
+            cuinter.add_wake_time(fps_timer + FPS_COUNTER_REFRESH)
+
+            profiler_label = get_globals().profiler_label
+            if profiler_label.text is not None:
+                config_globals(profiler_label=profiler_label.config(
+                    text=profiler.format_summary(profiler.get_summary()),
+                ))
 
-        events = get_events() + cuinter.update()
+        events = get_events() + cuinter.update(can_idle=not get_events())
         clear_events()
 
+        camera = get_globals().grid.camera
+        if (camera.height != cuinter.get_screen_height()
+        or camera.width != cuinter.get_screen_width()):
+            follow_player()
+
+        render_stats = cuinter.get_render_stats()
+        cell_count += render_stats.cells
+        byte_count += render_stats.bytes
+
         for event_type, event_value in events:
             event_function = EVENT_FUNCTIONS[event_type]
+            start = time.perf_counter()
             if isinstance(event_value, dict):
                 event_function(**event_value)
             elif (
@@ -803,6 +1225,41 @@ def main() -> None:
                 event_function(event_value)
             else:
                 event_function()
+            profiler.add_section("event", event_function.__name__, start)
+
+        if get_globals().auto_walk_path and current_time >= auto_walk_timer:
+            auto_walk_timer = current_time + AUTO_WALK_STEP_TIME
+            cuinter.add_wake_time(auto_walk_timer)
+            step_auto_walk()
+
+        start = time.perf_counter()
+        grid = get_globals().grid
+        player = get_globals().player
+        next_tick_time = npcs.tick_npcs(current_time, player.grid_y, player.grid_x,
+                                        grid.collision_map)
+        if next_tick_time is not None and next_tick_time != npc_wake_time:
+            npc_wake_time = next_tick_time
+            cuinter.add_wake_time(npc_wake_time)
+        profiler.add_section("tick", "npcs", start)
+
+        start = time.perf_counter()
+        shown_grid = grid
+        is_visible = None
+        fov_radius = get_globals().fov_radius
+        if fov_radius is not None:
+            origin_y, origin_x = get_zone_origin()
+            shown_grid = fov.update_view(grid, get_globals().zone_path, origin_y, origin_x,
+                                         player.grid_y, player.grid_x, fov_radius)
+            is_visible = fov.is_tile_visible
+        profiler.add_section("tick", "fov", start)
+
+        start = time.perf_counter()
+        animated_grid = tile_animation.animate_tiles(shown_grid, current_time, is_visible)
+        if animated_grid is not shown_grid:
+            cuinter.add_wake_time(tile_animation.get_next_tile_frame_time(current_time))
+        if animated_grid is not grid:
+            config_globals(grid=animated_grid)
+        profiler.add_section("tick", "tiles", start)
 
 
 # Event handling mapping
@@ -830,6 +1287,7 @@ EVENT_FUNCTIONS = {
     EVENT_TYPES.LOAD_GAME: load_game,
     EVENT_TYPES.QUIT_GAME: quit_game,
     EVENT_TYPES.MULTI_EVENT: multi_event,
+    EVENT_TYPES.FAST_TRAVEL: fast_travel,
 }
 
 # Initialize manager functions
@@ -838,7 +1296,8 @@ EVENT_FUNCTIONS = {
     config_globals,
 ) = _make_globals_manager()
 (
-    get_world_objects,
+    get_world_object_store,
+    set_world_object_store,
     add_world_object,
     clear_world_objects,
 ) = _make_world_object_manager()
@@ -5,7 +5,7 @@ Created on Tue May 13 21:47:27 2025
 """
 
 from typing import NamedTuple
-from files import load_text_dir
+from files import load_text, load_text_dir
 from game_classes import Stats, Character
 import test_items as ti
 
@@ -19,6 +19,7 @@ initial_effects: dict
 """
 
 PLAYER_SPRITE_DIR_PATH = r"assets\sprites\characters\player"
+NPC_SPRITE_PATH = r"assets\sprites\characters\{}.txt"
 
 
 class DefaultStats(NamedTuple):
@@ -111,6 +112,29 @@ def bandit():
     return char
 
 
+def _townsperson(name: str):
+    return Character.new(
+        name            = name,
+        sprite_sheet    = {"down": load_text(NPC_SPRITE_PATH.format(name))},
+        is_player       = False,
+        base_stats      = DefaultStats.human,
+        actions         = [],
+        initial_effects = {}
+        )
+
+
+def tavernkeep():
+    return _townsperson("tavernkeep")
+
+
+def merchant():
+    return _townsperson("merchant")
+
+
+def blacksmith():
+    return _townsperson("blacksmith")
+
+
 if __name__ == "__main__":
     print(goblin())
     print(hobgoblin())
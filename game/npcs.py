@@ -0,0 +1,399 @@
+"""NPC simulation tick.
+
+NPCs step one tile at a time on a schedule kept in a heap, so only the NPCs
+due in a frame are looked at, whatever their number. NPCs within
+NPC_ACTIVITY_RADIUS tiles of the player step every NPC_TICK_TIME seconds,
+farther ones NPC_FAR_TICK_FACTOR times less often: those on a route jump as
+many tiles along it at once, wanderers take a single step.
+
+A frame ticks at most NPC_MAX_TICKS_PER_FRAME NPCs for at most
+NPC_TICK_BUDGET seconds, NPCs still due are ticked in the next frames.
+
+When the player leaves a zone its NPCs are stored, and coming back
+fast-forwards them instead of simulating every missed step: NPCs on a route
+move along it by the number of steps they missed, and wanderers which missed
+enough steps to be anywhere around their home are placed on a random
+walkable tile there.
+
+Contributors:
+    Romain
+"""
+
+from __future__ import annotations
+import heapq
+import itertools
+import logging
+import random
+import time
+from typing import Callable, NamedTuple
+from world import NPC, CollisionMap, Grid
+
+logger = logging.getLogger(__name__)
+
+NPC_TICK_TIME = 0.5  # Time between steps of NPCs near the player (in seconds)
+NPC_FAR_TICK_FACTOR = 8  # NPCs beyond the activity radius are ticked this many times less often
+NPC_ACTIVITY_RADIUS = 16  # Distance from the player in tiles
+NPC_MAX_TICKS_PER_FRAME = 256
+NPC_TICK_BUDGET = 0.002  # Maximum time spent ticking NPCs per frame (in seconds)
+NPC_IDLE_CHANCE = 0.5  # Chance for a wandering NPC to stay still on a tick
+NPC_WANDER_TRIES = 8  # Random tiles tried when fast-forwarding a wandering NPC
+NPC_PLACE_RADIUS = 4  # Distance in tiles searched for a free tile when an NPC's tile is taken
+
+
+class TickStats(NamedTuple):
+    """Counters of the NPC tick system.
+
+    Attributes:
+        npcs (int): NPCs in the current zone.
+        ticks (int): NPC ticks since the last clear.
+        far_ticks (int): Ticks of NPCs beyond the activity radius.
+        capped_frames (int): Frames which reached the tick cap with NPCs still due.
+        time (float): Time spent ticking NPCs (in seconds).
+        max_frame_time (float): Longest time spent ticking NPCs in a frame (in seconds).
+    """
+    npcs: int = 0
+    ticks: int = 0
+    far_ticks: int = 0
+    capped_frames: int = 0
+    time: float = 0
+    max_frame_time: float = 0
+
+
+def _make_npc_manager() -> tuple[Callable, ...]:
+    """Creates functions to tick the NPCs of the current zone and store those of the others.
+
+    NPCs are stored by id, along with the tile each of them stands on and
+    their homes. The heap holds (tick_time, id) items, ids of removed NPCs
+    being skipped.
+    """
+    npcs = {}  # id: NPC
+    occupied = {}  # (grid_y, grid_x): id
+    homes = {}  # (home_y, home_x): number of NPCs living there
+    queue = []  # (tick_time, id)
+    zone_npcs = {}  # zone_path: (time, tuple[NPC, ...])
+    ids = itertools.count()
+    rng = random.Random()
+    stats = TickStats()
+
+    def get_free_tile(grid: Grid, grid_y: int, grid_x: int) -> tuple[int, int] | None:
+        """Return the closest walkable tile to (grid_y, grid_x) without an NPC on it.
+
+        Returns None if there is none within NPC_PLACE_RADIUS tiles.
+        """
+        for radius in range(NPC_PLACE_RADIUS + 1):
+            for tile_y in range(grid_y - radius, grid_y + radius + 1):
+                step = 1 if abs(tile_y - grid_y) == radius else 2 * radius or 1
+                for tile_x in range(grid_x - radius, grid_x + radius + 1, step):
+                    if (tile_y, tile_x) not in occupied and grid.is_walkable(tile_y, tile_x):
+                        return tile_y, tile_x
+        return None
+
+    def add_npc(npc: NPC, now: float = None) -> int | None:
+        """Add an NPC to the current zone and return its id.
+
+        An NPC whose tile is taken by another one is moved to the closest free
+        tile, and isn't added if there is none (returns None).
+        Its first tick is spread over NPC_TICK_TIME so NPCs added together
+        don't all step in the same frame.
+        """
+        if now is None:
+            now = time.time()
+        if (npc.grid_y, npc.grid_x) in occupied:
+            tile = get_free_tile(npc.grid, npc.grid_y, npc.grid_x)
+            if tile is None:
+                logger.warning(f"No free tile for an NPC around {(npc.grid_y, npc.grid_x)}")
+                npc.delete()
+                return None
+            npc = npc.config(grid_y=tile[0], grid_x=tile[1])
+        npc_id = next(ids)
+        npcs[npc_id] = npc
+        occupied[npc.grid_y, npc.grid_x] = npc_id
+        homes[npc.home_y, npc.home_x] = homes.get((npc.home_y, npc.home_x), 0) + 1
+        heapq.heappush(queue, (now + rng.random() * NPC_TICK_TIME, npc_id))
+        return npc_id
+
+    def get_npcs() -> list[NPC]:
+        return list(npcs.values())
+
+    def get_npc_at(grid_y: int, grid_x: int) -> NPC | None:
+        npc_id = occupied.get((grid_y, grid_x))
+        return None if npc_id is None else npcs[npc_id]
+
+    def has_npc_home(grid_y: int, grid_x: int) -> bool:
+        """Return whether an NPC of the current zone has its home at (grid_y, grid_x)."""
+        return (grid_y, grid_x) in homes
+
+    def move_npc(npc_id: int, npc: NPC, grid_y: int, grid_x: int, **kwargs) -> NPC:
+        """Move an NPC to a tile and update its other attributes, unless another NPC is there."""
+        if (grid_y, grid_x) != (npc.grid_y, npc.grid_x):
+            if (grid_y, grid_x) in occupied:
+                return npc
+            del occupied[npc.grid_y, npc.grid_x]
+            occupied[grid_y, grid_x] = npc_id
+            kwargs.update(grid_y=grid_y, grid_x=grid_x)
+        if not kwargs:
+            return npc
+
+        npc = npc.config(**kwargs)
+        npcs[npc_id] = npc
+        return npc
+
+    def step_npc(npc_id: int, npc: NPC, steps: int, player_position: tuple[int, int],
+                 collision_map: CollisionMap) -> None:
+        """Move an NPC steps tiles along its route, or one tile around its home."""
+        if npc.route:
+            route_index = (npc.route_index + steps) % len(npc.route)
+            if npc.route[route_index] != player_position:
+                move_npc(npc_id, npc, *npc.route[route_index], route_index=route_index)
+            return
+
+        if not npc.wander_radius or rng.random() < NPC_IDLE_CHANCE:
+            return
+        tiles = [
+            (grid_y, grid_x)
+            for grid_y, grid_x in collision_map.get_walkable_neighbours(npc.grid_y, npc.grid_x)
+            if abs(grid_y - npc.home_y) <= npc.wander_radius
+            and abs(grid_x - npc.home_x) <= npc.wander_radius
+            and (grid_y, grid_x) not in occupied
+            and (grid_y, grid_x) != player_position
+        ]
+        if tiles:
+            move_npc(npc_id, npc, *rng.choice(tiles))
+
+    def tick_npcs(now: float, player_y: int, player_x: int,
+                  collision_map: CollisionMap) -> float | None:
+        """Tick the NPCs due at now, within the per-frame cap.
+
+        Returns the time of the next tick, None if there are no NPCs.
+        """
+        nonlocal stats
+        if collision_map is None:
+            return queue[0][0] if queue else None
+
+        start = time.perf_counter()
+        ticks = 0
+        far_ticks = 0
+        capped = False
+        while queue and queue[0][0] <= now:
+            if (ticks >= NPC_MAX_TICKS_PER_FRAME
+            or time.perf_counter() - start > NPC_TICK_BUDGET):
+                capped = True
+                break
+
+            tick_time, npc_id = heapq.heappop(queue)
+            npc = npcs.get(npc_id)
+            if npc is None:
+                continue
+
+            ticks += 1
+            if max(abs(npc.grid_y - player_y), abs(npc.grid_x - player_x)) <= NPC_ACTIVITY_RADIUS:
+                step_npc(npc_id, npc, 1, (player_y, player_x), collision_map)
+                next_tick_time = tick_time + NPC_TICK_TIME
+            else:
+                far_ticks += 1
+                step_npc(npc_id, npc, NPC_FAR_TICK_FACTOR, (player_y, player_x), collision_map)
+                next_tick_time = tick_time + NPC_TICK_TIME * NPC_FAR_TICK_FACTOR
+            # NPCs late by more than a tick don't catch up with several steps in a row
+            heapq.heappush(queue, (max(next_tick_time, now), npc_id))
+
+        frame_time = time.perf_counter() - start
+        stats = TickStats(
+            len(npcs),
+            stats.ticks + ticks,
+            stats.far_ticks + far_ticks,
+            stats.capped_frames + capped,
+            stats.time + frame_time,
+            max(stats.max_frame_time, frame_time),
+        )
+        return queue[0][0] if queue else None
+
+    def shift_npcs(grid: Grid, grid_y: int, grid_x: int) -> None:
+        """Move every NPC by (grid_y, grid_x) onto grid, removing those which end up outside of it.
+
+        Used when the chunk window is rebuilt and its coordinates change.
+        """
+        height = len(grid.tilemap)
+        width = len(grid.tilemap[0])
+        shifted = [(npc_id, npc) for npc_id, npc in npcs.items()]
+        occupied.clear()
+        homes.clear()
+        for npc_id, npc in shifted:
+            new_y = npc.grid_y + grid_y
+            new_x = npc.grid_x + grid_x
+            if not (0 <= new_y < height and 0 <= new_x < width):
+                npc.delete()
+                del npcs[npc_id]
+                continue
+
+            npcs[npc_id] = npc.config(
+                grid=grid,
+                grid_y=new_y,
+                grid_x=new_x,
+                home_y=npc.home_y + grid_y,
+                home_x=npc.home_x + grid_x,
+                route=tuple((y + grid_y, x + grid_x) for y, x in npc.route),
+            )
+            occupied[new_y, new_x] = npc_id
+            home = (npc.home_y + grid_y, npc.home_x + grid_x)
+            homes[home] = homes.get(home, 0) + 1
+
+    def clear_npcs() -> None:
+        """Remove every NPC of the current zone and its sprite."""
+        for npc in npcs.values():
+            npc.delete()
+        npcs.clear()
+        occupied.clear()
+        homes.clear()
+        queue.clear()
+
+    def store_zone(zone_path: str, now: float = None) -> None:
+        """Remove the NPCs of the current zone and keep them to fast-forward them later."""
+        if now is None:
+            now = time.time()
+        if npcs:
+            logger.debug(f"Storing {len(npcs)} NPCs of {zone_path}")
+            zone_npcs[zone_path] = (now, tuple(npcs.values()))
+        clear_npcs()
+
+    def restore_zone(zone_path: str, grid: Grid, now: float = None) -> bool:
+        """Add back the stored NPCs of a zone on grid, fast-forwarded to now.
+
+        Returns False if the zone has no stored NPCs.
+        """
+        if zone_path not in zone_npcs:
+            return False
+        if now is None:
+            now = time.time()
+
+        clear_npcs()
+        left_time, stored_npcs = zone_npcs.pop(zone_path)
+        steps = int((now - left_time) / NPC_TICK_TIME)
+        logger.debug(f"Fast-forwarding {len(stored_npcs)} NPCs of {zone_path} by {steps} steps")
+
+        for npc in stored_npcs:
+            grid_y, grid_x = npc.grid_y, npc.grid_x
+            route_index = npc.route_index
+            if npc.route:
+                route_index = (route_index + steps) % len(npc.route)
+                grid_y, grid_x = npc.route[route_index]
+            elif npc.wander_radius and steps >= npc.wander_radius ** 2:
+                # A random walk of r² steps can be anywhere within r tiles
+                for _ in range(NPC_WANDER_TRIES):
+                    tile_y = npc.home_y + rng.randint(-npc.wander_radius, npc.wander_radius)
+                    tile_x = npc.home_x + rng.randint(-npc.wander_radius, npc.wander_radius)
+                    if grid.is_walkable(tile_y, tile_x) and (tile_y, tile_x) not in occupied:
+                        grid_y, grid_x = tile_y, tile_x
+                        break
+
+            # add_npc moves the NPC next to its tile if both are taken
+            if ((grid_y, grid_x) in occupied
+            and (npc.grid_y, npc.grid_x) not in occupied):
+                grid_y, grid_x = npc.grid_y, npc.grid_x
+            # Built again, as the sprites of stored NPCs were removed from their layer
+            world_character = npc.world_character
+            restored_npc = NPC.new(
+                grid,
+                npc.home_y,
+                npc.home_x,
+                world_character.character,
+                npc.route,
+                npc.wander_radius,
+                world_character.grid_multi_sprite.sprite_key,
+                world_character.y_offset,
+                world_character.x_offset,
+            )
+            add_npc(
+                restored_npc.config(grid_y=grid_y, grid_x=grid_x, route_index=route_index),
+                now,
+            )
+        return True
+
+    def get_stats() -> TickStats:
+        return stats._replace(npcs=len(npcs))
+
+    def clear_stats() -> None:
+        nonlocal stats
+        stats = TickStats()
+
+    return (
+        add_npc,
+        get_npcs,
+        get_npc_at,
+        has_npc_home,
+        tick_npcs,
+        shift_npcs,
+        clear_npcs,
+        store_zone,
+        restore_zone,
+        get_stats,
+        clear_stats,
+    )
+
+
+(
+    add_npc,
+    get_npcs,
+    get_npc_at,
+    has_npc_home,
+    tick_npcs,
+    shift_npcs,
+    clear_npcs,
+    store_zone,
+    restore_zone,
+    get_tick_stats,
+    clear_tick_stats,
+) = _make_npc_manager()
+
+
+def _test():
+    """Tick NPCs near and far from the player, then leave the zone and come back."""
+    import cuinter
+    from enums import BACKEND_TYPES, RENDER_LAYERS
+    import monsters
+    cuinter.setup(BACKEND_TYPES.HEADLESS)
+    tilemap = tuple(" " * 40 for _ in range(40))
+    grid = Grid.new({" ": "\n".join(["  "] * 8)}, tilemap)
+    route = ((0, 0), (0, 1), (1, 1), (1, 0))
+
+    add_npc(NPC.new(grid, 0, 0, monsters.merchant(), route=route), 0)
+    add_npc(NPC.new(grid, 30, 30, monsters.blacksmith(), wander_radius=2), 0)
+    assert get_npc_at(0, 0) is not None and has_npc_home(30, 30) and not has_npc_home(30, 31)
+
+    for frame in range(1, 21):
+        tick_npcs(frame * NPC_TICK_TIME, 2, 2, grid.collision_map)
+    merchant, blacksmith = get_npcs()
+    assert merchant.route_index == 20 % len(route)
+    assert get_npc_at(merchant.grid_y, merchant.grid_x) == merchant
+    assert abs(blacksmith.grid_y - 30) <= 2 and abs(blacksmith.grid_x - 30) <= 2
+    assert get_tick_stats().far_ticks < get_tick_stats().ticks / 2
+
+    store_zone("test_zone", 10)
+    assert not get_npcs() and not has_npc_home(30, 30)
+    assert restore_zone("test_zone", grid, 10 + 3 * NPC_TICK_TIME)
+    merchant = next(npc for npc in get_npcs() if npc.route)
+    assert merchant.route_index == (20 + 3) % len(route)
+    sprite_renderer = merchant.world_character.grid_multi_sprite.grid_sprite.sprite_renderer
+    assert cuinter.get_element_layer(sprite_renderer.pid) == RENDER_LAYERS.SPRITES
+    assert not restore_zone("test_zone", grid)
+    shift_npcs(grid, 1, 1)
+    assert has_npc_home(31, 31) and not has_npc_home(30, 30)
+
+    # The fast-forwarded tile of an NPC and its stored tile are both taken
+    clear_npcs()
+    add_npc(NPC.new(grid, 0, 0, monsters.merchant(), route=((0, 0), (0, 1), (0, 2), (0, 3))), 0)
+    add_npc(NPC.new(grid, 0, 2, monsters.blacksmith(), route=((0, 2), (1, 2))), 0)
+    store_zone("test_zone", 0)
+    restore_zone("test_zone", grid, 2 * NPC_TICK_TIME)
+    tiles = [(npc.grid_y, npc.grid_x) for npc in get_npcs()]
+    assert len(set(tiles)) == len(tiles) == 2
+    for frame in range(1, 9):
+        tick_npcs(2 * NPC_TICK_TIME + frame * NPC_TICK_TIME, 20, 20, grid.collision_map)
+    assert all(get_npc_at(npc.grid_y, npc.grid_x) == npc for npc in get_npcs())
+
+    clear_npcs()
+    clear_tick_stats()
+    print("all Tests passed")
+
+
+if __name__ == "__main__":
+    _test()
@@ -0,0 +1,293 @@
+"""Pathfinding on the walkable tiles of a world.Grid.
+
+Single paths are found with A*. Distance fields give the distance of every
+tile to a set of targets (the player, zone exits), so any number of
+characters can walk toward them by stepping to a neighbour with a smaller
+distance. Moves cost one tile, so the fields are built by a breadth-first
+Dijkstra.
+
+Distance fields are cached by collision map and targets, the
+DISTANCE_FIELD_CACHE_SIZE most recently used are kept. Fields of a collision
+map are dropped by its listener when the walkability of one of its tiles
+changes. Tiles changed by Grid.set_tiles() update the collision map in place,
+so this invalidation is what keeps their fields right, while a tilemap
+replaced through Grid.config() gets a new collision map and old fields are
+never looked up again.
+
+Contributors:
+    Romain
+"""
+
+from __future__ import annotations
+from array import array
+from collections import OrderedDict
+import heapq
+import logging
+from typing import Callable, Iterable, NamedTuple
+from common import CacheStats
+from world import CollisionMap
+
+logger = logging.getLogger(__name__)
+
+DISTANCE_FIELD_CACHE_SIZE = 16  # Number of distance fields kept in memory
+UNREACHABLE = -1  # Distance of tiles from which no target can be reached
+
+
+def _get_neighbours(offset: int, height: int, width: int) -> list[int]:
+    """Return the offsets of the tiles next to offset in a flat map, diagonals excluded."""
+    neighbours = []
+    if offset >= width:
+        neighbours.append(offset - width)
+    if offset < (height - 1) * width:
+        neighbours.append(offset + width)
+    x = offset % width
+    if x > 0:
+        neighbours.append(offset - 1)
+    if x < width - 1:
+        neighbours.append(offset + 1)
+    return neighbours
+
+
+def find_path(collision_map: CollisionMap, start: tuple[int, int], goal: tuple[int, int],
+              max_nodes: int = None) -> list[tuple[int, int]] | None:
+    """Return the shortest walkable path from start to goal with A*.
+
+    The path lists the (y, x) tiles to walk on, goal included and start
+    excluded. Returns None if goal can't be reached, or if more than
+    max_nodes tiles were expanded.
+    """
+    height = collision_map.height
+    width = collision_map.width
+    cells = collision_map.cells
+    goal_y, goal_x = goal
+    if not collision_map.is_walkable(goal_y, goal_x):
+        return None
+    if start == goal:
+        return []
+
+    start_offset = start[0] * width + start[1]
+    goal_offset = goal_y * width + goal_x
+    costs = {start_offset: 0}
+    parents = {start_offset: None}
+    queue = [(abs(start[0] - goal_y) + abs(start[1] - goal_x), 0, start_offset)]
+    expanded = 0
+
+    while queue:
+        _, cost, offset = heapq.heappop(queue)
+        if offset == goal_offset:
+            path = []
+            while offset != start_offset:
+                path.append(divmod(offset, width))
+                offset = parents[offset]
+            path.reverse()
+            return path
+        if cost > costs[offset]:
+            continue  # Already expanded with a lower cost
+
+        expanded += 1
+        if max_nodes is not None and expanded > max_nodes:
+            return None
+
+        cost += 1
+        for neighbour in _get_neighbours(offset, height, width):
+            if not cells[neighbour] or costs.get(neighbour, cost + 1) <= cost:
+                continue
+            costs[neighbour] = cost
+            parents[neighbour] = offset
+            y, x = divmod(neighbour, width)
+            heapq.heappush(queue, (cost + abs(y - goal_y) + abs(x - goal_x), cost, neighbour))
+
+    return None
+
+
+class DistanceField(NamedTuple):
+    """Distance of every tile of a collision map to the nearest of its targets.
+
+    Attributes:
+        height (int): Number of rows of tiles.
+        width (int): Number of columns of tiles.
+        targets (tuple[tuple[int, int], ...]): (y, x) tiles at distance 0.
+        distances (array): Distance of each tile, row after row, UNREACHABLE
+            for tiles which can't reach any target.
+    """
+    height: int
+    width: int
+    targets: tuple[tuple[int, int], ...]
+    distances: array
+
+    @classmethod
+    def new(cls, collision_map: CollisionMap, targets: tuple[tuple[int, int], ...]) -> DistanceField:
+        """Compute the distances to targets on the walkable tiles of collision_map.
+
+        Targets are reached even if they aren't walkable themselves, like doors.
+        """
+        height = collision_map.height
+        width = collision_map.width
+        cells = collision_map.cells
+        distances = array("i", [UNREACHABLE]) * (height * width)
+
+        frontier = []
+        for y, x in targets:
+            if 0 <= y < height and 0 <= x < width:
+                distances[y * width + x] = 0
+                frontier.append(y * width + x)
+
+        distance = 0
+        while frontier:
+            distance += 1
+            next_frontier = []
+            for offset in frontier:
+                for neighbour in _get_neighbours(offset, height, width):
+                    if cells[neighbour] and distances[neighbour] == UNREACHABLE:
+                        distances[neighbour] = distance
+                        next_frontier.append(neighbour)
+            frontier = next_frontier
+
+        return cls(height, width, tuple(targets), distances)
+
+    def get_distance(self, y: int, x: int) -> int:
+        """Return the distance from (y, x) to the nearest target, UNREACHABLE outside of the map."""
+        if not (0 <= y < self.height and 0 <= x < self.width):
+            return UNREACHABLE
+        return self.distances[y * self.width + x]
+
+    def get_next_step(self, y: int, x: int) -> tuple[int, int] | None:
+        """Return the neighbour of (y, x) closest to a target, None if there is none."""
+        distance = self.get_distance(y, x)
+        if distance <= 0:
+            return None
+
+        offset = y * self.width + x
+        for neighbour in _get_neighbours(offset, self.height, self.width):
+            if self.distances[neighbour] == distance - 1:
+                return divmod(neighbour, self.width)
+        return None
+
+    def get_path(self, y: int, x: int) -> list[tuple[int, int]] | None:
+        """Return a shortest path from (y, x) to the nearest target, start excluded.
+
+        Returns None if no target can be reached.
+        """
+        if self.get_distance(y, x) == UNREACHABLE:
+            return None
+
+        path = []
+        step = self.get_next_step(y, x)
+        while step is not None:
+            path.append(step)
+            step = self.get_next_step(*step)
+        return path
+
+
+def _make_distance_field_manager() -> tuple[Callable, ...]:
+    """Creates functions to get distance fields through an LRU cache.
+
+    Entries are keyed by collision map identity and targets. A listener is
+    added to each collision map with fields in the cache, it drops them when
+    a tile of the map changes.
+    """
+    cache = OrderedDict()  # (id(collision_map), targets): (collision_map, DistanceField)
+    listeners = {}  # id(collision_map): (collision_map, listener)
+    hits = 0
+    misses = 0
+    evictions = 0
+
+    def remove_map(map_id: int) -> None:
+        """Drop every field of a collision map and its listener."""
+        for key in [key for key in cache if key[0] == map_id]:
+            del cache[key]
+        collision_map, listener = listeners.pop(map_id)
+        collision_map.remove_listener(listener)
+
+    def remove_item(key: tuple) -> None:
+        del cache[key]
+        if not any(other_key[0] == key[0] for other_key in cache):
+            collision_map, listener = listeners.pop(key[0])
+            collision_map.remove_listener(listener)
+
+    def get_item(collision_map: CollisionMap, targets: Iterable[tuple[int, int]]) -> DistanceField:
+        """Return the distance field toward targets, computing it if needed."""
+        nonlocal hits, misses, evictions
+        targets = tuple(sorted(set(targets)))
+        key = (id(collision_map), targets)
+        entry = cache.get(key)
+        if entry is not None and entry[0] is collision_map:
+            hits += 1
+            cache.move_to_end(key)
+            return entry[1]
+
+        misses += 1
+        map_id = id(collision_map)
+        if map_id in listeners and listeners[map_id][0] is not collision_map:
+            remove_map(map_id)  # Fields of a dead collision map with a reused id
+        if map_id not in listeners:
+            def listener(positions: list[tuple[int, int]]) -> None:
+                logger.debug(f"Dropping distance fields, walkability changed at {positions}")
+                remove_map(map_id)
+
+            collision_map.add_listener(listener)
+            listeners[map_id] = (collision_map, listener)
+
+        distance_field = DistanceField.new(collision_map, targets)
+        cache[key] = (collision_map, distance_field)
+        if len(cache) > DISTANCE_FIELD_CACHE_SIZE:
+            remove_item(next(iter(cache)))
+            evictions += 1
+        return distance_field
+
+    def get_stats() -> CacheStats:
+        return CacheStats(hits, misses, evictions, len(cache))
+
+    def clear_cache() -> None:
+        nonlocal hits, misses, evictions
+        for map_id in list(listeners):
+            remove_map(map_id)
+        hits = 0
+        misses = 0
+        evictions = 0
+
+    return get_item, get_stats, clear_cache
+
+
+(
+    get_distance_field,
+    get_distance_field_stats,
+    clear_distance_fields,
+) = _make_distance_field_manager()
+
+
+def _test():
+    """Find paths around a wall, then block a tile and check the fields are dropped."""
+    tilemap = (
+        "     ",
+        " ║║║ ",
+        " ║   ",
+        " ║ ║║",
+        "     ",
+    )
+    collision_map = CollisionMap.new(tilemap)
+
+    path = find_path(collision_map, (2, 2), (0, 2))
+    assert path is not None and len(path) == 6 and path[-1] == (0, 2)
+    assert find_path(collision_map, (0, 0), (1, 1)) is None
+    assert find_path(collision_map, (0, 0), (0, 0)) == []
+
+    distance_field = get_distance_field(collision_map, [(0, 2)])
+    assert distance_field.get_distance(2, 2) == 6
+    assert distance_field.get_path(2, 2)[-1] == (0, 2)
+    assert distance_field.get_distance(1, 1) == UNREACHABLE
+    assert get_distance_field(collision_map, [(0, 2)]) is distance_field
+    assert get_distance_field_stats().hits == 1
+
+    collision_map.set_override(2, 4, False)
+    assert get_distance_field_stats().size == 0 and not collision_map.listeners
+    distance_field = get_distance_field(collision_map, [(0, 2)])
+    assert distance_field.get_distance(2, 2) == 10
+
+    clear_distance_fields()
+    assert not collision_map.listeners
+    print("all Tests passed")
+
+
+if __name__ == "__main__":
+    _test()
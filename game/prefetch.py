@@ -0,0 +1,233 @@
+"""Background prefetch of the zones next to the current one.
+
+The zones reachable through the LOAD_ZONE events of the current zone's walk
+triggers are compiled on a worker thread while the player walks, so
+load_zone finds them ready instead of stalling the frame on disk reads and
+sprite compilation. The PREFETCH_CACHE_SIZE most recently used compiled
+zones are kept in memory, along with the modification time and size of the
+zone file and the tileset they were compiled with: a zone edited since, or
+asked for with another tileset, is compiled again.
+
+Every access to the zone cache goes through this module, under a lock, as
+the zone cache manager isn't thread safe.
+
+Contributors:
+    Romain
+"""
+
+from __future__ import annotations
+from collections import OrderedDict
+import logging
+import os
+import threading
+from typing import Callable, Iterable
+import chunks
+from common import CacheStats, EnumObject
+from enums import EVENT_TYPES
+from files import load_pickle, native_path
+import zone_cache
+from zone_cache import CompiledZone
+
+logger = logging.getLogger(__name__)
+
+PREFETCH_CACHE_SIZE = 8  # Number of compiled zones kept in memory
+
+
+def _get_event_zone_paths(event: EnumObject) -> list[str]:
+    """Return the zone paths loaded by an event, looking into multi events."""
+    if event is None:
+        return []
+
+    event_type, value = event
+    if event_type == EVENT_TYPES.LOAD_ZONE:
+        return [value["zone_path"] if isinstance(value, dict) else value[0]]
+    if event_type == EVENT_TYPES.MULTI_EVENT:
+        return [zone_path for sub_event in value for zone_path in _get_event_zone_paths(sub_event)]
+    return []
+
+
+def get_load_zone_paths(events: Iterable[EnumObject]) -> list[str]:
+    """Return the zone paths loaded by walk trigger events, without duplicates."""
+    zone_paths = {}
+    for event in events:
+        for zone_path in _get_event_zone_paths(event):
+            zone_paths[zone_path] = None
+    return list(zone_paths)
+
+
+def _get_stamp(zone_path: str) -> tuple[int, int]:
+    stat = os.stat(native_path(zone_path))
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _compile_zone(zone_path: str, tileset: dict[str, str], tile_dir_path: str,
+                  lock: threading.Lock) -> CompiledZone | None:
+    """Return the zone at zone_path compiled through the zone cache, None for chunked zones."""
+    if isinstance(load_pickle(zone_path), chunks.ChunkedZone):
+        return None
+    with lock:
+        return zone_cache.get_compiled_zone(zone_path, tileset, tile_dir_path)
+
+
+def _make_prefetcher() -> tuple[Callable, ...]:
+    """Creates functions to compile zones on a worker thread and get them back.
+
+    The worker thread is started on the first prefetch. It compiles the
+    pending zones in order, oldest request first. The condition guards the
+    pending zones, the zone being compiled and the results.
+    """
+    lock = threading.Lock()  # Zone cache access
+    condition = threading.Condition()
+    pending = OrderedDict()  # zone_path: (tileset, tile_dir_path)
+    results = OrderedDict()  # zone_path: (stamp, tileset, tile_dir_path, CompiledZone | None)
+    compiling = None  # Path of the zone being compiled by the worker
+    thread = None
+    hits = 0
+    misses = 0
+    evictions = 0
+
+    def add_result(zone_path: str, stamp: tuple[int, int], tileset: dict[str, str],
+                   tile_dir_path: str, compiled_zone: CompiledZone | None) -> None:
+        nonlocal evictions
+        results[zone_path] = (stamp, tileset, tile_dir_path, compiled_zone)
+        results.move_to_end(zone_path)
+        while len(results) > PREFETCH_CACHE_SIZE:
+            results.popitem(last=False)
+            evictions += 1
+
+    def is_ready(zone_path: str, tileset: dict[str, str], tile_dir_path: str) -> bool:
+        """Return whether the result for zone_path is still valid for tileset."""
+        if zone_path not in results:
+            return False
+        stamp, result_tileset, result_tile_dir_path, _ = results[zone_path]
+        try:
+            is_edited = stamp != _get_stamp(zone_path)
+        except OSError:
+            is_edited = True
+        return not is_edited and result_tileset is tileset and result_tile_dir_path == tile_dir_path
+
+    def work() -> None:
+        nonlocal compiling
+        while True:
+            with condition:
+                while not pending:
+                    condition.wait()
+                zone_path, (tileset, tile_dir_path) = pending.popitem(last=False)
+                compiling = zone_path
+
+            logger.debug(f"Prefetching zone: {zone_path}")
+            try:
+                stamp = _get_stamp(zone_path)
+                compiled_zone = _compile_zone(zone_path, tileset, tile_dir_path, lock)
+            except Exception:
+                logger.exception(f"Failed to prefetch zone: {zone_path}")
+            else:
+                with condition:
+                    add_result(zone_path, stamp, tileset, tile_dir_path, compiled_zone)
+
+            with condition:
+                compiling = None
+                condition.notify_all()
+
+    def prefetch_zones(zone_paths: Iterable[str], tileset: dict[str, str],
+                       tile_dir_path: str) -> None:
+        """Compile the zones at zone_paths in the background, unless they are ready already."""
+        nonlocal thread
+        with condition:
+            for zone_path in zone_paths:
+                if zone_path != compiling and not is_ready(zone_path, tileset, tile_dir_path):
+                    pending[zone_path] = (tileset, tile_dir_path)
+            if not pending:
+                return
+            condition.notify_all()
+
+        if thread is None:
+            thread = threading.Thread(target=work, name="prefetch", daemon=True)
+            thread.start()
+
+    def get_compiled_zone(zone_path: str, tileset: dict[str, str],
+                          tile_dir_path: str) -> CompiledZone | None:
+        """Return the zone at zone_path compiled, None for chunked zones.
+
+        Waits for the worker if it is compiling this zone, compiles it
+        right away if it wasn't prefetched or was edited since.
+        """
+        nonlocal hits, misses
+        with condition:
+            while compiling == zone_path:
+                condition.wait()
+            pending.pop(zone_path, None)
+            if is_ready(zone_path, tileset, tile_dir_path):
+                hits += 1
+                results.move_to_end(zone_path)
+                return results[zone_path][3]
+            misses += 1
+
+        stamp = _get_stamp(zone_path)
+        compiled_zone = _compile_zone(zone_path, tileset, tile_dir_path, lock)
+        with condition:
+            add_result(zone_path, stamp, tileset, tile_dir_path, compiled_zone)
+        return compiled_zone
+
+    def wait_prefetch(timeout: float = None) -> bool:
+        """Wait until no zone is left to prefetch, return False on timeout."""
+        with condition:
+            return condition.wait_for(lambda: not pending and compiling is None, timeout)
+
+    def get_stats() -> CacheStats:
+        return CacheStats(hits, misses, evictions, len(results))
+
+    def clear_cache() -> None:
+        """Forget the prefetched zones and the zones waiting to be prefetched."""
+        nonlocal hits, misses, evictions
+        with condition:
+            pending.clear()
+            results.clear()
+            hits = 0
+            misses = 0
+            evictions = 0
+
+    return prefetch_zones, get_compiled_zone, wait_prefetch, get_stats, clear_cache
+
+
+(
+    prefetch_zones,
+    get_compiled_zone,
+    wait_prefetch,
+    get_prefetch_stats,
+    clear_prefetch_cache,
+) = _make_prefetcher()
+
+
+def _test():
+    """Prefetch the zones reachable from a trigger and check load gets them ready."""
+    from files import delete, save_pickle
+    tileset = {" ": "\n".join(["ab"] * 8), "║": "\n".join(["cd"] * 8)}
+    zone_path = "user_data\\test_zone.pkl"
+    save_pickle(((" ║", "  "), ()), zone_path)
+    event = EnumObject(EVENT_TYPES.MULTI_EVENT, (
+        EnumObject(EVENT_TYPES.LOAD_ZONE, (zone_path, 1, 1)),
+        EnumObject(EVENT_TYPES.LOAD_ZONE, {"zone_path": zone_path}),
+    ))
+    assert get_load_zone_paths([event, None]) == [zone_path]
+
+    prefetch_zones(get_load_zone_paths([event]), tileset, "assets\\sprites\\tiles")
+    assert wait_prefetch(10)
+    compiled_zone = get_compiled_zone(zone_path, tileset, "assets\\sprites\\tiles")
+    assert compiled_zone.sprite_rows[0] == "abcd"
+    assert get_prefetch_stats().hits == 1 and get_prefetch_stats().misses == 0
+
+    # An edited zone, or another tileset, compiles the zone again
+    save_pickle((("║║", "  "), ()), zone_path)
+    assert get_compiled_zone(zone_path, tileset, "assets\\sprites\\tiles").sprite_rows[0] == "cdcd"
+    get_compiled_zone(zone_path, dict(tileset), "assets\\sprites\\tiles")
+    assert get_prefetch_stats().misses == 2
+
+    clear_prefetch_cache()
+    zone_cache.clear_zone_cache()
+    delete(zone_path)
+    print("all Tests passed")
+
+
+if __name__ == "__main__":
+    _test()
@@ -0,0 +1,164 @@
+"""Per-frame timing breakdown.
+
+Each frame is split into timed sections, grouped by category: input polling,
+event dispatch, NPC ticks, element draw (per element class), compositing and
+terminal flush. Only the last PROFILER_FRAME_COUNT frames are kept, in a ring buffer,
+so the profiler can always be running. They can be summarized for a HUD or
+dumped as a Chrome trace (chrome://tracing, Perfetto).
+
+Contributors:
+    Romain
+"""
+
+from __future__ import annotations
+from collections import deque
+import logging
+import time
+from typing import Callable
+from files import save_json
+
+logger = logging.getLogger(__name__)
+
+PROFILER_FRAME_COUNT = 300  # Frames kept in the ring buffer
+TRACE_PATH = "logs\\trace_{}.json"
+SECTION_CATEGORIES = ("input", "event", "tick", "draw", "composite", "flush")
+
+
+def _make_profiler_manager() -> tuple[Callable, ...]:
+    """Creates functions to record frame sections in a ring buffer.
+
+    A frame is a (start, sections) tuple, each section being a
+    (category, name, start, duration) tuple, times from time.perf_counter().
+    """
+    frames = deque(maxlen=PROFILER_FRAME_COUNT)
+    sections = None  # Sections of the current frame
+
+    def start_frame() -> None:
+        nonlocal sections
+        sections = []
+        frames.append((time.perf_counter(), sections))
+
+    def add_section(category: str, name: str, start: float, end: float = None) -> None:
+        """Record a section of the current frame which started at start, ending now by default."""
+        if sections is None:
+            return
+        if end is None:
+            end = time.perf_counter()
+        sections.append((category, name, start, end - start))
+
+    def get_frames() -> list[tuple[float, list[tuple[str, str, float, float]]]]:
+        return list(frames)
+
+    def get_summary() -> dict[str, float]:
+        """Return the mean time per frame of each category and section, in milliseconds.
+
+        Keys are categories and "category name" for sections, plus "frame" and
+        "max_frame" for the time between the start of a frame and its last section.
+        """
+        totals = {category: 0 for category in SECTION_CATEGORIES}
+        totals["frame"] = 0
+        max_frame = 0
+
+        for frame_start, frame_sections in frames:
+            frame_end = frame_start
+            for category, name, start, duration in frame_sections:
+                key = f"{category} {name}"
+                totals[category] = totals.get(category, 0) + duration
+                totals[key] = totals.get(key, 0) + duration
+                frame_end = max(frame_end, start + duration)
+            totals["frame"] += frame_end - frame_start
+            max_frame = max(max_frame, frame_end - frame_start)
+
+        summary = {key: 1000 * value / max(len(frames), 1) for key, value in totals.items()}
+        summary["max_frame"] = 1000 * max_frame
+        return summary
+
+    def dump_trace(path: str = None) -> str:
+        """Save the recorded frames as a Chrome trace file and return its path."""
+        if path is None:
+            path = TRACE_PATH.format(time.strftime("%Y%m%d_%H%M%S"))
+        logger.info(f"Dumping {len(frames)} profiled frames to {path}")
+
+        events = []
+        for index, (frame_start, frame_sections) in enumerate(frames):
+            frame_end = max([start + duration for _, _, start, duration in frame_sections],
+                            default=frame_start)
+            events.append(_make_trace_event("frame", f"frame {index}", frame_start,
+                                            frame_end - frame_start, 0))
+            for category, name, start, duration in frame_sections:
+                events.append(_make_trace_event(category, name, start, duration, 1))
+
+        save_json({"traceEvents": events, "displayTimeUnit": "ms"}, path)
+        return path
+
+    def clear_frames() -> None:
+        nonlocal sections
+        frames.clear()
+        sections = None
+
+    return start_frame, add_section, get_frames, get_summary, dump_trace, clear_frames
+
+
+def _make_trace_event(category: str, name: str, start: float, duration: float,
+                      thread: int) -> dict:
+    """Return a Chrome trace complete event, times in microseconds."""
+    return {
+        "name": name,
+        "cat": category,
+        "ph": "X",
+        "ts": round(start * 1e6, 1),
+        "dur": round(duration * 1e6, 1),
+        "pid": 0,
+        "tid": thread,
+    }
+
+
+def format_summary(summary: dict[str, float]) -> str:
+    """Return a one line HUD text from get_summary(), slowest draw classes first."""
+    draws = sorted(
+        ((key[len("draw "):], value) for key, value in summary.items() if key.startswith("draw ")),
+        key=lambda item: item[1],
+        reverse=True,
+    )
+    return (
+        f"input {summary['input']:.2f}"
+        + f" | events {summary['event']:.2f}"
+        + f" | ticks {summary['tick']:.2f}"
+        + f" | draw {summary['draw']:.2f}"
+        + (" (" + ", ".join(f"{name} {value:.2f}" for name, value in draws[:3]) + ")"
+           if draws else "")
+        + f" | composite {summary['composite']:.2f}"
+        + f" | flush {summary['flush']:.2f}"
+        + f" | frame {summary['frame']:.2f} (max {summary['max_frame']:.2f}) ms"
+    )
+
+
+(
+    start_frame,
+    add_section,
+    get_frames,
+    get_summary,
+    dump_trace,
+    clear_frames,
+) = _make_profiler_manager()
+
+
+def _test():
+    """Check that sections are summarized and old frames dropped."""
+    for _ in range(PROFILER_FRAME_COUNT + 10):
+        start_frame()
+        add_section("draw", "Label", 0, 0.001)
+        add_section("draw", "Label", 0, 0.001)
+    assert len(get_frames()) == PROFILER_FRAME_COUNT
+    summary = get_summary()
+    assert round(summary["draw"], 6) == 2
+    assert round(summary["draw Label"], 6) == 2
+    assert "Label 2.00" in format_summary(summary)
+    clear_frames()
+    add_section("input", "getch", 0, 1)
+    assert not get_frames()
+    print("all Tests passed")
+
+
+if __name__ == "__main__":
+    _test()
@@ -18,6 +18,8 @@ from files import save_pickle, load_pickle
 logger = logging.getLogger(__name__)
 
 SETTINGS_PATH = "user_data\\settings.pkl"
+DEFAULT_TARGET_FPS = 60
+DEFAULT_ZONE_MEMORY_BUDGET = 32 * 1024 * 1024  # In bytes
 
 
 class Settings(NamedTuple):
@@ -26,9 +28,13 @@ class Settings(NamedTuple):
     Attributes:
         first_time (bool): Whether it is the user's first time running the app.
         language (int): The selected language (uses LANGUAGE_ENUM).
+        target_fps (int): Frame rate the game loop is paced to.
+        zone_memory_budget (int): Memory the recently visited zones can use, in bytes.
     """
     first_time: bool
     language: int
+    target_fps: int = DEFAULT_TARGET_FPS
+    zone_memory_budget: int = DEFAULT_ZONE_MEMORY_BUDGET
 
     @classmethod
     def new(cls) -> Settings:
@@ -36,6 +42,8 @@ class Settings(NamedTuple):
         return cls(
             first_time=True,
             language=LANGUAGE_ENUM.ENGLISH,
+            target_fps=DEFAULT_TARGET_FPS,
+            zone_memory_budget=DEFAULT_ZONE_MEMORY_BUDGET,
         )
 
 
@@ -0,0 +1,161 @@
+"""Periodic animation of the tiles of a world.Grid, like water and tall grass.
+
+Each animated tile has a few frames in a directory of text files named after
+the tile and the frame number, "water_0.txt", "water_1.txt"... Frames are
+split into rows once when loaded, and every TILE_ANIMATION_TIME the animated
+tiles of the grid's window are patched with their next frame through
+Grid.patch_tiles(), so a step costs as much as the animated tiles on screen,
+whatever the size of the zone. Tiles are a frame apart from their
+neighbours, so water ripples instead of blinking.
+
+Contributors:
+    Romain
+"""
+
+from __future__ import annotations
+import logging
+from typing import Callable, Iterable
+from world import TILE_HEIGHT, TILE_WIDTH, Grid
+
+logger = logging.getLogger(__name__)
+
+TILE_ANIMATION_TIME = 0.5  # Time between two frames of animated tiles (in seconds)
+
+
+def _make_tile_animator() -> tuple[Callable, ...]:
+    """Creates functions to animate the tiles of the grid window.
+
+    The frame and the window sprite last drawn are kept, a step only patches
+    the window when the frame changed or the window sprite was built again.
+    """
+    animations = {}  # char: tuple of frames, each a tuple of TILE_HEIGHT rows
+    last_frame = None
+    last_sprite = None
+    patched_tiles = 0
+
+    def set_animation(char: str, frames: Iterable[str]) -> None:
+        """Animate the tiles of char with frames, sprites the size of a tile."""
+        nonlocal last_frame
+        frames = tuple(tuple(frame.split("\n")) for frame in frames)
+        for rows in frames:
+            if len(rows) != TILE_HEIGHT or any(len(row) != TILE_WIDTH for row in rows):
+                raise ValueError(f"Frame of tile {char!r} isn't {TILE_HEIGHT}x{TILE_WIDTH}")
+        if frames:
+            animations[char] = frames
+        else:
+            animations.pop(char, None)
+        last_frame = None
+
+    def load_animations(frame_sprites: dict[str, str], tile_name_to_char: dict[str, str]) -> None:
+        """Animate tiles with frame sprites named "<tile name>_<frame number>"."""
+        frames = {}
+        for name, sprite in frame_sprites.items():
+            tile_name, _, number = name.rpartition("_")
+            if tile_name not in tile_name_to_char or not number.isdigit():
+                logger.warning(f"Unknown tile animation frame: {name}")
+                continue
+            frames.setdefault(tile_name_to_char[tile_name], {})[int(number)] = sprite
+
+        for char, sprites in frames.items():
+            set_animation(char, [sprites[number] for number in sorted(sprites)])
+
+    def animate_tiles(grid: Grid, now: float, is_visible: Callable = None) -> Grid:
+        """Return grid showing the frame of time now on its visible animated tiles.
+
+        is_visible(y, x) tells which tiles are seen, all of them if None, see fov.
+        """
+        nonlocal last_frame, last_sprite, patched_tiles
+        frame = int(now / TILE_ANIMATION_TIME)
+        sprite = grid.sprite_renderer.sprite
+        if not animations or sprite is None or (frame == last_frame and sprite is last_sprite):
+            return grid
+
+        top, left, bottom, right = grid.window
+        tiles = []
+        for y in range(top, bottom):
+            row = grid.tilemap[y]
+            for x in range(left, right):
+                frames = animations.get(row[x])
+                if frames is not None and (is_visible is None or is_visible(y, x)):
+                    tiles.append((y, x, frames[(frame + y + x) % len(frames)]))
+
+        grid = grid.patch_tiles(tiles)
+        last_frame = frame
+        last_sprite = grid.sprite_renderer.sprite
+        patched_tiles += len(tiles)
+        return grid
+
+    def get_next_frame_time(now: float) -> float:
+        """Return the time the frame following the one of time now starts."""
+        return (int(now / TILE_ANIMATION_TIME) + 1) * TILE_ANIMATION_TIME
+
+    def get_patched_tiles() -> int:
+        """Return the number of tiles patched since the last clear."""
+        return patched_tiles
+
+    def clear_animations() -> None:
+        nonlocal last_frame, last_sprite, patched_tiles
+        animations.clear()
+        last_frame = None
+        last_sprite = None
+        patched_tiles = 0
+
+    return (
+        set_animation,
+        load_animations,
+        animate_tiles,
+        get_next_frame_time,
+        get_patched_tiles,
+        clear_animations,
+    )
+
+
+(
+    set_tile_animation,
+    load_tile_animations,
+    animate_tiles,
+    get_next_tile_frame_time,
+    get_patched_tile_count,
+    clear_tile_animations,
+) = _make_tile_animator()
+
+
+def _test():
+    """Open a door in a wall and animate water, then check only those tiles were redrawn."""
+    import cuinter
+    from enums import BACKEND_TYPES
+    cuinter.setup(BACKEND_TYPES.HEADLESS, height=16, width=64)
+    tileset = {
+        " ": "\n".join(["." * TILE_WIDTH] * TILE_HEIGHT),
+        "║": "\n".join(["#" * TILE_WIDTH] * TILE_HEIGHT),
+        "≈": "\n".join(["~" * TILE_WIDTH] * TILE_HEIGHT),
+    }
+    grid = Grid.new(tileset, ("  ║≈", "  ║≈"))
+    cuinter.update()
+    assert not grid.is_walkable(0, 2)
+
+    grid = grid.set_tile(0, 2, " ")
+    assert grid.tilemap[0] == "   ≈" and grid.is_walkable(0, 2)
+    assert cuinter.get_dirty_layers() == [] and cuinter.pop_patched_rows() == set(range(8))
+    grid = grid.set_tile(0, 2, "║")
+    assert cuinter.has_patched_rows() and cuinter.get_input_timeout() != -1
+    cuinter.update()
+    assert not cuinter.has_patched_rows()
+    assert cuinter.get_buffer_row(0)[32:48] == "#" * TILE_WIDTH
+
+    frames = ["\n".join([str(frame) * TILE_WIDTH] * TILE_HEIGHT) for frame in range(2)]
+    set_tile_animation("≈", frames)
+    grid = animate_tiles(grid, 0)
+    assert animate_tiles(grid, TILE_ANIMATION_TIME / 2) is grid
+    assert get_patched_tile_count() == 2 and grid.tilemap[0][3] == "≈"
+    cuinter.update()
+    assert cuinter.get_buffer_row(0)[48:] == "1" * TILE_WIDTH
+    assert cuinter.get_buffer_row(8)[48:] == "0" * TILE_WIDTH
+    assert get_next_tile_frame_time(TILE_ANIMATION_TIME / 2) == TILE_ANIMATION_TIME
+
+    clear_tile_animations()
+    print("all Tests passed")
+
+
+if __name__ == "__main__":
+    _test()
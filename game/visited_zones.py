@@ -0,0 +1,152 @@
+"""In-memory cache of the zones the player recently left.
+
+A visited zone is the Grid and the entity store of the world objects of a
+zone as they were when the player left it, so coming back reuses them as
+they are instead of compiling the zone and building its world objects
+again, and keeps their state: walkability overrides, moved or removed objects. NPCs are kept apart,
+by npcs.store_zone().
+
+Zones are evicted least recently used first once their estimated size goes
+over the memory budget, see Settings.zone_memory_budget.
+
+Contributors:
+    Romain
+"""
+
+from __future__ import annotations
+from collections import OrderedDict
+import logging
+import sys
+from typing import Callable, NamedTuple
+from common import CacheStats
+from entities import EntityStore
+from world import Grid
+
+logger = logging.getLogger(__name__)
+
+WORLD_OBJECT_SIZE = 256  # Estimated size of the components of a world object, in bytes
+
+
+class VisitedZone(NamedTuple):
+    """A zone as the player left it.
+
+    Attributes:
+        grid (Grid): The zone's grid, tilemap, collision map and sprite rows included.
+        world_objects (EntityStore): The zone's world objects, NPCs excluded.
+        size (int): Estimated memory used by the zone, in bytes.
+    """
+    grid: Grid
+    world_objects: EntityStore
+    size: int
+
+    @classmethod
+    def new(cls, grid: Grid, world_objects: EntityStore) -> VisitedZone:
+        return cls(grid, world_objects, estimate_zone_size(grid, world_objects))
+
+
+def estimate_zone_size(grid: Grid, world_objects: EntityStore) -> int:
+    """Return an estimate of the memory used by a grid and its world objects, in bytes.
+
+    Only the sprites, tilemap and collision map are measured, which is most of it.
+    """
+    size = sum(sys.getsizeof(row) for row in grid.tilemap)
+    size += sum(sys.getsizeof(row) for row in grid.sprite_rows or ())
+    size += sys.getsizeof(grid.sprite_renderer.sprite)
+    if grid.collision_map is not None:
+        size += sys.getsizeof(grid.collision_map.cells) + sys.getsizeof(grid.collision_map.base)
+    return size + WORLD_OBJECT_SIZE * world_objects.entity_count
+
+
+def _make_visited_zone_manager() -> tuple[Callable, ...]:
+    """Creates functions to keep visited zones in an LRU cache within a memory budget."""
+    cache = OrderedDict()  # zone_path: VisitedZone
+    memory = 0  # Sum of the sizes of the cached zones
+    hits = 0
+    misses = 0
+    evictions = 0
+
+    def get_item(zone_path: str) -> VisitedZone | None:
+        """Return the zone at zone_path as it was left, None if it isn't cached."""
+        nonlocal hits, misses
+        visited_zone = cache.get(zone_path)
+        if visited_zone is None:
+            misses += 1
+            return None
+
+        hits += 1
+        cache.move_to_end(zone_path)
+        return visited_zone
+
+    def add_item(zone_path: str, grid: Grid, world_objects: EntityStore,
+                 memory_budget: int) -> None:
+        """Keep the zone at zone_path as it is being left, evicting the oldest ones over memory_budget."""
+        nonlocal memory, evictions
+        if zone_path in cache:
+            memory -= cache.pop(zone_path).size
+
+        visited_zone = VisitedZone.new(grid, world_objects)
+        cache[zone_path] = visited_zone
+        memory += visited_zone.size
+        while cache and memory > memory_budget:
+            evicted_path, evicted_zone = cache.popitem(last=False)
+            logger.debug(f"Evicting visited zone: {evicted_path}")
+            memory -= evicted_zone.size
+            evictions += 1
+
+    def get_memory() -> int:
+        """Return the estimated memory used by the cached zones, in bytes."""
+        return memory
+
+    def get_stats() -> CacheStats:
+        return CacheStats(hits, misses, evictions, len(cache))
+
+    def clear_cache() -> None:
+        nonlocal memory, hits, misses, evictions
+        cache.clear()
+        memory = 0
+        hits = 0
+        misses = 0
+        evictions = 0
+
+    return get_item, add_item, get_memory, get_stats, clear_cache
+
+
+(
+    get_visited_zone,
+    add_visited_zone,
+    get_visited_zone_memory,
+    get_visited_zone_stats,
+    clear_visited_zones,
+) = _make_visited_zone_manager()
+
+
+def _test():
+    """Leave three zones and check the oldest one is evicted over budget."""
+    import cuinter
+    from enums import BACKEND_TYPES
+    cuinter.setup(BACKEND_TYPES.HEADLESS)
+    tileset = {" ": "\n".join(["ab"] * 8)}
+    grids = [Grid.new(tileset, (" " * (10 + i),) * 10) for i in range(3)]
+    store = EntityStore.new()
+    budget = estimate_zone_size(grids[0], store) * 2 + estimate_zone_size(grids[1], store)
+
+    grids[0].collision_map.set_override(0, 0, False)
+    store.add_entity(0, 0)
+    add_visited_zone("zone_0", grids[0], store, budget)
+    visited_zone = get_visited_zone("zone_0")
+    assert visited_zone.grid is grids[0] and not visited_zone.grid.is_walkable(0, 0)
+    assert visited_zone.world_objects.get_entities_at(0, 0) == [0]
+
+    add_visited_zone("zone_1", grids[1], EntityStore.new(), budget)
+    add_visited_zone("zone_2", grids[2], EntityStore.new(), budget)
+    assert get_visited_zone("zone_0") is None
+    assert get_visited_zone("zone_2").grid is grids[2]
+    assert get_visited_zone_stats() == CacheStats(2, 1, 1, 2)
+    assert get_visited_zone_memory() <= budget
+
+    clear_visited_zones()
+    print("all Tests passed")
+
+
+if __name__ == "__main__":
+    _test()
@@ -11,10 +11,11 @@ Contributors:
 
 from __future__ import annotations
 import logging
-from typing import NamedTuple
-from common import EnumObject
-from cuinter import SpriteRenderer
-from enums import WORLD_OBJECT_TYPES
+from collections import OrderedDict
+from typing import Callable, Iterable, NamedTuple
+from common import CacheStats, EnumObject
+from cuinter import SpriteRenderer, get_screen_height, get_screen_width, set_layer_origin
+from enums import RENDER_LAYERS, WORLD_OBJECT_TYPES
 from game_classes import Character
 
 logger = logging.getLogger(__name__)
@@ -37,133 +38,699 @@ TILE_NAME_TO_CHAR = {
     "wall_up_right": "╚",
     "wall_down_left": "╗",
     "wall_down_right": "╔",
+    "water": "≈",
 }
 WALKABLE_TILE_CHARS = " │─┘└┐┌"
+TILEMAP_CACHE_SIZE = 32  # Number of compiled tilemap sprites kept in memory
+LOD_TILE_BLOCKS = {  # Tile chars drawn as 2x1 blocks in zoomed-out views, the first char at scale 1
+    "X": "  ",
+    " ": "░░",
+    "/": "▒▒",
+    "│": "│░",
+    "─": "──",
+    "┘": "┘░",
+    "└": "└─",
+    "┐": "┐░",
+    "┌": "┌─",
+    "║": "║░",
+    "═": "══",
+    "╝": "╝░",
+    "╚": "╚═",
+    "╗": "╗░",
+    "╔": "╔═",
+    "≈": "≈≈",
+}
+LOD_SCALES = (1, 2)  # Characters per tile in zoomed-out views
+LOD_CACHE_SIZE = 8  # Number of zoomed-out tilemaps kept in memory
+
+
+def _make_tilemap_compiler() -> tuple[Callable, ...]:
+    """Creates functions to compile tilemaps into sprites.
+
+    Tilesets are split into rows of tile sprites once, and the
+    TILEMAP_CACHE_SIZE most recent sprites are memoized by tileset identity
+    and tilemap.
+    """
+    split_tilesets = {}  # id(tileset): (tileset, {char: rows})
+    cache = OrderedDict()  # (id(tileset), tilemap): (tileset, sprite)
+    hits = 0
+    misses = 0
+    evictions = 0
+
+    def split_tileset(tileset: dict[str, str]) -> dict[str, tuple[str, ...]]:
+        entry = split_tilesets.get(id(tileset))
+        if entry is None or entry[0] is not tileset:
+            entry = (tileset, {char: tuple(sprite.split("\n")) for char, sprite in tileset.items()})
+            split_tilesets[id(tileset)] = entry
+        return entry[1]
+
+    def compile_rows(tileset: dict[str, str], tilemap: tuple[str]) -> list[str]:
+        """Return the rows of the sprite of tilemap, without memoization."""
+        tile_rows = split_tileset(tileset)
+        rows = []
+        for row in tilemap:
+            rows.extend(map("".join, zip(*[tile_rows[char] for char in row])))
+        return rows
+
+    def compile_item(tileset: dict[str, str], tilemap: tuple[str]) -> str:
+        nonlocal hits, misses, evictions
+        key = (id(tileset), tilemap)
+        entry = cache.get(key)
+        # The id of a deleted tileset can be reused by a new one
+        if entry is not None and entry[0] is tileset:
+            hits += 1
+            cache.move_to_end(key)
+            return entry[1]
+
+        misses += 1
+        sprite = "\n".join(compile_rows(tileset, tilemap))
+        cache[key] = (tileset, sprite)
+        cache.move_to_end(key)
+        if len(cache) > TILEMAP_CACHE_SIZE:
+            cache.popitem(last=False)
+            evictions += 1
+        return sprite
+
+    def get_stats() -> CacheStats:
+        return CacheStats(hits, misses, evictions, len(cache))
+
+    def clear_cache() -> None:
+        nonlocal hits, misses, evictions
+        split_tilesets.clear()
+        cache.clear()
+        hits = 0
+        misses = 0
+        evictions = 0
+
+    return split_tileset, compile_rows, compile_item, get_stats, clear_cache
+
+
+def _make_lod_compiler() -> tuple[Callable, ...]:
+    """Creates functions to downsample tilemaps to a character or a 2x1 block per tile.
+
+    The LOD_CACHE_SIZE most recent zoomed-out tilemaps are memoized by
+    tilemap identity and scale. A tilemap changed by Grid.set_tiles() takes
+    over the zoomed-out rows of the old one, patched on the changed tiles.
+    Chars missing from LOD_TILE_BLOCKS are repeated scale times.
+    """
+    tables = {scale: str.maketrans({char: block[:scale] for char, block in LOD_TILE_BLOCKS.items()})
+              for scale in LOD_SCALES}
+    cache = OrderedDict()  # (id(tilemap), scale): (tilemap, rows)
+    hits = 0
+    misses = 0
+    evictions = 0
+
+    def get_block(char: str, scale: int) -> str:
+        return LOD_TILE_BLOCKS.get(char, char * scale)[:scale]
+
+    def compile_row(row: str, scale: int) -> str:
+        lod_row = row.translate(tables[scale])
+        if len(lod_row) != len(row) * scale:
+            # Some chars aren't in the table and were kept as a single character
+            lod_row = "".join([get_block(char, scale) for char in row])
+        return lod_row
+
+    def compile_item(tilemap: tuple[str], scale: int = 1) -> tuple[str, ...]:
+        """Return the rows of tilemap with scale characters per tile."""
+        nonlocal hits, misses, evictions
+        key = (id(tilemap), scale)
+        entry = cache.get(key)
+        if entry is not None and entry[0] is tilemap:
+            hits += 1
+            cache.move_to_end(key)
+            return entry[1]
+
+        misses += 1
+        rows = tuple(compile_row(row, scale) for row in tilemap)
+        cache[key] = (tilemap, rows)
+        if len(cache) > LOD_CACHE_SIZE:
+            cache.popitem(last=False)
+            evictions += 1
+        return rows
+
+    def patch_item(tilemap: tuple[str], new_tilemap: tuple[str],
+                   tiles: Iterable[tuple[int, int, str]]) -> None:
+        """Move the zoomed-out rows of tilemap to new_tilemap, the same but for tiles."""
+        tiles = list(tiles)
+        for scale in LOD_SCALES:
+            entry = cache.pop((id(tilemap), scale), None)
+            if entry is None or entry[0] is not tilemap:
+                continue
+
+            rows = list(entry[1])
+            for y, x, char in tiles:
+                block = get_block(char, scale)
+                rows[y] = rows[y][:x * scale] + block + rows[y][(x + 1) * scale:]
+            cache[id(new_tilemap), scale] = (new_tilemap, tuple(rows))
+
+    def get_stats() -> CacheStats:
+        return CacheStats(hits, misses, evictions, len(cache))
+
+    def clear_cache() -> None:
+        nonlocal hits, misses, evictions
+        cache.clear()
+        hits = 0
+        misses = 0
+        evictions = 0
+
+    return compile_item, patch_item, get_stats, clear_cache
+
+
+def tilemap_to_walkability(tilemap: tuple[str]) -> tuple[bytes, ...]:
+    """Return 1 for each walkable tile of tilemap, row after row."""
+    return tuple(bytes(char in WALKABLE_TILE_CHARS for char in row) for row in tilemap)
+
+
+class CollisionMap(NamedTuple):
+    """Walkability of every tile of a tilemap, compiled into a flat bytearray.
+
+    Overrides make tiles walkable or not regardless of the tilemap, such as
+    doors and blocked tiles. Listeners are called with the list of (y, x)
+    tiles whose walkability changed, so that caches built on top of the map
+    can be invalidated.
+
+    Attributes:
+        height (int): Number of rows of tiles.
+        width (int): Number of columns of tiles.
+        cells (bytearray): 1 for each walkable tile, row after row, overrides included.
+        base (bytearray): 1 for each walkable tile of the tilemap, without overrides.
+        overrides (dict[tuple[int, int], bool]): Walkability of overridden tiles.
+        listeners (list[Callable]): Called with the tiles whose walkability changed.
+    """
+    height: int
+    width: int
+    cells: bytearray
+    base: bytearray
+    overrides: dict[tuple[int, int], bool]
+    listeners: list[Callable]
+
+    @classmethod
+    def new(cls, tilemap: tuple[str], walkability: tuple[bytes, ...] = None) -> CollisionMap:
+        """Compile the walkability of tilemap, or use the precomputed rows of walkability."""
+        if walkability is None:
+            walkability = tilemap_to_walkability(tilemap)
+        base = bytearray(b"".join(walkability))
+        width = len(walkability[0]) if walkability else 0
+
+        return cls(
+            len(walkability),
+            width,
+            bytearray(base),
+            base,
+            {},
+            [],
+        )
+
+    def is_walkable(self, y: int, x: int) -> bool:
+        """Return whether the tile at (y, x) is walkable, False outside of the map."""
+        if not (0 <= y < self.height and 0 <= x < self.width):
+            return False
+        return self.cells[y * self.width + x] == 1
+
+    def are_walkable(self, positions: Iterable[tuple[int, int]]) -> list[bool]:
+        """Return whether each (y, x) tile of positions is walkable."""
+        cells = self.cells
+        height = self.height
+        width = self.width
+        return [
+            0 <= y < height and 0 <= x < width and cells[y * width + x] == 1
+            for y, x in positions
+        ]
+
+    def get_walkable_neighbours(self, y: int, x: int) -> list[tuple[int, int]]:
+        """Return the walkable tiles next to (y, x), diagonals excluded."""
+        cells = self.cells
+        width = self.width
+        neighbours = []
+        if y > 0 and cells[(y - 1) * width + x]:
+            neighbours.append((y - 1, x))
+        if y < self.height - 1 and cells[(y + 1) * width + x]:
+            neighbours.append((y + 1, x))
+        if x > 0 and cells[y * width + x - 1]:
+            neighbours.append((y, x - 1))
+        if x < width - 1 and cells[y * width + x + 1]:
+            neighbours.append((y, x + 1))
+        return neighbours
+
+    def get_row(self, y: int) -> bytes:
+        """Return the walkability of row y, overrides included."""
+        return bytes(self.cells[y * self.width:(y + 1) * self.width])
+
+    def count_walkable(self) -> int:
+        return self.cells.count(1)
+
+    def set_override(self, y: int, x: int, is_walkable: bool) -> None:
+        """Make the tile at (y, x) walkable or not, regardless of the tilemap."""
+        self.overrides[y, x] = is_walkable
+        self._set_cell(y, x, is_walkable)
+
+    def clear_override(self, y: int, x: int) -> None:
+        """Give the tile at (y, x) back the walkability of the tilemap."""
+        if self.overrides.pop((y, x), None) is not None:
+            self._set_cell(y, x, self.base[y * self.width + x] == 1)
+
+    def set_tile_walkability(self, y: int, x: int, is_walkable: bool) -> None:
+        """Change the walkability the tilemap gives the tile at (y, x), after the tile changed.
+
+        An override of the tile still applies.
+        """
+        self.base[y * self.width + x] = is_walkable
+        if (y, x) not in self.overrides:
+            self._set_cell(y, x, is_walkable)
+
+    def add_listener(self, listener: Callable) -> None:
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener: Callable) -> None:
+        self.listeners.remove(listener)
+
+    def _set_cell(self, y: int, x: int, is_walkable: bool) -> None:
+        offset = y * self.width + x
+        if self.cells[offset] == is_walkable:
+            return
+        self.cells[offset] = is_walkable
+        for listener in list(self.listeners):
+            listener([(y, x)])
+
+
+class Camera(NamedTuple):
+    """The part of the world shown on screen.
+
+    World coordinates are the screen coordinates the world would have if
+    the top-left tile of the grid was at the top-left of the screen.
+
+    Attributes:
+        y (int): World y coordinate of the top-left cell of the screen.
+        x (int): World x coordinate of the top-left cell of the screen.
+        height (int): Height of the view, usually the screen height.
+        width (int): Width of the view, usually the screen width.
+    """
+    y: int = 0
+    x: int = 0
+    height: int = 0
+    width: int = 0
+
+    @classmethod
+    def new(cls, height: int = 0, width: int = 0, y: int = 0, x: int = 0) -> Camera:
+        """Construct a new Camera of the given view size at world coordinates (y, x)."""
+        return cls(y, x, height, width)
+
+    def config(self, **kwargs) -> Camera:
+        """Return a new Camera with updated attributes."""
+        return Camera(
+            kwargs.get("y", self.y),
+            kwargs.get("x", self.x),
+            kwargs.get("height", self.height),
+            kwargs.get("width", self.width),
+        )
+
+    def apply(self) -> None:
+        """Scroll the WORLD and SPRITES layers of cuinter to the camera."""
+        set_layer_origin(RENDER_LAYERS.WORLD, self.y, self.x)
+        set_layer_origin(RENDER_LAYERS.SPRITES, self.y, self.x)
+
+    def follow(self, y: int, x: int, world_height: int, world_width: int) -> Camera:
+        """Return a new Camera centered on world coordinates (y, x).
+
+        The view stays within the world when the world is larger than it,
+        and the world is centered in the view otherwise.
+        """
+        def axis(position: int, size: int, world_size: int) -> int:
+            if world_size <= size:
+                return round((world_size - size) / 2)
+            return min(max(round(position - size / 2), 0), world_size - size)
+
+        return self.config(
+            y=axis(y, self.height, world_height),
+            x=axis(x, self.width, world_width),
+        )
+
+    def world_to_screen(self, y: int = None, x: int = None) -> int | tuple[int, int]:
+        """Convert world coordinates to screen coordinates."""
+        if y is not None and x is not None:
+            return y - self.y, x - self.x
+        if y is not None:
+            return y - self.y
+        if x is not None:
+            return x - self.x
+
+        raise ValueError("world_to_screen() requires at least one of y or x")
+
+    def screen_to_world(self, y: int = None, x: int = None) -> int | tuple[int, int]:
+        """Convert screen coordinates to world coordinates."""
+        if y is not None and x is not None:
+            return y + self.y, x + self.x
+        if y is not None:
+            return y + self.y
+        if x is not None:
+            return x + self.x
+
+        raise ValueError("screen_to_world() requires at least one of y or x")
 
 
 class Grid(NamedTuple):
     """Renders a grid of tiles and provides mapping between grid and screen coordinates.
 
+    Only the window of tiles intersecting the camera view is turned into a
+    sprite, drawn in world coordinates in the static WORLD layer of cuinter.
+    Moving the camera scrolls the layer, the sprite is only built again when
+    the window or the tilemap change. Changing a few tiles with set_tiles()
+    or animating them with patch_tiles() only redraws those tiles.
+
     Attributes:
-        sprite_renderer (SpriteRenderer): The renderer for the grid.
+        sprite_renderer (SpriteRenderer): The renderer for the visible window.
         tileset (dict[str, str]): Maps tile chars to their sprite strings.
         tilemap (tuple[str]): Each str is a row, and each char a tile.
+        camera (Camera): The part of the world shown on screen.
+        window (tuple[int, int, int, int]): Top, left, bottom and right
+            (exclusive) tiles of the rendered window.
+        collision_map (CollisionMap): Walkability of the tiles of the tilemap.
+        sprite_rows (tuple[str, ...]): Precompiled rows of the sprite of the
+            whole tilemap, None to compile the window from the tileset.
     """
     sprite_renderer: SpriteRenderer
     tileset: dict[str, str]
     tilemap: tuple[str]
+    camera: Camera = Camera()
+    window: tuple[int, int, int, int] = (0, 0, 0, 0)
+    collision_map: CollisionMap = None
+    sprite_rows: tuple[str, ...] = None
 
     @staticmethod
     def tilemap_to_sprite(tileset: dict[str, str], tilemap: tuple[str]) -> str:
         """Return a text sprite built from a tilemap.
 
-        Each char is replaced by its corresponding tile sprite given by the tileset.
+        Each char is replaced by its corresponding tile sprite given by the
+        tileset. Memoized, see tilemap_to_sprite() at module level.
         """
-        full_sprite = ""
-        for row in tilemap:
-            for sprite_y in range(TILE_HEIGHT):
-                for char in row:
-                    full_sprite += tileset[char].split("\n")[sprite_y]
-                if sprite_y != TILE_HEIGHT - 1 or row != tilemap[-1]:
-                    full_sprite += "\n"
-        return full_sprite
+        return tilemap_to_sprite(tileset, tilemap)
+
+    @staticmethod
+    def get_window(tilemap: tuple[str], camera: Camera) -> tuple[int, int, int, int]:
+        """Return the top, left, bottom and right (exclusive) tiles seen by camera."""
+        if not tilemap:
+            return 0, 0, 0, 0
+
+        top = min(max(camera.y // TILE_HEIGHT, 0), len(tilemap))
+        left = min(max(camera.x // TILE_WIDTH, 0), len(tilemap[0]))
+        bottom = min(max(-(-(camera.y + camera.height) // TILE_HEIGHT), top), len(tilemap))
+        right = min(max(-(-(camera.x + camera.width) // TILE_WIDTH), left), len(tilemap[0]))
+        return top, left, bottom, right
+
+    @staticmethod
+    def window_to_sprite(tileset: dict[str, str], tilemap: tuple[str],
+                         window: tuple[int, int, int, int],
+                         sprite_rows: tuple[str, ...] = None) -> str | None:
+        """Return the sprite of the tiles of tilemap in window, None if empty.
+
+        The sprite is cut from sprite_rows if the tilemap was precompiled.
+        """
+        top, left, bottom, right = window
+        if top == bottom or left == right:
+            return None
+        if sprite_rows is not None:
+            return "\n".join(
+                row[left * TILE_WIDTH:right * TILE_WIDTH]
+                for row in sprite_rows[top * TILE_HEIGHT:bottom * TILE_HEIGHT]
+            )
+        return Grid.tilemap_to_sprite(tileset, tuple(row[left:right] for row in tilemap[top:bottom]))
 
     @property
     def y(self) -> int:
-        """Top-left screen y coordinate of the grid."""
-        return self.sprite_renderer.y
+        """Screen y coordinate of the top-left tile of the grid."""
+        return self.grid_to_screen(y=0)
 
     @property
     def x(self) -> int:
-        """Top-left screen x coordinate of the grid."""
-        return self.sprite_renderer.x
+        """Screen x coordinate of the top-left tile of the grid."""
+        return self.grid_to_screen(x=0)
+
+    @property
+    def height(self) -> int:
+        """Height of the whole grid in world coordinates."""
+        return len(self.tilemap) * TILE_HEIGHT if self.tilemap else 0
+
+    @property
+    def width(self) -> int:
+        """Width of the whole grid in world coordinates."""
+        return len(self.tilemap[0]) * TILE_WIDTH if self.tilemap else 0
 
     @classmethod
     def new(cls, tileset: dict[str, str], tilemap: tuple[str] = None,
-            y: int = 0, x: int = 0) -> Grid:
-        """Construct a new Grid at given coordinates, optionally with tilemap."""
+            y: int = 0, x: int = 0, camera: Camera = None,
+            walkability: tuple[bytes, ...] = None,
+            sprite_rows: tuple[str, ...] = None) -> Grid:
+        """Construct a new Grid, optionally with tilemap.
+
+        The grid is seen through camera, or placed at screen coordinates
+        (y, x) by a camera of the screen size if none is given, which isn't
+        applied to the render layers (see Camera.apply()). Its collision map
+        is compiled from walkability rows if given, from the tilemap otherwise.
+        """
         logger.debug("Creating new Grid")
 
+        if camera is None:
+            camera = Camera.new(get_screen_height(), get_screen_width(), -y, -x)
+
         if tilemap is not None and tileset is not None:
-            sprite = Grid.tilemap_to_sprite(tileset, tilemap)
+            window = Grid.get_window(tilemap, camera)
+            sprite = Grid.window_to_sprite(tileset, tilemap, window, sprite_rows)
         else:
+            window = (0, 0, 0, 0)
             sprite = None
 
+        collision_map = None if tilemap is None else CollisionMap.new(tilemap, walkability)
+
         return cls(
             SpriteRenderer.new(
-                y,
-                x,
+                window[0] * TILE_HEIGHT,
+                window[1] * TILE_WIDTH,
                 sprite,
+                layer=RENDER_LAYERS.WORLD,
             ),
             tileset,
             tilemap,
+            camera,
+            window,
+            collision_map,
+            sprite_rows,
         )
 
     def config(self, **kwargs) -> Grid:
-        """Return a new Grid with updated attributes."""
+        """Return a new Grid with updated attributes.
+
+        The collision map is compiled again when the tilemap changes, from
+        walkability rows if given. The sprite rows are dropped when the
+        tilemap or the tileset change without new ones.
+        """
         tileset = kwargs.get("tileset", self.tileset)
         tilemap = kwargs.get("tilemap", self.tilemap)
+        camera = kwargs.get("camera", self.camera)
+        if "collision_map" in kwargs:
+            collision_map = kwargs["collision_map"]
+        elif tilemap is not self.tilemap or "walkability" in kwargs:
+            collision_map = CollisionMap.new(tilemap, kwargs.get("walkability"))
+        else:
+            collision_map = self.collision_map
+        sprite_rows = kwargs.get(
+            "sprite_rows",
+            self.sprite_rows if tilemap is self.tilemap and tileset is self.tileset else None,
+        )
 
-        if tilemap is not self.tilemap or tileset is not self.tileset:
-            sprite = Grid.tilemap_to_sprite(tileset, tilemap)
+        window = Grid.get_window(tilemap, camera)
+        if (tilemap is not self.tilemap or tileset is not self.tileset
+        or window != self.window):
+            sprite = Grid.window_to_sprite(tileset, tilemap, window, sprite_rows)
         else:
             sprite = self.sprite_renderer.sprite
 
         return Grid(
-            self.sprite_renderer.config(sprite=sprite, **kwargs),
+            self.sprite_renderer.config(
+                y=window[0] * TILE_HEIGHT,
+                x=window[1] * TILE_WIDTH,
+                sprite=sprite,
+            ),
             tileset,
             tilemap,
+            camera,
+            window,
+            collision_map,
+            sprite_rows,
         )
 
-    def load_tilemap(self, tilemap: tuple[str]) -> Grid:
-        """Replace the grid's tilemap and update its sprite."""
+    def load_tilemap(self, tilemap: tuple[str], walkability: tuple[bytes, ...] = None,
+                     sprite_rows: tuple[str, ...] = None) -> Grid:
+        """Replace the grid's tilemap, walkability and sprite rows and update its sprite."""
         logger.debug("Loading tilemap")
-        return self.config(tilemap=tilemap)
+        return self.config(tilemap=tilemap, walkability=walkability, sprite_rows=sprite_rows)
 
-    def center(self, screen_height: int, screen_width: int) -> Grid:
-        """Return a new Grid centered on the screen."""
-        return self.config(
-            y=round((screen_height - len(self.tilemap) * TILE_HEIGHT) / 2),
-            x=round((screen_width - len(self.tilemap[0]) * TILE_WIDTH) / 2),
+    def set_tile(self, y: int, x: int, char: str) -> Grid:
+        """Return a new Grid with the tile at (y, x) replaced by char, see set_tiles()."""
+        return self.set_tiles([(y, x, char)])
+
+    def set_tiles(self, tiles: Iterable[tuple[int, int, str]]) -> Grid:
+        """Return a new Grid with the tile at each (y, x, char) of tiles replaced by char.
+
+        Unlike config(tilemap=...), nothing is compiled again but the changed
+        tiles: their row of the tilemap, their rows of the sprite rows and of
+        the window sprite, their cells of the WORLD layer and of the collision
+        map, and of the cached zoomed-out rows.
+
+        The collision map is updated in place rather than copied, so caches
+        built on it are invalidated tile by tile through its listeners. The
+        new Grid shares it with this one, which must not be used for
+        walkability afterwards: the Grid returned replaces it.
+        """
+        tile_rows = get_tile_rows(self.tileset)
+        tilemap = list(self.tilemap)
+        sprite_rows = None if self.sprite_rows is None else list(self.sprite_rows)
+        patches = []
+        changed_tiles = []
+
+        for y, x, char in tiles:
+            if not (0 <= y < len(tilemap) and 0 <= x < len(tilemap[0])):
+                raise IndexError(f"Tile out of the grid: {(y, x)}")
+            if tilemap[y][x] == char:
+                continue
+
+            tilemap[y] = tilemap[y][:x] + char + tilemap[y][x + 1:]
+            rows = tile_rows[char]
+            if sprite_rows is not None:
+                left = x * TILE_WIDTH
+                for sprite_y, row in enumerate(rows, y * TILE_HEIGHT):
+                    sprite_row = sprite_rows[sprite_y]
+                    sprite_rows[sprite_y] = sprite_row[:left] + row + sprite_row[left + TILE_WIDTH:]
+            if self.collision_map is not None:
+                self.collision_map.set_tile_walkability(y, x, char in WALKABLE_TILE_CHARS)
+            patches.append((y, x, rows))
+            changed_tiles.append((y, x, char))
+
+        if not patches:
+            return self
+
+        tilemap = tuple(tilemap)
+        patch_lod_rows(self.tilemap, tilemap, changed_tiles)
+        return Grid(
+            self._patch_window(patches),
+            self.tileset,
+            tilemap,
+            self.camera,
+            self.window,
+            self.collision_map,
+            None if sprite_rows is None else tuple(sprite_rows),
+        )
+
+    def patch_tiles(self, tiles: Iterable[tuple[int, int, tuple[str, ...]]]) -> Grid:
+        """Return a new Grid showing each (y, x, rows) of tiles as the tile sprite rows.
+
+        Only the window sprite changes, the tilemap doesn't, so tiles can be
+        animated with precompiled frames. Tiles out of the window are
+        skipped, they are shown as in the tileset once the window moves.
+        """
+        sprite_renderer = self._patch_window(tiles)
+        if sprite_renderer is self.sprite_renderer:
+            return self
+        return Grid(
+            sprite_renderer,
+            self.tileset,
+            self.tilemap,
+            self.camera,
+            self.window,
+            self.collision_map,
+            self.sprite_rows,
         )
 
+    def _patch_window(self, tiles: Iterable[tuple[int, int, tuple[str, ...]]]) -> SpriteRenderer:
+        """Write each (y, x, rows) of tiles in the window sprite, redrawing only them."""
+        top, left, bottom, right = self.window
+        patches = [
+            ((y - top) * TILE_HEIGHT, (x - left) * TILE_WIDTH, rows)
+            for y, x, rows in tiles
+            if top <= y < bottom and left <= x < right
+        ]
+        if not patches:
+            return self.sprite_renderer
+
+        sprite_rows = self.sprite_renderer.sprite.split("\n")
+        for y, x, rows in patches:
+            for sprite_y, row in enumerate(rows, y):
+                sprite_row = sprite_rows[sprite_y]
+                sprite_rows[sprite_y] = sprite_row[:x] + row + sprite_row[x + len(row):]
+        return self.sprite_renderer.patch("\n".join(sprite_rows), patches)
+
+    def get_lod_rows(self, scale: int = 1) -> tuple[str, ...]:
+        """Return the tilemap zoomed out to scale characters per tile, see LOD_TILE_BLOCKS."""
+        return tilemap_to_lod_rows(self.tilemap or (), scale)
+
+    def center(self, screen_height: int, screen_width: int) -> Grid:
+        """Return a new Grid whose camera, resized to the screen, shows the middle of the grid."""
+        camera = self.camera.config(height=screen_height, width=screen_width)
+        return self.config(camera=camera.follow(
+            self.height / 2,
+            self.width / 2,
+            self.height,
+            self.width,
+        ))
+
+    def follow(self, grid_y: int, grid_x: int) -> Grid:
+        """Return a new Grid whose camera is centered on the tile at (grid_y, grid_x)."""
+        world_y, world_x = self.grid_to_world(grid_y, grid_x)
+        return self.config(camera=self.camera.follow(
+            world_y + TILE_HEIGHT / 2,
+            world_x + TILE_WIDTH / 2,
+            self.height,
+            self.width,
+        ))
+
+    def grid_to_world(self, y: int = None, x: int = None) -> int | tuple[int, int]:
+        """Convert tile-grid coordinates to world coordinates."""
+        if y is not None and x is not None:
+            return TILE_HEIGHT * y, TILE_WIDTH * x
+        if y is not None:
+            return TILE_HEIGHT * y
+        if x is not None:
+            return TILE_WIDTH * x
+
+        raise ValueError("grid_to_world() requires at least one of y or x")
+
     def grid_to_screen(self, y: int = None, x: int = None) -> int | tuple[int, int]:
-        """Convert tile-grid coordinates to screen coordinates."""
+        """Convert tile-grid coordinates to screen coordinates, through the camera."""
         if y is not None and x is not None:
-            return (
-                self.y + TILE_HEIGHT * y,
-                self.x + TILE_WIDTH * x,
-            )
+            return self.camera.world_to_screen(*self.grid_to_world(y, x))
         if y is not None:
-            return self.y + TILE_HEIGHT * y
+            return self.camera.world_to_screen(y=self.grid_to_world(y=y))
         if x is not None:
-            return self.x + TILE_WIDTH * x
+            return self.camera.world_to_screen(x=self.grid_to_world(x=x))
 
         raise ValueError("grid_to_screen() requires at least one of y or x")
 
     def screen_to_grid(self, y: int = None, x: int = None) -> int | tuple[int, int]:
-        """Convert screen coordinates to grid (tile) coordinates."""
+        """Convert screen coordinates to grid (tile) coordinates, through the camera."""
         if y is not None and x is not None:
             return (
-                round((y - self.y) / TILE_HEIGHT),
-                round((x - self.x) / TILE_WIDTH),
+                round(self.camera.screen_to_world(y=y) / TILE_HEIGHT),
+                round(self.camera.screen_to_world(x=x) / TILE_WIDTH),
             )
         if y is not None:
-            return round((y - self.y) / TILE_HEIGHT)
+            return round(self.camera.screen_to_world(y=y) / TILE_HEIGHT)
         if x is not None:
-            return round((x - self.x) / TILE_WIDTH)
+            return round(self.camera.screen_to_world(x=x) / TILE_WIDTH)
 
         raise ValueError("screen_to_grid() requires at least one of y or x")
 
     def is_walkable(self, y: int, x: int) -> bool:
         """Return whether the tile at (y, x) is walkable."""
-        if not (0 <= y < len(self.tilemap) and 0 <= x < len(self.tilemap[y])):
+        if self.collision_map is None:
             return False
-        return self.tilemap[y][x] in WALKABLE_TILE_CHARS
+        return self.collision_map.is_walkable(y, x)
 
 
 class GridSprite(NamedTuple):
-    """A sprite placed at a specific grid position."""
+    """A sprite placed at a specific grid position.
+
+    The sprite is drawn in world coordinates in the SPRITES layer, which the
+    grid's camera scrolls, so it does not move when the camera does.
+    """
 
     sprite_renderer: SpriteRenderer
     grid: Grid
@@ -172,13 +739,13 @@ class GridSprite(NamedTuple):
 
     @property
     def y_offset(self) -> int:
-        """Difference between sprite y and grid y in screen coordinates."""
-        return self.sprite_renderer.y - self.grid.grid_to_screen(y=self.grid_y)
+        """Difference between sprite y and grid y in world coordinates."""
+        return self.sprite_renderer.y - self.grid.grid_to_world(y=self.grid_y)
 
     @property
     def x_offset(self) -> int:
-        """Difference between sprite x and grid x in screen coordinates."""
-        return self.sprite_renderer.x - self.grid.grid_to_screen(x=self.grid_x)
+        """Difference between sprite x and grid x in world coordinates."""
+        return self.sprite_renderer.x - self.grid.grid_to_world(x=self.grid_x)
 
     @classmethod
     def new(cls, grid: Grid, grid_y: int, grid_x: int, sprite: str = None, y_offset: int = 0,
@@ -188,8 +755,8 @@ class GridSprite(NamedTuple):
 
         return cls(
             SpriteRenderer.new(
-                grid.grid_to_screen(y=grid_y) + y_offset,
-                grid.grid_to_screen(x=grid_x) + x_offset,
+                grid.grid_to_world(y=grid_y) + y_offset,
+                grid.grid_to_world(x=grid_x) + x_offset,
                 sprite,
             ),
             grid,
@@ -207,8 +774,8 @@ class GridSprite(NamedTuple):
 
         return GridSprite(
             self.sprite_renderer.config(
-                y=grid.grid_to_screen(y=grid_y) + y_offset,
-                x=grid.grid_to_screen(x=grid_x) + x_offset,
+                y=grid.grid_to_world(y=grid_y) + y_offset,
+                x=grid.grid_to_world(x=grid_x) + x_offset,
                 **kwargs,
             ),
             grid,
@@ -216,6 +783,10 @@ class GridSprite(NamedTuple):
             grid_x,
         )
 
+    def delete(self) -> None:
+        """Remove the sprite from cuinter's active UI elements."""
+        self.sprite_renderer.delete()
+
 
 class GridMultiSprite(NamedTuple):
     """A grid sprite that can switch between multiple sprites (via a sprite_sheet)."""
@@ -281,6 +852,10 @@ class GridMultiSprite(NamedTuple):
             sprite_key,
         )
 
+    def delete(self) -> None:
+        """Remove the sprite from cuinter's active UI elements."""
+        self.grid_sprite.delete()
+
 
 class WorldCharacter(NamedTuple):
     """A game character positioned on the grid, with associated sprite."""
@@ -346,6 +921,83 @@ class WorldCharacter(NamedTuple):
             return self
         return self.config(grid_y=new_grid_y, grid_x=new_grid_x)
 
+    def delete(self) -> None:
+        """Remove the character's sprite from cuinter's active UI elements."""
+        self.grid_multi_sprite.delete()
+
+
+class NPC(NamedTuple):
+    """A WorldCharacter moved around by the NPC tick system (see npcs.py).
+
+    NPCs either walk along a route in a loop, or wander around their home tile.
+
+    Attributes:
+        world_character (WorldCharacter): The character and its sprite.
+        home_y (int): Grid y of the tile the NPC wanders around.
+        home_x (int): Grid x of the tile the NPC wanders around.
+        route (tuple[tuple[int, int], ...]): (grid_y, grid_x) tiles walked on
+            in a loop, each next to the previous one, empty to wander instead.
+        route_index (int): Index in route of the tile the NPC is on.
+        wander_radius (int): Maximum distance from home in tiles when wandering,
+            0 to stay still.
+    """
+    world_character: WorldCharacter
+    home_y: int
+    home_x: int
+    route: tuple[tuple[int, int], ...] = ()
+    route_index: int = 0
+    wander_radius: int = 0
+
+    @property
+    def grid(self) -> Grid:
+        return self.world_character.grid
+
+    @property
+    def grid_y(self) -> int:
+        return self.world_character.grid_y
+
+    @property
+    def grid_x(self) -> int:
+        return self.world_character.grid_x
+
+    @classmethod
+    def new(cls, grid: Grid, grid_y: int, grid_x: int, character: Character,
+            route: tuple[tuple[int, int], ...] = (), wander_radius: int = 0,
+            sprite_key: str = None, y_offset: int = 0, x_offset: int = 0) -> NPC:
+        """Create an NPC whose home is at a grid position, starting on its route if it has one."""
+        start_y, start_x = route[0] if route else (grid_y, grid_x)
+
+        return cls(
+            WorldCharacter.new(grid, start_y, start_x, character, sprite_key, y_offset, x_offset),
+            grid_y,
+            grid_x,
+            tuple(route),
+            0,
+            wander_radius,
+        )
+
+    def config(self, **kwargs) -> NPC:
+        """Return a new NPC with updated attributes, the others being passed to its WorldCharacter."""
+        world_character_kwargs = {
+            key: value for key, value in kwargs.items() if key not in self._fields
+        }
+        world_character = kwargs.get("world_character", self.world_character)
+        if world_character_kwargs:
+            world_character = world_character.config(**world_character_kwargs)
+
+        return NPC(
+            world_character,
+            kwargs.get("home_y", self.home_y),
+            kwargs.get("home_x", self.home_x),
+            kwargs.get("route", self.route),
+            kwargs.get("route_index", self.route_index),
+            kwargs.get("wander_radius", self.wander_radius),
+        )
+
+    def delete(self) -> None:
+        """Remove the NPC's sprite from cuinter's active UI elements."""
+        self.world_character.delete()
+
 
 class WalkTrigger(NamedTuple):
     """Defines an event that triggers when a grid location is entered."""
@@ -385,9 +1037,24 @@ class WalkTrigger(NamedTuple):
         return self.on_trigger_event
 
 
+(
+    get_tile_rows,
+    tilemap_to_rows,
+    tilemap_to_sprite,
+    get_tilemap_cache_stats,
+    clear_tilemap_cache,
+) = _make_tilemap_compiler()
+(
+    tilemap_to_lod_rows,
+    patch_lod_rows,
+    get_lod_cache_stats,
+    clear_lod_cache,
+) = _make_lod_compiler()
+
 WORLD_OBJECT_CLASSES = {
     WORLD_OBJECT_TYPES.GRID_SPRITE: GridSprite,
     WORLD_OBJECT_TYPES.GRID_MULTI_SPRITE: GridMultiSprite,
     WORLD_OBJECT_TYPES.WORLD_CHARACTER: WorldCharacter,
     WORLD_OBJECT_TYPES.WALK_TRIGGER: WalkTrigger,
+    WORLD_OBJECT_TYPES.NPC: NPC,
 }
@@ -0,0 +1,247 @@
+"""Persistent on-disk cache of compiled zones.
+
+A compiled zone holds what load_zone needs ready to use: the sprite rows of
+the whole tilemap, its walkability and an index of prebuilt WalkTriggers.
+Entries are keyed by a hash of ZONE_CACHE_VERSION, of the zone pickle and of
+the tile sprite directory, so editing any of them makes the entry stale. Stale entries of a
+zone are deleted when it is compiled again, and only the ZONE_CACHE_SIZE
+most recently used entries are kept.
+
+Contributors:
+    Romain
+"""
+
+from __future__ import annotations
+from collections import OrderedDict
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+from typing import Callable, NamedTuple
+from common import CacheStats, EnumObject
+from enums import WORLD_OBJECT_TYPES
+from files import delete, load_pickle, native_path, save_pickle
+from world import WalkTrigger, tilemap_to_rows, tilemap_to_walkability
+
+logger = logging.getLogger(__name__)
+
+ZONE_CACHE_DIR_PATH = "user_data\\zone_cache"
+ZONE_CACHE_INDEX_PATH = "user_data\\zone_cache\\index.pkl"
+ZONE_CACHE_SIZE = 16  # Number of compiled zones kept on disk
+ZONE_CACHE_VERSION = 1  # Bump when CompiledZone or how it is compiled changes
+
+
+class CompiledZone(NamedTuple):
+    """A zone ready to be loaded.
+
+    Attributes:
+        tilemap (tuple[str, ...]): Tile rows of the zone.
+        sprite_rows (tuple[str, ...]): Rows of the sprite of the whole tilemap.
+        walkability (tuple[bytes, ...]): 1 for each walkable tile, row after row.
+        trigger_index (dict[tuple[int, int, int], tuple[WalkTrigger, ...]]):
+            WalkTriggers by (grid_y, grid_x, key), key being None for
+            triggers not bound to a key.
+        world_object_constructors (tuple[EnumObject, ...]): Constructors of
+            the other world objects, which can't be built in advance.
+    """
+    tilemap: tuple[str, ...]
+    sprite_rows: tuple[str, ...]
+    walkability: tuple[bytes, ...]
+    trigger_index: dict[tuple[int, int, int], tuple[WalkTrigger, ...]]
+    world_object_constructors: tuple[EnumObject, ...]
+
+    @property
+    def triggers(self) -> list[WalkTrigger]:
+        """Return every WalkTrigger of the index."""
+        return [trigger for triggers in self.trigger_index.values() for trigger in triggers]
+
+    @classmethod
+    def new(cls, tileset: dict[str, str], tilemap: tuple[str, ...],
+            world_object_constructors: tuple[EnumObject, ...]) -> CompiledZone:
+        """Compile a zone from its tilemap and world object constructors."""
+        logger.debug("Compiling zone")
+
+        trigger_index = {}
+        other_constructors = []
+        for constructor in world_object_constructors:
+            world_object_type, args = constructor
+            if world_object_type != WORLD_OBJECT_TYPES.WALK_TRIGGER:
+                other_constructors.append(constructor)
+                continue
+
+            if isinstance(args, dict):
+                trigger = WalkTrigger.new(**args)
+            else:
+                trigger = WalkTrigger.new(*args)
+            trigger_index.setdefault(
+                (trigger.grid_y, trigger.grid_x, trigger.key), []
+            ).append(trigger)
+
+        return cls(
+            tilemap,
+            tuple(tilemap_to_rows(tileset, tilemap)),
+            tilemap_to_walkability(tilemap),
+            {position: tuple(triggers) for position, triggers in trigger_index.items()},
+            tuple(other_constructors),
+        )
+
+
+def _hash_file(hasher: object, path: str) -> None:
+    with open(native_path(path), "rb") as file:
+        hasher.update(file.read())
+
+
+def get_zone_key(zone_path: str, tile_dir_path: str) -> str:
+    """Return the hash of the cache version, of the zone pickle and of the tile sprites."""
+    hasher = hashlib.sha256()
+    hasher.update(str(ZONE_CACHE_VERSION).encode("utf-8"))
+    _hash_file(hasher, zone_path)
+    for entry in sorted(os.listdir(native_path(tile_dir_path))):
+        hasher.update(entry.encode("utf-8"))
+        _hash_file(hasher, os.path.join(tile_dir_path, entry))
+    return hasher.hexdigest()
+
+
+def _make_zone_cache_manager() -> tuple[Callable, ...]:
+    """Creates functions to get compiled zones through the on-disk cache.
+
+    The index maps entry keys to their zone path, least recently used first,
+    it is read from disk on first use. Hits only reorder it in memory, the
+    order is saved along with the next write.
+    """
+    index = None
+    hits = 0
+    misses = 0
+    evictions = 0
+
+    def get_index() -> OrderedDict:
+        nonlocal index
+        if index is None:
+            index = OrderedDict()
+            if os.path.exists(native_path(ZONE_CACHE_INDEX_PATH)):
+                try:
+                    index = load_pickle(ZONE_CACHE_INDEX_PATH)
+                except Exception:
+                    logger.warning("Corrupted zone cache index, starting from an empty one")
+        return index
+
+    def get_entry_path(key: str) -> str:
+        return f"{ZONE_CACHE_DIR_PATH}\\{key}.pkl"
+
+    def remove_entry(key: str) -> None:
+        del get_index()[key]
+        if os.path.exists(native_path(get_entry_path(key))):
+            delete(get_entry_path(key))
+
+    def get_item(zone_path: str, tileset: dict[str, str], tile_dir_path: str) -> CompiledZone:
+        """Return the compiled zone at zone_path, compiling it if needed.
+
+        tileset must be loaded from tile_dir_path.
+        """
+        nonlocal hits, misses, evictions
+        key = get_zone_key(zone_path, tile_dir_path)
+        index = get_index()
+
+        if key in index:
+            try:
+                compiled_zone = load_pickle(get_entry_path(key))
+            except Exception:
+                # Any entry which can't be loaded, whatever the reason, is a miss
+                logger.warning(f"Corrupted zone cache entry: {key}")
+                compiled_zone = None
+
+            if compiled_zone is not None:
+                hits += 1
+                index.move_to_end(key)
+                return compiled_zone
+            remove_entry(key)
+
+        misses += 1
+        for stale_key in [stale_key for stale_key, path in index.items() if path == zone_path]:
+            logger.debug(f"Removing stale zone cache entry: {stale_key}")
+            remove_entry(stale_key)
+
+        tilemap, world_object_constructors = load_pickle(zone_path)
+        compiled_zone = CompiledZone.new(tileset, tilemap, world_object_constructors)
+
+        os.makedirs(native_path(ZONE_CACHE_DIR_PATH), exist_ok=True)
+        save_pickle(compiled_zone, get_entry_path(key))
+        index[key] = zone_path
+        while len(index) > ZONE_CACHE_SIZE:
+            remove_entry(next(iter(index)))
+            evictions += 1
+        save_pickle(index, ZONE_CACHE_INDEX_PATH)
+
+        return compiled_zone
+
+    def get_stats() -> CacheStats:
+        return CacheStats(hits, misses, evictions, len(get_index()))
+
+    def clear_cache() -> None:
+        """Delete every entry of the cache."""
+        nonlocal hits, misses, evictions
+        for key in list(get_index()):
+            remove_entry(key)
+        if os.path.exists(native_path(ZONE_CACHE_INDEX_PATH)):
+            delete(ZONE_CACHE_INDEX_PATH)
+        hits = 0
+        misses = 0
+        evictions = 0
+
+    return get_item, get_stats, clear_cache
+
+
+(
+    get_compiled_zone,
+    get_zone_cache_stats,
+    clear_zone_cache,
+) = _make_zone_cache_manager()
+
+
+def _test():
+    """Compile a zone twice, then edit it and check the stale entry is replaced."""
+    global ZONE_CACHE_DIR_PATH, ZONE_CACHE_INDEX_PATH
+    temp_dir_path = tempfile.mkdtemp()
+    ZONE_CACHE_DIR_PATH = f"{temp_dir_path}\\zone_cache"
+    ZONE_CACHE_INDEX_PATH = f"{temp_dir_path}\\zone_cache\\index.pkl"
+    tileset = {" ": "\n".join(["ab"] * 8), "║": "\n".join(["cd"] * 8)}
+    zone_path = f"{temp_dir_path}\\test_zone.pkl"
+    trigger = EnumObject(WORLD_OBJECT_TYPES.WALK_TRIGGER, (0, 1, None, ord("w")))
+    save_pickle(((" ║", "  "), (trigger,)), zone_path)
+
+    compiled_zone = get_compiled_zone(zone_path, tileset, "assets\\sprites\\tiles")
+    assert compiled_zone.sprite_rows[0] == "abcd"
+    assert compiled_zone.walkability == (b"\x01\x00", b"\x01\x01")
+    assert compiled_zone.trigger_index[0, 1, ord("w")][0].key == ord("w")
+    assert get_compiled_zone(zone_path, tileset, "assets\\sprites\\tiles") == compiled_zone
+    assert get_zone_cache_stats().hits == 1
+
+    save_pickle(((" ║", "║║"), ()), zone_path)
+    size = get_zone_cache_stats().size
+    compiled_zone = get_compiled_zone(zone_path, tileset, "assets\\sprites\\tiles")
+    assert compiled_zone.walkability[1] == b"\x00\x00" and not compiled_zone.trigger_index
+    assert get_zone_cache_stats().size == size
+
+    # A hit doesn't rewrite the index, an entry which fails to load is a miss
+    index_time = os.stat(native_path(ZONE_CACHE_INDEX_PATH)).st_mtime_ns
+    get_compiled_zone(zone_path, tileset, "assets\\sprites\\tiles")
+    assert os.stat(native_path(ZONE_CACHE_INDEX_PATH)).st_mtime_ns == index_time
+    key = get_zone_key(zone_path, "assets\\sprites\\tiles")
+
+    class OutdatedZone:
+        def __reduce__(self):
+            return CompiledZone, (compiled_zone.tilemap,)  # Raises a TypeError when loaded
+
+    save_pickle(OutdatedZone(), f"{ZONE_CACHE_DIR_PATH}\\{key}.pkl")
+    misses = get_zone_cache_stats().misses
+    assert get_compiled_zone(zone_path, tileset, "assets\\sprites\\tiles") == compiled_zone
+    assert get_zone_cache_stats().misses == misses + 1
+
+    clear_zone_cache()
+    shutil.rmtree(temp_dir_path)
+    print("all Tests passed")
+
+
+if __name__ == "__main__":
+    _test()
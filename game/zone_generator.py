@@ -0,0 +1,243 @@
+"""Seeded generator of large zones, for stress and scaling tests.
+
+A generated zone is grass crossed by a single winding path, with walled
+buildings and patches of solid grass scattered around. Obstacles are
+rectangles which never touch each other nor the edges of the zone, so every
+walkable tile can be reached from any other. Each building has a door in its
+bottom wall, where pressing w loads the zone again in front of the door of
+another building.
+
+The same seed and size always give the same zone. Zones bigger than
+CHUNKED_ZONE_SIZE tiles per side are saved as chunked zones.
+
+Run with 'python zone_generator.py height width [seed] [zone_path]' from
+the game directory.
+
+Contributors:
+    Romain
+"""
+
+from __future__ import annotations
+import logging
+import random
+import sys
+from typing import NamedTuple
+import chunks
+from common import EnumObject
+from enums import EVENT_TYPES, WORLD_OBJECT_TYPES
+from files import save_pickle
+import pathfinding
+from world import TILE_NAME_TO_CHAR, WALKABLE_TILE_CHARS, CollisionMap
+
+logger = logging.getLogger(__name__)
+
+GENERATED_ZONE_PATH = "assets\\zones\\generated_zone.pkl"
+CHUNKED_ZONE_SIZE = 256  # Zones bigger than this many tiles per side are chunked
+PATH_SPACING = 12  # Rows between the runs of the winding path
+BUILDING_DENSITY = 1 / 250  # Buildings per tile
+PATCH_DENSITY = 1 / 400  # Solid grass patches per tile
+PLACEMENT_TRIES = 4  # Random positions tried per obstacle
+BUILDING_SIZES = ((4, 8), (5, 12))  # (min, max) height and width of buildings
+PATCH_SIZES = ((1, 3), (1, 5))  # (min, max) height and width of solid grass patches
+
+
+class GeneratedZone(NamedTuple):
+    """A generated zone, in the format of zone pickles.
+
+    Attributes:
+        tilemap (tuple[str, ...]): Tile rows.
+        world_object_constructors (tuple[EnumObject, ...]): The door WalkTriggers.
+        doors (tuple[tuple[int, int], ...]): (grid_y, grid_x) of the building doors.
+    """
+    tilemap: tuple[str, ...]
+    world_object_constructors: tuple[EnumObject, ...]
+    doors: tuple[tuple[int, int], ...]
+
+
+def _draw_path(tiles: list[list[str]], reserved: bytearray, height: int, width: int) -> None:
+    """Draw a path winding from the top-left to the bottom of the zone, one run every PATH_SPACING rows."""
+    if height < 3 or width < 3:
+        return
+    rows = list(range(1, height - 1, PATH_SPACING))
+    left = 1
+    right = width - 2
+
+    def draw(y: int, x: int, char: str) -> None:
+        tiles[y][x] = char
+        reserved[y * width + x] = 1
+
+    for y in rows:
+        for x in range(left, right + 1):
+            draw(y, x, TILE_NAME_TO_CHAR["path_horizontal"])
+
+    for index, (y, next_y) in enumerate(zip(rows, rows[1:])):
+        if index % 2 == 0:
+            x = right
+            draw(y, x, TILE_NAME_TO_CHAR["path_down_left"])
+            draw(next_y, x, TILE_NAME_TO_CHAR["path_up_left"])
+        else:
+            x = left
+            draw(y, x, TILE_NAME_TO_CHAR["path_down_right"])
+            draw(next_y, x, TILE_NAME_TO_CHAR["path_up_right"])
+        for path_y in range(y + 1, next_y):
+            draw(path_y, x, TILE_NAME_TO_CHAR["path_vertical"])
+
+
+def _find_space(rng: random.Random, reserved: bytearray, zone_height: int, zone_width: int,
+                sizes: tuple[tuple[int, int], tuple[int, int]]) -> tuple[int, int, int, int] | None:
+    """Return the (y, x, height, width) of a free rectangle, None if none was found.
+
+    The rectangle and the tiles around it are reserved, so obstacles never
+    touch each other, and never touch the edges of the zone.
+    """
+    (min_height, max_height), (min_width, max_width) = sizes
+    for _ in range(PLACEMENT_TRIES):
+        height = rng.randint(min_height, max_height)
+        width = rng.randint(min_width, max_width)
+        if height > zone_height - 2 or width > zone_width - 2:
+            return None
+        y = rng.randint(1, zone_height - height - 1)
+        x = rng.randint(1, zone_width - width - 1)
+
+        top = (y - 1) * zone_width
+        if any(
+            any(reserved[offset + x - 1:offset + x + width + 1])
+            for offset in range(top, top + (height + 2) * zone_width, zone_width)
+        ):
+            continue
+
+        for offset in range(top, top + (height + 2) * zone_width, zone_width):
+            reserved[offset + x - 1:offset + x + width + 1] = b"\x01" * (width + 2)
+        return y, x, height, width
+    return None
+
+
+def _draw_building(tiles: list[list[str]], rng: random.Random, y: int, x: int,
+                   height: int, width: int) -> tuple[int, int]:
+    """Draw a building with grass inside and return the position of its door."""
+    bottom = y + height - 1
+    right = x + width - 1
+    tiles[y][x:right + 1] = (
+        [TILE_NAME_TO_CHAR["wall_down_right"]]
+        + [TILE_NAME_TO_CHAR["wall_horizontal"]] * (width - 2)
+        + [TILE_NAME_TO_CHAR["wall_down_left"]]
+    )
+    for wall_y in range(y + 1, bottom):
+        tiles[wall_y][x] = TILE_NAME_TO_CHAR["wall_vertical"]
+        tiles[wall_y][right] = TILE_NAME_TO_CHAR["wall_vertical"]
+    tiles[bottom][x:right + 1] = (
+        [TILE_NAME_TO_CHAR["wall_up_right"]]
+        + [TILE_NAME_TO_CHAR["wall_horizontal"]] * (width - 2)
+        + [TILE_NAME_TO_CHAR["wall_up_left"]]
+    )
+
+    door_x = rng.randint(x + 1, right - 1)
+    tiles[bottom][door_x] = TILE_NAME_TO_CHAR["grass"]
+    return bottom, door_x
+
+
+def generate_zone(height: int, width: int, seed: int = 0,
+                  zone_path: str = GENERATED_ZONE_PATH) -> GeneratedZone:
+    """Generate a zone of height x width tiles.
+
+    zone_path is where the zone will be saved, its door triggers load it again.
+    """
+    logger.debug(f"Generating {height}x{width} zone with seed {seed}")
+    rng = random.Random(seed)
+    tiles = [[TILE_NAME_TO_CHAR["grass"]] * width for _ in range(height)]
+    reserved = bytearray(height * width)
+
+    _draw_path(tiles, reserved, height, width)
+
+    doors = []
+    for _ in range(round(height * width * BUILDING_DENSITY)):
+        space = _find_space(rng, reserved, height, width, BUILDING_SIZES)
+        if space is not None:
+            doors.append(_draw_building(tiles, rng, *space))
+
+    for _ in range(round(height * width * PATCH_DENSITY)):
+        space = _find_space(rng, reserved, height, width, PATCH_SIZES)
+        if space is None:
+            continue
+        y, x, patch_height, patch_width = space
+        for patch_y in range(y, y + patch_height):
+            tiles[patch_y][x:x + patch_width] = [TILE_NAME_TO_CHAR["grass_solid"]] * patch_width
+
+    world_object_constructors = []
+    for door_y, door_x in doors:
+        if len(doors) < 2:
+            break
+        target_y, target_x = doors[rng.randrange(len(doors))]
+        world_object_constructors.append(EnumObject(
+            WORLD_OBJECT_TYPES.WALK_TRIGGER,
+            (
+                door_y,
+                door_x,
+                EnumObject(EVENT_TYPES.LOAD_ZONE, (zone_path, target_y + 1, target_x)),
+                ord("w"),
+            ),
+        ))
+
+    return GeneratedZone(
+        tuple("".join(row) for row in tiles),
+        tuple(world_object_constructors),
+        tuple(doors),
+    )
+
+
+def check_zone(zone: GeneratedZone) -> None:
+    """Raise ValueError if a zone has unknown tiles, unreachable tiles or triggers off the ground."""
+    tilemap = zone.tilemap
+    charset = set(TILE_NAME_TO_CHAR.values())
+    if any(len(row) != len(tilemap[0]) for row in tilemap):
+        raise ValueError("Tilemap rows have different lengths")
+    if not set("".join(tilemap)) <= charset:
+        raise ValueError(f"Unknown tiles: {set(''.join(tilemap)) - charset}")
+
+    collision_map = CollisionMap.new(tilemap)
+    start = next(
+        (y, x) for y, row in enumerate(tilemap) for x, char in enumerate(row)
+        if char in WALKABLE_TILE_CHARS
+    )
+    distance_field = pathfinding.DistanceField.new(collision_map, (start,))
+    reachable = sum(distance != pathfinding.UNREACHABLE for distance in distance_field.distances)
+    if reachable != collision_map.count_walkable():
+        raise ValueError(f"{collision_map.count_walkable() - reachable} tiles can't be reached")
+
+    for _, args in zone.world_object_constructors:
+        if not collision_map.is_walkable(args[0], args[1]):
+            raise ValueError(f"Trigger on a blocked tile: {args[:2]}")
+
+
+def save_zone(zone: GeneratedZone, zone_path: str = GENERATED_ZONE_PATH) -> None:
+    """Save a zone as a zone pickle, chunked if it is bigger than CHUNKED_ZONE_SIZE tiles per side."""
+    if max(len(zone.tilemap), len(zone.tilemap[0])) > CHUNKED_ZONE_SIZE:
+        chunks.save_chunked_zone(zone_path, zone.tilemap, zone.world_object_constructors)
+    else:
+        save_pickle((zone.tilemap, zone.world_object_constructors), zone_path)
+
+
+def main(height: int, width: int, seed: int = 0, zone_path: str = GENERATED_ZONE_PATH) -> None:
+    zone = generate_zone(height, width, seed, zone_path)
+    save_zone(zone, zone_path)
+    print(f"Saved {height}x{width} zone with {len(zone.doors)} doors to {zone_path}")
+
+
+def _test():
+    """Generate zones from tiny to large and check they are valid and deterministic."""
+    for height, width in ((10, 10), (7, 40), (200, 200)):
+        zone = generate_zone(height, width, seed=1)
+        check_zone(zone)
+        assert len(zone.tilemap) == height and len(zone.tilemap[0]) == width
+        assert generate_zone(height, width, seed=1) == zone
+    assert len(zone.world_object_constructors) > 100
+    assert generate_zone(200, 200, seed=2).tilemap != zone.tilemap
+    print("all Tests passed")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        _test()
+    else:
+        main(int(sys.argv[1]), int(sys.argv[2]), *[int(arg) for arg in sys.argv[3:4]],
+             *sys.argv[4:5])
@@ -0,0 +1,545 @@
+"""Graph of the zones connected by walk triggers, and routes through it.
+
+Zones are only connected by the LOAD_ZONE events of their walk triggers,
+possibly nested in multi events. The zone graph scans every zone pickle of
+a directory, chunked zones included, and keeps the exits of each zone: the
+trigger tile, its key, and the zone and tile it leads to. The graph is saved
+in ZONE_GRAPH_PATH, and only the zones whose files changed modification time
+or size are scanned again when it is updated, chunk files included.
+
+Routes between tiles of any two zones are found with Dijkstra over the
+tiles the player can stand on when a zone is loaded. Going through a zone
+costs the tiles walked from where the player entered to the exit, found by
+a breadth-first search on its walkability which stops once every exit is
+reached and doesn't walk through exits triggered by walking on them, and
+each zone loaded costs ZONE_LOAD_COST more. These walks are
+kept in an LRU cache, so queries through the same zones only search the
+graph.
+
+Run with 'python zone_graph.py index [zone_dir_path]' to update and print
+the graph, or 'python zone_graph.py route start_zone y x goal_zone y x'
+to print a route, from the game directory.
+
+Contributors:
+    Romain
+"""
+
+from __future__ import annotations
+from collections import OrderedDict
+import heapq
+import logging
+import os
+import shutil
+import sys
+import tempfile
+from typing import Callable, NamedTuple
+import chunks
+from common import CacheStats, EnumObject
+from enums import EVENT_TYPES, WORLD_OBJECT_TYPES
+from files import delete, load_pickle, native_path, save_pickle
+from world import CollisionMap, WalkTrigger
+
+logger = logging.getLogger(__name__)
+
+ZONE_DIR_PATH = "assets\\zones"
+ZONE_GRAPH_PATH = "user_data\\zone_graph.pkl"
+ZONE_LOAD_COST = 1  # Cost of loading a zone along a route, in tiles walked
+COLLISION_MAP_CACHE_SIZE = 16  # Number of zone collision maps kept in memory
+WALK_CACHE_SIZE = 4096  # Number of walks from a tile to the exits of its zone kept in memory
+
+
+class ZoneExit(NamedTuple):
+    """A walk trigger loading another zone, or another tile of the same zone.
+
+    Attributes:
+        grid_y (int): Grid y of the trigger.
+        grid_x (int): Grid x of the trigger.
+        key (int): Key the trigger is bound to, None if walking on it is enough.
+        zone_path (str): Path of the zone loaded.
+        target_y (int): Grid y the player is placed at in the loaded zone.
+        target_x (int): Grid x the player is placed at in the loaded zone.
+    """
+    grid_y: int
+    grid_x: int
+    key: int
+    zone_path: str
+    target_y: int
+    target_x: int
+
+
+class ZoneNode(NamedTuple):
+    """A zone of the graph.
+
+    Attributes:
+        zone_path (str): Path of the zone pickle.
+        stamp (tuple[int, int]): Latest modification time in ns and total size of
+            the zone files when scanned, chunks included.
+        height (int): Height of the zone in tiles.
+        width (int): Width of the zone in tiles.
+        exits (tuple[ZoneExit, ...]): The walk triggers loading a zone.
+    """
+    zone_path: str
+    stamp: tuple[int, int]
+    height: int
+    width: int
+    exits: tuple[ZoneExit, ...]
+
+
+class RouteLeg(NamedTuple):
+    """The walk through one zone of a route.
+
+    Attributes:
+        zone_path (str): Path of the zone walked through.
+        start_y (int): Grid y where the leg starts.
+        start_x (int): Grid x where the leg starts.
+        end_y (int): Grid y of the exit, or of the goal on the last leg.
+        end_x (int): Grid x of the exit, or of the goal on the last leg.
+        distance (int): Tiles walked.
+        key (int): Key to press on the exit, None if walking on it is enough.
+    """
+    zone_path: str
+    start_y: int
+    start_x: int
+    end_y: int
+    end_x: int
+    distance: int
+    key: int = None
+
+
+class Route(NamedTuple):
+    """A shortest route between two tiles of any zones.
+
+    Attributes:
+        distance (int): Tiles walked, plus ZONE_LOAD_COST per zone loaded.
+        legs (tuple[RouteLeg, ...]): The walks through each zone, in order,
+            empty if the route starts on its goal.
+    """
+    distance: int
+    legs: tuple[RouteLeg, ...]
+
+
+def _get_stamp(zone_path: str) -> tuple[int, int]:
+    stat = os.stat(native_path(zone_path))
+    mtime, size = stat.st_mtime_ns, stat.st_size
+    chunk_dir_path = native_path(os.path.splitext(zone_path)[0])
+    if os.path.isdir(chunk_dir_path):
+        for entry in os.scandir(chunk_dir_path):
+            stat = entry.stat()
+            mtime = max(mtime, stat.st_mtime_ns)
+            size += stat.st_size
+    return mtime, size
+
+
+def get_event_destinations(event: EnumObject) -> list[tuple[str, int, int]]:
+    """Return the (zone_path, grid_y, grid_x) loaded by an event, looking into multi events."""
+    if event is None:
+        return []
+
+    event_type, value = event
+    if event_type == EVENT_TYPES.LOAD_ZONE:
+        if isinstance(value, dict):
+            return [(
+                value["zone_path"],
+                value.get("player_grid_y", 0),
+                value.get("player_grid_x", 0),
+            )]
+        if isinstance(value, str):
+            return [(value, 0, 0)]
+        return [(tuple(value) + (0, 0))[:3]]
+    if event_type == EVENT_TYPES.MULTI_EVENT:
+        return [
+            destination
+            for sub_event in value
+            for destination in get_event_destinations(sub_event)
+        ]
+    return []
+
+
+def scan_zone(zone_path: str) -> ZoneNode:
+    """Return the node of the zone at zone_path, with the exits of its walk triggers."""
+    logger.debug(f"Scanning zone: {zone_path}")
+    zone = load_pickle(zone_path)
+    if isinstance(zone, chunks.ChunkedZone):
+        height, width = zone.height, zone.width
+        world_object_constructors = [
+            constructor
+            for chunk_y in range(zone.chunk_rows)
+            for chunk_x in range(zone.chunk_columns)
+            for constructor in load_pickle(
+                zone.get_chunk_path(chunk_y, chunk_x)
+            ).world_object_constructors
+        ]
+    else:
+        tilemap, world_object_constructors = zone
+        height = len(tilemap)
+        width = len(tilemap[0]) if tilemap else 0
+
+    exits = []
+    for world_object_type, args in world_object_constructors:
+        if world_object_type != WORLD_OBJECT_TYPES.WALK_TRIGGER:
+            continue
+        if isinstance(args, dict):
+            trigger = WalkTrigger.new(**args)
+        else:
+            trigger = WalkTrigger.new(*args)
+        for destination in get_event_destinations(trigger.on_trigger_event):
+            exits.append(ZoneExit(trigger.grid_y, trigger.grid_x, trigger.key, *destination))
+
+    return ZoneNode(zone_path, _get_stamp(zone_path), height, width, tuple(exits))
+
+
+def load_zone_collision_map(zone_path: str) -> CollisionMap:
+    """Return the collision map of the whole zone at zone_path, chunked zones included."""
+    zone = load_pickle(zone_path)
+    if not isinstance(zone, chunks.ChunkedZone):
+        return CollisionMap.new(zone[0])
+
+    walkability = []
+    for chunk_y in range(zone.chunk_rows):
+        row_chunks = [
+            load_pickle(zone.get_chunk_path(chunk_y, chunk_x))
+            for chunk_x in range(zone.chunk_columns)
+        ]
+        for y in range(len(row_chunks[0].walkability)):
+            walkability.append(b"".join(chunk.walkability[y] for chunk in row_chunks))
+    return CollisionMap.new((), tuple(walkability))
+
+
+def get_walking_distances(collision_map: CollisionMap, start: tuple[int, int],
+                          targets: set[tuple[int, int]],
+                          stops: set[tuple[int, int]] = frozenset()) -> dict[tuple[int, int], int]:
+    """Return the walking distance from start to each target which can be reached.
+
+    Breadth-first, stopping once every target is reached. Targets are
+    reached even if they aren't walkable themselves, like doors. Stops can
+    be reached as targets but aren't walked through, like walk triggers
+    loading another zone.
+    """
+    height = collision_map.height
+    width = collision_map.width
+    cells = collision_map.cells
+    target_offsets = {y * width + x for y, x in targets if 0 <= y < height and 0 <= x < width}
+    start_y, start_x = start
+    if not (0 <= start_y < height and 0 <= start_x < width):
+        return {}
+
+    stop_offsets = {y * width + x for y, x in stops if 0 <= y < height and 0 <= x < width}
+    start_offset = start_y * width + start_x
+    distances = {}
+    if start_offset in target_offsets:
+        distances[start] = 0
+    last_row = (height - 1) * width
+    seen = {start_offset}
+    frontier = [start_offset]
+    distance = 0
+    while frontier and len(distances) < len(target_offsets):
+        distance += 1
+        next_frontier = []
+        for offset in frontier:
+            x = offset % width
+            for neighbour, is_in_map in (
+                (offset - width, offset >= width),
+                (offset + width, offset < last_row),
+                (offset - 1, x > 0),
+                (offset + 1, x < width - 1),
+            ):
+                if not is_in_map or neighbour in seen:
+                    continue
+                if neighbour in target_offsets:
+                    distances[divmod(neighbour, width)] = distance
+                elif not cells[neighbour]:
+                    continue
+                seen.add(neighbour)
+                if cells[neighbour] and neighbour not in stop_offsets:
+                    next_frontier.append(neighbour)
+        frontier = next_frontier
+    return distances
+
+
+def _make_zone_graph_manager() -> tuple[Callable, ...]:
+    """Creates functions to keep the zone graph up to date on disk and find routes.
+
+    The graph maps zone paths to ZoneNodes, it is read from disk on first
+    use. The collision maps and walks used by routes are kept in LRU caches,
+    keyed by the stamp of the zone file so edited zones are walked again.
+    """
+    nodes = None
+    collision_maps = OrderedDict()  # (zone_path, stamp): CollisionMap
+    walks = OrderedDict()  # (zone_path, stamp, y, x, goal): {(y, x): distance}
+    hits = 0
+    misses = 0
+    evictions = 0
+
+    def get_nodes() -> dict[str, ZoneNode]:
+        nonlocal nodes
+        if nodes is None:
+            nodes = {}
+            if os.path.exists(native_path(ZONE_GRAPH_PATH)):
+                try:
+                    nodes = load_pickle(ZONE_GRAPH_PATH) or {}
+                except Exception:
+                    logger.warning("Corrupted zone graph, scanning every zone again")
+        return nodes
+
+    def update_graph(zone_dir_path: str = ZONE_DIR_PATH) -> list[str]:
+        """Scan the zone pickles of zone_dir_path which changed since the last update.
+
+        Zones whose file was deleted are removed from the graph. Returns the
+        paths of the zones scanned.
+        """
+        nonlocal hits, misses, evictions
+        graph = get_nodes()
+        scanned = []
+        for entry in sorted(os.listdir(native_path(zone_dir_path))):
+            zone_path = f"{zone_dir_path}\\{entry}"
+            if os.path.splitext(entry)[1] != ".pkl" or os.path.isdir(native_path(zone_path)):
+                continue
+            node = graph.get(zone_path)
+            if node is not None and node.stamp == _get_stamp(zone_path):
+                hits += 1
+                continue
+
+            misses += 1
+            try:
+                graph[zone_path] = scan_zone(zone_path)
+            except Exception:
+                # Not a zone, or a zone or chunk which can't be loaded
+                logger.warning(f"Not a zone: {zone_path}")
+                continue
+            scanned.append(zone_path)
+
+        removed = [path for path in graph if not os.path.exists(native_path(path))]
+        for zone_path in removed:
+            logger.debug(f"Removing deleted zone from the zone graph: {zone_path}")
+            del graph[zone_path]
+            evictions += 1
+
+        if scanned or removed:
+            os.makedirs(os.path.dirname(native_path(ZONE_GRAPH_PATH)), exist_ok=True)
+            save_pickle(graph, ZONE_GRAPH_PATH)
+        return scanned
+
+    def get_node(zone_path: str) -> ZoneNode | None:
+        return get_nodes().get(zone_path)
+
+    def get_collision_map(node: ZoneNode) -> CollisionMap:
+        key = (node.zone_path, node.stamp)
+        collision_map = collision_maps.get(key)
+        if collision_map is None:
+            collision_map = load_zone_collision_map(node.zone_path)
+            collision_maps[key] = collision_map
+            if len(collision_maps) > COLLISION_MAP_CACHE_SIZE:
+                collision_maps.popitem(last=False)
+        collision_maps.move_to_end(key)
+        return collision_map
+
+    def get_walk(node: ZoneNode, y: int, x: int,
+                 goal: tuple[int, int] = None) -> dict[tuple[int, int], int]:
+        """Return the walking distances from (y, x) to the exits of a zone, and to goal if given."""
+        key = (node.zone_path, node.stamp, y, x, goal)
+        distances = walks.get(key)
+        if distances is None:
+            targets = {(zone_exit.grid_y, zone_exit.grid_x) for zone_exit in node.exits}
+            stops = {
+                (zone_exit.grid_y, zone_exit.grid_x)
+                for zone_exit in node.exits
+                if zone_exit.key is None
+            }
+            if goal is not None:
+                targets.add(goal)
+            distances = get_walking_distances(get_collision_map(node), (y, x), targets, stops)
+            walks[key] = distances
+            if len(walks) > WALK_CACHE_SIZE:
+                walks.popitem(last=False)
+        walks.move_to_end(key)
+        return distances
+
+    def find_route(start_zone_path: str, start_y: int, start_x: int,
+                   goal_zone_path: str, goal_y: int, goal_x: int) -> Route | None:
+        """Return the shortest route between two tiles of any zones, None if there is none.
+
+        Both zones must be in the graph, see update_zone_graph().
+        """
+        graph = get_nodes()
+        start = (start_zone_path, start_y, start_x)
+        goal = (goal_zone_path, goal_y, goal_x)
+        if start_zone_path not in graph or goal_zone_path not in graph:
+            return None
+
+        costs = {start: 0}
+        parents = {start: None}  # Tile: (previous tile, RouteLeg walked from it)
+        queue = [(0, start)]
+
+        def relax(tile: tuple[str, int, int], next_tile: tuple[str, int, int], next_cost: int,
+                  leg: RouteLeg) -> None:
+            if costs.get(next_tile, next_cost + 1) <= next_cost:
+                return
+            costs[next_tile] = next_cost
+            parents[next_tile] = (tile, leg)
+            heapq.heappush(queue, (next_cost, next_tile))
+
+        while queue:
+            cost, tile = heapq.heappop(queue)
+            if tile == goal:
+                break
+            if cost > costs[tile]:
+                continue  # Already expanded with a lower cost
+
+            zone_path, y, x = tile
+            node = graph.get(zone_path)
+            if node is None:
+                continue  # Leads to a zone out of the graph
+
+            is_goal_zone = zone_path == goal_zone_path
+            distances = get_walk(node, y, x, (goal_y, goal_x) if is_goal_zone else None)
+            if is_goal_zone and (goal_y, goal_x) in distances:
+                distance = distances[goal_y, goal_x]
+                relax(tile, goal, cost + distance,
+                      RouteLeg(zone_path, y, x, goal_y, goal_x, distance))
+            for zone_exit in node.exits:
+                distance = distances.get((zone_exit.grid_y, zone_exit.grid_x))
+                if distance is None:
+                    continue
+                relax(
+                    tile,
+                    (zone_exit.zone_path, zone_exit.target_y, zone_exit.target_x),
+                    cost + distance + ZONE_LOAD_COST,
+                    RouteLeg(zone_path, y, x, zone_exit.grid_y, zone_exit.grid_x,
+                             distance, zone_exit.key),
+                )
+        else:
+            return None
+
+        legs = []
+        tile = goal
+        while parents[tile] is not None:
+            tile, leg = parents[tile]
+            legs.append(leg)
+        legs.reverse()
+        return Route(costs[goal], tuple(legs))
+
+    def get_stats() -> CacheStats:
+        """Return the zones reused and scanned by updates, the deleted ones and the graph size."""
+        return CacheStats(hits, misses, evictions, len(get_nodes()))
+
+    def clear_graph() -> None:
+        """Forget the graph and delete it from disk."""
+        nonlocal nodes, hits, misses, evictions
+        nodes = {}
+        collision_maps.clear()
+        walks.clear()
+        if os.path.exists(native_path(ZONE_GRAPH_PATH)):
+            delete(ZONE_GRAPH_PATH)
+        hits = 0
+        misses = 0
+        evictions = 0
+
+    return update_graph, get_node, find_route, get_stats, clear_graph
+
+
+(
+    update_zone_graph,
+    get_zone_node,
+    find_route,
+    get_zone_graph_stats,
+    clear_zone_graph,
+) = _make_zone_graph_manager()
+
+
+def main(command: str, *args: str) -> None:
+    if command == "index":
+        scanned = update_zone_graph(*args[:1])
+        print(f"Scanned {len(scanned)} zones, {get_zone_graph_stats().size} in the graph")
+        for zone_path in scanned:
+            node = get_zone_node(zone_path)
+            print(f"{zone_path} ({node.height}x{node.width}): {len(node.exits)} exits")
+            for zone_exit in node.exits:
+                print(f"    ({zone_exit.grid_y}, {zone_exit.grid_x}) -> "
+                      f"{zone_exit.zone_path} ({zone_exit.target_y}, {zone_exit.target_x})")
+    elif command == "route":
+        update_zone_graph()
+        start_zone_path, start_y, start_x, goal_zone_path, goal_y, goal_x = args
+        route = find_route(start_zone_path, int(start_y), int(start_x),
+                           goal_zone_path, int(goal_y), int(goal_x))
+        if route is None:
+            print("No route")
+            return
+        print(f"Distance: {route.distance}")
+        for leg in route.legs:
+            key = "" if leg.key is None else f", press {chr(leg.key)}"
+            print(f"{leg.zone_path}: ({leg.start_y}, {leg.start_x}) -> "
+                  f"({leg.end_y}, {leg.end_x}), {leg.distance} tiles{key}")
+    else:
+        print(f"Unknown command: {command}")
+
+
+def _test():
+    """Index three zones, route through them, then edit and delete zones and update again."""
+    global ZONE_GRAPH_PATH
+    temp_dir_path = tempfile.mkdtemp()
+    ZONE_GRAPH_PATH = f"{temp_dir_path}\\zone_graph.pkl"
+    zone_dir_path = f"{temp_dir_path}\\zones"
+    os.makedirs(native_path(zone_dir_path))
+    zone_a = f"{zone_dir_path}\\zone_a.pkl"
+    zone_b = f"{zone_dir_path}\\zone_b.pkl"
+    zone_c = f"{zone_dir_path}\\zone_c.pkl"
+
+    def trigger(grid_y: int, grid_x: int, event: EnumObject, key: int = None) -> EnumObject:
+        return EnumObject(WORLD_OBJECT_TYPES.WALK_TRIGGER, (grid_y, grid_x, event, key))
+
+    to_b = trigger(0, 4, EnumObject(EVENT_TYPES.LOAD_ZONE, (zone_b, 1, 0)))
+    to_c = trigger(2, 0, EnumObject(EVENT_TYPES.LOAD_ZONE, (zone_c, 0, 9)))
+    save_pickle((("    ║", " ║║  ", "     "), (to_b, to_c)), zone_a)
+    save_pickle((("    ", "    "), (trigger(1, 3, EnumObject(EVENT_TYPES.MULTI_EVENT, (
+        EnumObject(EVENT_TYPES.LOAD_ZONE, {"zone_path": zone_c}),
+    )), ord("w")),)), zone_b)
+    chunks.save_chunked_zone(zone_c, (" " * 10,), chunk_size=4)
+
+    clear_zone_graph()
+    assert update_zone_graph(zone_dir_path) == [zone_a, zone_b, zone_c]
+    assert get_zone_node(zone_b).exits == (ZoneExit(1, 3, ord("w"), zone_c, 0, 0),)
+    assert get_zone_node(zone_c).width == 10 and not get_zone_node(zone_c).exits
+    assert find_route(zone_a, 0, 0, zone_c, 0, 5) == Route(7, (
+        RouteLeg(zone_a, 0, 0, 2, 0, 2),
+        RouteLeg(zone_c, 0, 9, 0, 5, 4),
+    ))
+    assert find_route(zone_a, 0, 0, zone_a, 0, 0) == Route(0, ())
+    assert find_route(zone_c, 0, 0, zone_a, 0, 0) is None
+
+    # Editing a chunk of a chunked zone scans it again
+    chunk_path = f"{zone_dir_path}\\zone_c\\0_1.pkl"
+    to_a = trigger(0, 5, EnumObject(EVENT_TYPES.LOAD_ZONE, (zone_a, 0, 0)))
+    save_pickle(load_pickle(chunk_path)._replace(world_object_constructors=(to_a,)), chunk_path)
+    assert update_zone_graph(zone_dir_path) == [zone_c]
+    assert find_route(zone_c, 0, 0, zone_a, 0, 0) == Route(6, (RouteLeg(zone_c, 0, 0, 0, 5, 5),))
+
+    # Walk triggers loading a zone are reached but not walked through
+    collision_map = CollisionMap.new(("   ",))
+    assert get_walking_distances(collision_map, (0, 0), {(0, 2)}) == {(0, 2): 2}
+    assert get_walking_distances(collision_map, (0, 0), {(0, 1), (0, 2)}, {(0, 1)}) == {(0, 1): 1}
+
+    save_pickle((("    ║", " ║║  ", "     "), (to_b,)), zone_a)
+    assert update_zone_graph(zone_dir_path) == [zone_a]
+    route = find_route(zone_a, 0, 0, zone_c, 0, 5)
+    assert route.distance == 4 + 1 + 3 + 1 + 5
+    assert [leg.zone_path for leg in route.legs] == [zone_a, zone_b, zone_c]
+    assert route.legs[1].key == ord("w")
+    assert load_pickle(ZONE_GRAPH_PATH)[zone_a].exits == (ZoneExit(0, 4, None, zone_b, 1, 0),)
+
+    delete(zone_b)
+    assert update_zone_graph(zone_dir_path) == []
+    assert get_zone_node(zone_b) is None and find_route(zone_a, 0, 0, zone_c, 0, 5) is None
+    assert get_zone_graph_stats() == CacheStats(6, 5, 1, 2)
+
+    clear_zone_graph()
+    shutil.rmtree(temp_dir_path)
+    print("all Tests passed")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        _test()
+    else:
+        # Through the module, so the saved graph doesn't refer to __main__
+        import zone_graph
+        zone_graph.main(*sys.argv[1:])